@@ -1,15 +1,12 @@
+import sys, os
 import numpy as np
 import matplotlib.pyplot as plt
 
-from scipy.special import erf
+dir = os.path.dirname(os.path.realpath(__file__))
 
-def erfDer(x):
-    ''' Derivative of the error function '''
-    return 2 * np.exp(-x**2) / np.sqrt(np.pi)
-
-def chskr(x):
-    ''' Chandrasekhar function '''
-    return (erf(x) - x * erfDer(x)) / (2 * x**2)
+# Reference model import
+sys.path.append(os.path.join(dir, '../runawayRate'))
+from modelsDREAM import chandrasekhar as chskr
 
 
 # set font sizes
@@ -1,16 +1,46 @@
 """
 Collection of constant parameters used throughout in this project.
+
+This module is imported by every script, so it only depends on the standard
+library: DREAM is made importable here but only imported by the modules that
+need it (see requireDREAM).
 """
-import numpy as np
-import sys
+import sys, os, math
 
-# make sure path to DREAM exists
+# make DREAM importable (imported on demand)
 DREAM_PATH = '/home/pethalld/DREAM/py'  # /path/to/DREAM/py
-try:
-    sys.path.append(DREAM_PATH)
-    import DREAM
-except ModuleNotFoundError as err:
-    raise Exception(f'DREAM_PATH={DREAM_PATH} does not exist!') from err
+sys.path.append(DREAM_PATH)
+
+
+def requireDREAM():
+    """
+    Imports and returns the DREAM package, with a helpful error if DREAM_PATH
+    is wrong.
+    """
+    try:
+        import DREAM
+    except ModuleNotFoundError as err:
+        raise Exception(f'DREAM_PATH={DREAM_PATH} does not exist!') from err
+    return DREAM
+
+# Synthetic stand-in for dreami (see runawayRate/standinDREAM.py)
+DREAMI_STANDIN_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'runawayRate/standinDREAM.py')
+
+def getDreami(dreami=None):
+    """
+    Returns the path of a dreami executable, DREAMI_PATH if None, and the
+    stand-in if 'standin'.
+    """
+    dreami = DREAMI_PATH if dreami is None else dreami
+    return DREAMI_STANDIN_PATH if dreami == 'standin' else dreami
+
+# DREAM executable, assuming the default build directory next to DREAM/py,
+# unless set by the DREAMI environment variable ('standin' for the stand-in)
+DREAMI_PATH = getDreami(os.environ.get('DREAMI', os.path.join(os.path.dirname(DREAM_PATH), 'build/iface/dreami')))
+
+# DREAM output cache (see runawayRate/cacheDREAM.py)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache')
+CACHE_MAX_SIZE = 20e9   # [bytes]
 
 # default parameters
 ELECTRON_DENSITY = 5e19 # [m^-3]
@@ -18,7 +48,7 @@ ELECTRIC_FIELD = 1.0   # [V/m]
 TEMPERATURE = 300   # [eV]
 
 m_e = 510999           # Electron mass [eV/c^2]
-MU_0 = 4e-7 * np.pi    # Permeability of free space
+MU_0 = 4e-7 * math.pi    # Permeability of free space
 
 PLASMA_CURRENT = 200e3  # Reference plasma current which generates poloidal field
 
@@ -48,7 +78,7 @@ N_TRIANGULARITY   = 20  # no. triangularity grid points
 N_ELONGATION      = 20  # no. elongation grid points
 
 # Avalanche parameters including definition of biuniform grid
-P_TH            = np.sqrt(2 * TEMPERATURE / m_e)         # thermal momentum of the electrons in units of m_e*c
+P_TH            = math.sqrt(2 * TEMPERATURE / m_e)       # thermal momentum of the electrons in units of m_e*c
 P_CUT_AVALANCHE = 0.01                                   # minimum momentum to which the Avalanche source term is applied in units of m_e*c
 PSEP            = float(7 * P_TH)                        # max momentum of the lower grid in units of m_e*c
 N_PSEP          = int(N_MOMENTUM + PSEP - MAX_MOMENTUM)  # no. grid points in the lower grid
@@ -57,3 +87,9 @@ N_PSEP          = int(N_MOMENTUM + PSEP - MAX_MOMENTUM)  # no. grid points in th
 TOL_ELECTRON_DENSITY_RATIO	= 0.01	# tolerance of the ration n_re/n_cold
 TOL_RUNAWAY_RATE_CONVERGENCE	= 0.1	# tolerance for the relative convergence of runawayRate
 LIM_RUNAWAY_RATE_CONVERGENCE	= 0.8	# percentual limit from which the convergence will be tested
+MIN_SAVED_TIMES_CONVERGENCE	= 3	# min no. distinct saved times needed to test the convergence
+MIN_TIME_CONVERGENCE	= 0.4	# min simulated time (in units of MAX_TIME) before a chunked run may stop as converged
+
+# chunked time integration (see runawayRate/runDREAM.py)
+N_TIME_CHUNKS		= 5	# no. restartable chunks MAX_TIME is split into
+MAX_TIME_EXTENSION	= 4	# max simulated time (in units of MAX_TIME) of runs not yet converged
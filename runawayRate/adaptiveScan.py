@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+Adaptive refinement of one-dimensional parameter scans. Starting from a coarse
+set of scan values, new scan values are inserted where the final runaway rate
+changes fastest or is most curved, until a budget of simulations is used up.
+"""
+import sys, os
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# DREAM and the scan executor are imported by adaptiveScan, so that the
+# generate scripts importing this module start fast (see checkStartup.py)
+sys.path.append(p.DREAM_PATH)
+
+
+def getFinalRunawayRate(do):
+    """
+    Returns the runaway rate at the final time step and innermost radius.
+
+    DREAM.DREAMOutput do :  DREAM output object.
+    """
+    try:
+        return do.other.fluid.runawayRate.data[-1,0]
+    except AttributeError as err:
+        raise Exception('Output does not include needed data.') from err
+
+
+def getRefinementValues(x, y, n, xLogScale=False, yLogScale=True, minSpacing=1e-3):
+    """
+    Returns (at most) n new scan values placed in the midpoints of the scan
+    intervals with largest loss. The loss of an interval is the length of the
+    curve segment in normalized (x, y) coordinates plus the square root of the
+    largest triangle area spanned with its neighbouring points, so that both
+    steep and strongly curved parts of the curve are refined.
+
+    array x :           Scan values.
+    array y :           Scanned quantity.
+    int n :             Max no. new scan values.
+    bool xLogScale :    Refine in log10(x) rather than x.
+    bool yLogScale :    Measure changes in log10|y| rather than y.
+    float minSpacing :  Intervals narrower than this (normalized) are not refined.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+
+    if x.size < 2 or n < 1:
+        return np.array([])
+
+    u = np.log10(x) if xLogScale else x
+    v = np.log10(np.abs(y) + np.finfo(float).tiny) if yLogScale else y
+
+    # normalize to the unit square
+    u = (u - u[0]) / (u[-1] - u[0])
+    vRange = np.ptp(v)
+    v = (v - v.min()) / vRange if vRange > 0 else np.zeros_like(v)
+
+    du, dv = np.diff(u), np.diff(v)
+    loss = np.hypot(du, dv)
+
+    # curvature: triangle areas spanned by consecutive points
+    area = np.zeros(x.size)
+    area[1:-1] = .5 * np.abs(du[:-1] * dv[1:] - du[1:] * dv[:-1])
+    loss += np.sqrt(np.maximum(area[:-1], area[1:]))
+
+    loss[du < 2 * minSpacing] = 0
+    intervals = np.argsort(loss)[::-1][:n]
+    intervals = intervals[loss[intervals] > 0]
+
+    # midpoints in the refined coordinate
+    if xLogScale:
+        return np.sqrt(x[intervals] * x[intervals+1])
+    return .5 * (x[intervals] + x[intervals+1])
+
+
+def adaptiveScan(configure, initialValues, maxRuns=20, batchSize=None, xLogScale=False,
+                 yLogScale=True, minSpacing=1e-3, settingsDir='settings/', verbose=False, **kwargs):
+    """
+    Runs an adaptively refined scan. Each iteration writes the settings of the
+    new scan values, runs them with runDREAM.runScan and inserts batchSize new
+    values where the final runaway rate is least resolved. Returns the sorted
+    scan values and final runaway rates.
+
+    callable configure :    Function configure(scanValue) writing the settings
+                            file of a scan value into settingsDir, returning
+                            the ConfigureDREAM object. Only these settings
+                            files are run, not others in settingsDir.
+    list initialValues :    Coarse initial scan values (at least two).
+    int maxRuns :           Total budget of simulations.
+    int batchSize :         No. scan values added per iteration (default: no. cores).
+    bool xLogScale :        Refine in log10 of the scan value.
+    bool yLogScale :        Measure changes in log10 of the runaway rate.
+    float minSpacing :      Smallest normalized spacing between scan values.
+    str settingsDir :       Directory the settings files are written to.
+    bool verbose :          Show information.
+
+    Remaining keyword arguments are passed to runDREAM.runScan.
+    """
+    from DREAM.DREAMOutput import DREAMOutput
+    from runDREAM import runScan
+
+    if verbose:
+        print(adaptiveScan.__doc__)
+
+    batchSize = os.cpu_count() if batchSize is None else batchSize
+
+    outputFiles = {}
+    runawayRates = {}
+    newValues = list(initialValues)[:maxRuns]
+
+    while len(newValues):
+
+        settingsFiles = []
+        for scanValue in newValues:
+            config = configure(scanValue)
+            outputFiles[scanValue] = config.ds.output.filename
+            settingsFiles.append(config.settingsFile)
+
+        runScan(settingsDir, settingsFiles=settingsFiles, **kwargs)
+
+        for scanValue in newValues:
+            if os.path.exists(outputFiles[scanValue]):
+                runawayRates[scanValue] = getFinalRunawayRate(DREAMOutput(outputFiles[scanValue]))
+            elif verbose:
+                print(f'No output for scan value {scanValue}, ignoring it.')
+
+        nLeft = maxRuns - len(outputFiles)
+        x, y = np.array(list(runawayRates.keys())), np.array(list(runawayRates.values()))
+        newValues = getRefinementValues(x, y, min(batchSize, nLeft), xLogScale=xLogScale,
+                                        yLogScale=yLogScale, minSpacing=minSpacing)
+        if verbose:
+            print(f'{len(outputFiles)}/{maxRuns} runs used, adding {len(newValues)} scan values.')
+
+    x = np.array(sorted(runawayRates))
+    return x, np.array([runawayRates[scanValue] for scanValue in x])
@@ -1,4 +1,4 @@
-Q#!/usr/bin/python3
+#!/usr/bin/python3
 """
 Created by Peter Halldestam 9/12/21
 
@@ -28,14 +28,14 @@ if __name__ == "__main__":
                    avalanche=AVALANCHE_FLUID,
                    minorRadius=a,
                    wallRadius=1.2*a,
-                   include=['fluid'],
+                   analyses=['avalanche', 'convergence'],
                    output=f'outputs/baseline.h5',
                    save=f'settings/baseline.h5')
 
     ConfigureDREAM(avalanche=AVALANCHE_FLUID,
                    minorRadius=a,
                    wallRadius=1.2*a,
-                   include=['fluid/runawayRate', 'fluid/gammaDreicer'],
+                   analyses=['avalanche', 'convergence'],
                    output=f'outputs/neglect.h5',
                    save=f'settings/neglect.h5')
 
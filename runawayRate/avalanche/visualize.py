@@ -3,7 +3,6 @@
 Created by Peter Halldestam 10/12/2021,
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os
 
@@ -13,6 +12,8 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '..'))
 from plotDREAM import FIGSIZE
 from plotDREAM import plotAvalancheMultiplicationFactor, plotRunawayRateMinorRadius
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 # Settings object import
 sys.path.append(os.path.join(dir, '../..'))
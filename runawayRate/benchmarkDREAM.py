@@ -0,0 +1,319 @@
+#!/usr/bin/python3
+"""
+End-to-end benchmark of the scan pipeline. For a fixed set of representative
+scenarios (cylindrical or toroidal geometry, fluid or kinetic avalanche, and
+10, 20 or 50 radial grid points), the wall time and peak memory of each stage
+are measured separately:
+
+    configure   ConfigureDREAM, saving the settings file
+    dreami      the DREAM simulation (runDREAM.runSimulation)
+    load        loading the output with DREAMOutput
+    check       checkDREAM's electron density ratio and convergence checks
+    plot        rendering plotDREAM.plotRunawayRateMinorRadius (Agg backend)
+
+as well as the pipeline as a whole. Every scenario runs in a fresh
+interpreter, so that imports and peak memory are not shared between them.
+Tracing allocations slows allocation heavy stages down several times, so each
+scenario is run twice: untraced for the wall times, and traced for the peak
+memory, reusing the dreami output of the first pass. Python stages report
+their peak of traced allocations, and dreami its peak resident set size. Each
+benchmark run is appended as one JSON line to a history file, and compared
+with the latest run on the same host, with the same dreami and Python version,
+to flag regressions.
+
+In terminal run:
+    $ python3 benchmarkDREAM.py [-s PATTERN] [-n REPEAT] [--dreami DREAMI] [--history FILE] [--tol TOL]
+"""
+import sys, os, io, json, time, fnmatch, platform, resource, tempfile, tracemalloc, subprocess, argparse
+import warnings
+from itertools import product
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# never block on a missing display
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Default benchmark history
+HISTORY_FILE = os.path.join(dir, 'benchmarks.jsonl')
+
+# Relative slowdown (or memory growth) flagged as a regression
+TOL_REGRESSION = .2
+
+# Version of the benchmark, runs of different versions are not compared
+# (wall times are measured untraced since version 2)
+BENCHMARK_VERSION = 2
+
+# Properties of a benchmark run which must match for runs to be compared
+BASELINE_KEYS = ['host', 'dreami', 'python', 'version']
+
+STAGES = ['configure', 'dreami', 'load', 'check', 'plot']
+
+# Geometries, avalanche models and radial resolutions of the scenarios
+GEOMETRIES = ['cyl', 'tor']
+MODELS = ['fluid', 'kinetic']
+RADIAL_RESOLUTIONS = [10, 20, 50]
+
+
+def getScenarios():
+    """
+    Returns the names of all benchmark scenarios, e.g. 'tor-kinetic-nr20'.
+    """
+    return [f'{geometry}-{model}-nr{nr}' for geometry, model, nr in product(GEOMETRIES, MODELS, RADIAL_RESOLUTIONS)]
+
+
+def getScenarioKwargs(scenario):
+    """
+    Returns the ConfigureDREAM keyword arguments of a scenario.
+    """
+    from configureDREAM import CYLINDRICAL, TOROIDAL, AVALANCHE_FLUID, AVALANCHE_KINETIC
+    from configureDREAM import FIDELITY_FLUID, FIDELITY_KINETIC
+
+    geometry, model, nr = scenario.split('-')
+    if geometry not in GEOMETRIES or model not in MODELS or not nr.startswith('nr'):
+        raise ValueError(f"Invalid scenario '{scenario}'.")
+
+    return {'geometry':     {'cyl': CYLINDRICAL, 'tor': TOROIDAL}[geometry],
+            'avalanche':    {'fluid': AVALANCHE_FLUID, 'kinetic': AVALANCHE_KINETIC}[model],
+            'fidelity':     {'fluid': FIDELITY_FLUID, 'kinetic': FIDELITY_KINETIC}[model],
+            'nRadius':      int(nr[2:]),
+            'analyses':     ['avalanche', 'convergence']}
+
+
+class Stage:
+
+    def __init__(self, name, result, trace=False):
+        """
+        Context manager measuring the wall time, or if trace the peak traced
+        memory, of a pipeline stage, stored in result[name].
+        """
+        self.name   = name
+        self.result = result
+        self.trace  = trace
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.start()
+        self.tic = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        wallTime = time.perf_counter() - self.tic
+        if self.trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.result[self.name] = {'peakMemory': peak}
+        else:
+            self.result[self.name] = {'wallTime': wallTime}
+
+
+def runScenario(scenario, dreami=None, trace=False, workDir=None):
+    """
+    Runs the pipeline of a scenario in workDir (a temporary directory by
+    default). Returns a dict with the wall time [s] of each stage and of the
+    whole pipeline (excluding imports), or if trace the peak traced memory
+    [bytes] of each Python stage instead, and the status of the dreami run.
+    dreami reports both its wall time and peak memory, and if trace is only
+    run if workDir has no output of it yet.
+    """
+    from configureDREAM import ConfigureDREAM
+    from runDREAM import Job, runSimulation, JOB_DONE
+    from DREAM.DREAMOutput import DREAMOutput
+    from checkDREAM import checkElectronDensityRatio, checkRunawayRateConvergence
+    from plotDREAM import getPyplot, plotRunawayRateMinorRadius
+    plt = getPyplot()
+
+    if workDir is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return runScenario(scenario, dreami=dreami, trace=trace, workDir=tmp)
+
+    result = {}
+    tic = time.perf_counter()
+    outputFile, settingsFile = os.path.join(workDir, 'output.h5'), os.path.join(workDir, 'settings.h5')
+
+    with Stage('configure', result, trace):
+        ConfigureDREAM(output=outputFile, save=settingsFile, **getScenarioKwargs(scenario))
+
+    if trace and os.path.exists(outputFile):
+        result['status'], result['message'] = JOB_DONE, ''
+    else:
+        job = runSimulation(Job(settingsFile, outputFile=outputFile), dreami=dreami)
+        result['dreami'] = {'wallTime': job.wallTime,
+                            'peakMemory': 1024 * resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+        result['status'], result['message'] = job.status, job.message
+
+    if result['status'] == JOB_DONE:
+        with Stage('load', result, trace):
+            do = DREAMOutput(outputFile)
+
+        with Stage('check', result, trace):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                checkElectronDensityRatio(do)
+                checkRunawayRateConvergence(do)
+
+        with Stage('plot', result, trace):
+            fig = plt.figure()
+            plotRunawayRateMinorRadius(do, ax=fig.gca())
+            fig.savefig(io.BytesIO(), format='png')
+            plt.close(fig)
+
+        do.close()
+
+    result['pipeline'] = {'wallTime': time.perf_counter() - tic}
+    return result
+
+
+def _runPass(scenario, workDir, dreami=None, trace=False):
+    """
+    Runs a scenario (see runScenario) in a fresh interpreter. Returns its result.
+    """
+    cmd = [sys.executable, os.path.realpath(__file__), '--run', scenario, '--workdir', workDir]
+    if trace:
+        cmd.append('--trace')
+    if dreami is not None:
+        cmd += ['--dreami', dreami]
+    res = subprocess.run(cmd, capture_output=True)
+    if res.returncode:
+        lines = res.stderr.decode(errors='replace').strip().splitlines()
+        return {'status': 'failed', 'message': lines[-1] if lines else f'exited with code {res.returncode}'}
+    return json.loads(res.stdout.decode().strip().splitlines()[-1])
+
+
+def benchmark(scenario, dreami=None, repeat=1):
+    """
+    Runs a scenario repeat times and returns the best wall time and peak
+    memory of each stage (see runScenario). Each repetition runs the pipeline
+    untraced, for the wall times, and then traced, for the peak memory, each
+    in a fresh interpreter.
+    """
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = _runPass(scenario, tmp, dreami=dreami)
+            if 'pipeline' not in result:
+                return result
+            # the Python stages after dreami only run if it succeeded
+            if 'load' in result:
+                traced = _runPass(scenario, tmp, dreami=dreami, trace=True)
+                if 'pipeline' not in traced:
+                    return traced
+                for name in STAGES:
+                    if name in traced:
+                        result[name].update(traced[name])
+
+        result['pipeline']['peakMemory'] = max(result[name].get('peakMemory', 0) for name in STAGES if name in result)
+
+        if best is None:
+            best = result
+            continue
+        for name in STAGES + ['pipeline']:
+            if name in result and name in best:
+                best[name] = {key: min(best[name][key], result[name][key]) for key in best[name] if key in result[name]}
+    return best
+
+
+def getCommit():
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=dir, capture_output=True, check=True)
+        return res.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def loadHistory(historyFile=HISTORY_FILE):
+    """
+    Returns all benchmark runs recorded in a history file, oldest first.
+    """
+    if not os.path.exists(historyFile):
+        return []
+    with open(historyFile) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def appendHistory(run, historyFile=HISTORY_FILE):
+    with open(historyFile, 'a') as fp:
+        fp.write(json.dumps(run) + '\n')
+
+
+def getBaseline(run, history):
+    """
+    Returns the latest run of a history comparable to run (see BASELINE_KEYS),
+    or None if there is none.
+    """
+    for previous in reversed(history):
+        if all(previous.get(key) == run.get(key) for key in BASELINE_KEYS):
+            return previous
+    return None
+
+
+def getRegressions(run, previous, tol=TOL_REGRESSION):
+    """
+    Returns messages for every stage of a scenario whose wall time or peak
+    memory grew by more than a fraction tol since the previous run.
+    """
+    messages = []
+    for scenario, result in run['results'].items():
+        if scenario not in previous['results']:
+            continue
+        for name in STAGES + ['pipeline']:
+            old, new = previous['results'][scenario].get(name), result.get(name)
+            if old is None or new is None:
+                continue
+            for key in ['wallTime', 'peakMemory']:
+                if old.get(key) and new.get(key) is not None and new[key] > (1 + tol) * old[key]:
+                    messages.append(f'{scenario} {name}: {key} {old[key]:.4g} -> {new[key]:.4g} '
+                                    f'(+{100 * (new[key] / old[key] - 1):.0f}%)')
+    return messages
+
+
+def printRun(run):
+    print(f"{'scenario':<20s}" + ''.join(f'{name:>12s}' for name in STAGES + ['pipeline']) + '   peak memory')
+    for scenario, result in run['results'].items():
+        times = ''.join(f"{result[name]['wallTime']:11.3f}s" if name in result else f"{'-':>12s}"
+                        for name in STAGES + ['pipeline'])
+        memory = f"{result['pipeline']['peakMemory'] / 2**20:8.1f} MiB" if 'pipeline' in result else f"{'-':>12s}"
+        print(f"{scenario:<20s}{times}   {memory}  {result['message']}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the scan pipeline stage by stage.')
+    parser.add_argument('-s', '--scenarios', default='*', help='Scenario name pattern, e.g. "tor-*".')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='No. repetitions per scenario.')
+    parser.add_argument('--dreami', default=None, help='Path to the dreami executable.')
+    parser.add_argument('--history', default=HISTORY_FILE, help='Benchmark history file (JSON lines).')
+    parser.add_argument('--tol', type=float, default=TOL_REGRESSION, help='Relative growth flagged as a regression.')
+    parser.add_argument('--run', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # single scenario pass, in a fresh interpreter (see benchmark)
+    if args.run is not None:
+        print(json.dumps(runScenario(args.run, dreami=args.dreami, trace=args.trace, workDir=args.workdir)))
+        sys.exit()
+
+    scenarios = fnmatch.filter(getScenarios(), args.scenarios)
+    if not scenarios:
+        raise ValueError(f"No scenario matches '{args.scenarios}', expected one of {getScenarios()}.")
+
+    run = {'timestamp': time.time(), 'commit': getCommit(), 'host': platform.node(),
+           'python': platform.python_version(), 'dreami': p.getDreami(args.dreami),
+           'version': BENCHMARK_VERSION, 'repeat': args.repeat, 'results': {}}
+    for scenario in scenarios:
+        run['results'][scenario] = benchmark(scenario, dreami=args.dreami, repeat=args.repeat)
+
+    printRun(run)
+
+    baseline = getBaseline(run, loadHistory(args.history))
+    appendHistory(run, args.history)
+
+    regressions = [] if baseline is None else getRegressions(run, baseline, tol=args.tol)
+    for message in regressions:
+        print(f'REGRESSION {message}')
+
+    sys.exit(int(len(regressions) > 0))
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+"""
+Content-addressed cache of DREAM outputs. Outputs are stored under a hash of
+the full DREAMSettings tree (grids, equation system, solver, other quantities
+included, ...) together with the DREAM version, so that identical
+configurations are only simulated once. Settings initialised from another
+output (restarts and warm starts) are hashed with the contents of that output.
+The cache is bounded in size by evicting the least recently used outputs.
+
+In terminal run:
+    $ python3 cacheDREAM.py [settingsFile ...]     print hashes (and hits) of settings files
+    $ python3 cacheDREAM.py --clear                empty the cache
+"""
+import sys, os, glob, hashlib, shutil, subprocess
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Settings object import
+sys.path.append(p.DREAM_PATH)
+from DREAM.DREAMSettings import DREAMSettings
+
+# Settings not affecting the simulation result
+IGNORED_SETTINGS = [('output', 'filename')]
+
+# Settings referring to files whose contents affect the simulation result
+FILE_SETTINGS = ['fromfile']
+
+# DREAM build of every dreami executable used
+_dreamVersions = {}
+
+
+def getDREAMVersion(dreami=None):
+    """
+    Returns a string identifying the DREAM build: the git commit of the DREAM
+    repository if available, otherwise the size and modification time of the
+    dreami executable. The stand-in of standinDREAM.py gets a version of its
+    own, so that its outputs are never reused for dreami.
+
+    str dreami :    Path to the dreami executable (DREAMI_PATH by default).
+    """
+    dreami = p.getDreami(dreami)
+    if dreami in _dreamVersions:
+        return _dreamVersions[dreami]
+
+    # stand-in outputs must never be mistaken for DREAM outputs
+    if os.path.realpath(dreami) == os.path.realpath(p.DREAMI_STANDIN_PATH):
+        version = f'standin-{int(os.path.getmtime(dreami))}'
+    else:
+        try:
+            version = subprocess.run(['git', '-C', p.DREAM_PATH, 'rev-parse', 'HEAD'],
+                                     capture_output=True, check=True).stdout.decode().strip()
+        except (subprocess.CalledProcessError, OSError):
+            try:
+                stat = os.stat(dreami)
+                version = f'{stat.st_size}-{int(stat.st_mtime)}'
+            except OSError:
+                version = 'unknown'
+
+    _dreamVersions[dreami] = version
+    return version
+
+
+def _updateHash(h, obj, path=()):
+    """
+    Feeds a canonical byte representation of a (nested) settings dictionary to
+    the hash object h. Dictionary keys are sorted and arrays are hashed by
+    dtype, shape and contents.
+    """
+    if path in IGNORED_SETTINGS:
+        return
+
+    if path and path[-1] in FILE_SETTINGS and isinstance(obj, str) and os.path.isfile(obj):
+        with open(obj, 'rb') as fp:
+            for block in iter(lambda: fp.read(1 << 20), b''):
+                h.update(block)
+        return
+
+    if isinstance(obj, dict):
+        h.update(b'{')
+        for key in sorted(obj):
+            h.update(repr(key).encode())
+            _updateHash(h, obj[key], path + (key,))
+        h.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'[')
+        for item in obj:
+            _updateHash(h, item, path)
+        h.update(b']')
+    elif isinstance(obj, (str, bytes)):
+        h.update(repr(obj).encode())
+    elif obj is None:
+        h.update(b'None')
+    else:
+        arr = np.ascontiguousarray(obj)
+        if arr.dtype.kind in 'US':
+            h.update(repr(arr.tolist()).encode())
+        else:
+            h.update(f'{arr.dtype.str}{arr.shape}'.encode())
+            h.update(arr.tobytes())
+
+
+def getSettingsHash(ds, dreami=None):
+    """
+    Returns the hex digest identifying the result of a DREAM simulation.
+
+    DREAMSettings ds :  Settings object, or path to a settings file.
+    str dreami :        Path to the dreami executable (DREAMI_PATH by default).
+    """
+    if isinstance(ds, str):
+        ds = DREAMSettings(ds)
+
+    h = hashlib.sha256()
+    h.update(getDREAMVersion(dreami).encode())
+    _updateHash(h, ds.todict())
+    return h.hexdigest()
+
+
+class OutputCache:
+
+    def __init__(self, cacheDir=None, maxSize=None):
+        """
+        Size bounded store of DREAM outputs indexed by settings hash.
+
+        str cacheDir :      Directory holding the cached outputs (CACHE_DIR by default).
+        float maxSize :     Maximum total size in bytes (CACHE_MAX_SIZE by default).
+        """
+        self.cacheDir   = p.CACHE_DIR if cacheDir is None else cacheDir
+        self.maxSize    = p.CACHE_MAX_SIZE if maxSize is None else maxSize
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, f'{key}.h5')
+
+    def get(self, key, outputFile):
+        """
+        Places the cached output with the given key at outputFile. Returns True
+        on a hit and False on a miss.
+        """
+        cached = self.path(key)
+        if not os.path.exists(cached):
+            return False
+
+        os.utime(cached)  # mark as recently used
+        _place(cached, outputFile)
+        return True
+
+    def put(self, key, outputFile):
+        """
+        Stores outputFile in the cache under the given key and evicts the least
+        recently used outputs if the cache grows too large.
+        """
+        _place(outputFile, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used outputs until the cache fits in maxSize.
+        """
+        entries = []
+        for fp in glob.glob(os.path.join(self.cacheDir, '*.h5')):
+            stat = os.stat(fp)
+            entries.append((stat.st_mtime, stat.st_size, fp))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entrySize, fp in sorted(entries):
+            if size <= self.maxSize:
+                break
+            os.remove(fp)
+            size -= entrySize
+
+    def clear(self):
+        for fp in glob.glob(os.path.join(self.cacheDir, '*.h5')):
+            os.remove(fp)
+
+
+def _place(src, dst):
+    """
+    Atomically places a copy of src at dst, hard linking when possible.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp = dst + '.part'
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+if __name__ == '__main__':
+
+    cache = OutputCache()
+
+    if sys.argv[1:] == ['--clear']:
+        cache.clear()
+
+    else:
+        for settingsFile in sys.argv[1:]:
+            key = getSettingsHash(settingsFile)
+            hit = 'hit' if os.path.exists(cache.path(key)) else 'miss'
+            print(f'{settingsFile}: {key} ({hit})')
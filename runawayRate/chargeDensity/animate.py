@@ -4,69 +4,211 @@ Created by Hannes Bergström 17/9/2021,
 
 Animates the cylindrical momentum distribution with respect to
 ion charge for one or more DREAM output files.
+
+All frames (log10 of f_hot at one radius, for every output and time step,
+clipped to the colour scale) are computed once and cached. Saving to a file
+renders the frames on a process pool with the Agg backend, so no display is
+needed, and encodes them to a GIF (or a video with ffmpeg). Rendered frames are
+cached too, so re-encoding, e.g. at another frame rate, is cheap. Without
+--save, the frames are shown in an interactive view which only redraws the
+distributions (blitting).
+
+In terminal run:
+    $ python3 animate.py [output.h5] [--save animation.gif|.mp4] [--fps FPS] [-r RADIUS] [-n NWORKERS]
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
-import sys, os, glob
-from matplotlib.colors import Normalize
+import sys, os, glob, hashlib, shutil, subprocess, argparse
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.colors import BoundaryNorm
 
 dir = os.path.dirname(os.path.realpath(__file__))
 
-# plot helper function import
+# helper function imports
 sys.path.append(os.path.join(dir, '../'))
-from plotDREAM import plotRunawayRateMinorRadius
-from plotDREAM import plotFluxSurface
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-
-# Settings object import
-sys.path.append(os.path.join(dir, '../../'))
-from parameters import DREAM_PATH
-sys.path.append(DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
+from readDREAM import LazyOutput
 
 sys.path.append(os.path.join(dir, 'outputs'))
 outputDir = os.path.join(dir, 'outputs')
 
+# Cache of computed and rendered frames
+FRAME_CACHE_DIR = os.path.join(dir, '.frames')
+
+# Colour scale of log10(f_hot)
+VMIN, VMAX, LEVELS = -15, 25, 10
+
+
+def getFrameKey(outputFiles, r):
+    """
+    Returns a key identifying the frames of the given outputs at radius index r.
+    """
+    h = hashlib.sha1(f'{r} {VMIN} {VMAX} {LEVELS} clipped'.encode())
+    for fp in outputFiles:
+        h.update(f'{os.path.abspath(fp)} {os.path.getmtime(fp)}'.encode())
+    return h.hexdigest()[:16]
+
+
+def computeFrames(outputFiles, r=-1):
+    """
+    Returns the frames of the given outputs, computed once and cached: a dict
+    with the cylindrical momentum coordinates ppar and pperp of shape
+    (nOutputs, nxi, np), log10|f_hot| of shape (nt, nOutputs, nxi, np) at
+    radius index r, clipped to [VMIN, VMAX] (zeros of f_hot, whose log10 is
+    -inf, at VMIN, as the gouraud shading cannot interpolate them), the times
+    t and the ion charges Z. Only the radius r of f_hot is read.
+    """
+    cacheFile = os.path.join(FRAME_CACHE_DIR, getFrameKey(outputFiles, r), 'frames.npz')
+    if os.path.exists(cacheFile):
+        return dict(np.load(cacheFile))
+
+    ppar, pperp, logf, Z = [], [], [], []
+    for fp in outputFiles:
+        with LazyOutput(fp) as do:
+            p, xi = do.grid.hottail.p1, do.grid.hottail.p2
+            P, XI = np.meshgrid(p, xi)
+            ppar.append(P * XI)
+            pperp.append(P * np.sqrt(1 - XI**2))
+
+            f = do.eqsys.f_hot[:, r]    # (nt, nxi, np)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                logf.append(np.clip(np.nan_to_num(np.log10(np.abs(f)), nan=VMIN, neginf=VMIN, posinf=VMAX),
+                                    VMIN, VMAX))
+            Z.append(do.eqsys.n_i.ions[0].Z)
+            t = do.grid.t
+
+    nt = min(len(frames) for frames in logf)
+    frames = {'ppar': np.array(ppar), 'pperp': np.array(pperp), 't': t[:nt], 'Z': np.array(Z),
+              'logf': np.stack([frames[:nt] for frames in logf], axis=1)}
+
+    os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+    tmp = cacheFile + '.part.npz'
+    np.savez(tmp, **frames)
+    os.replace(tmp, cacheFile)
+    return frames
+
+
+def createFigure(frames, plt):
+    """
+    Creates the figure with one panel per output. Returns the figure and the
+    QuadMesh of each panel, whose data is updated for each frame.
+    """
+    nOutputs = len(frames['Z'])
+    fig, axs = plt.subplots(1, nOutputs, figsize=(5 * nOutputs, 4), squeeze=False,
+                            layout='constrained')
+    norm = BoundaryNorm(np.linspace(VMIN, VMAX, LEVELS + 1), ncolors=256)
+
+    meshes = []
+    for ind, ax in enumerate(axs[0]):
+        mesh = ax.pcolormesh(frames['ppar'][ind], frames['pperp'][ind], frames['logf'][0, ind],
+                             norm=norm, shading='gouraud')
+        ax.set_title(f"atomic charge: Z = {frames['Z'][ind]}")
+        ax.set_xlabel(r'$p_\parallel$')
+        ax.set_ylabel(r'$p_\perp$')
+        meshes.append(mesh)
+
+    fig.colorbar(meshes[-1], ax=axs[0].tolist(), label=r'$\log_{10} f_{hot}$')
+    return fig, meshes
+
+
+def updateFrame(frames, meshes, t):
+    for ind, mesh in enumerate(meshes):
+        mesh.set_array(frames['logf'][t, ind])
+    return meshes
+
+
+## rendering on a process pool (one figure per worker)
+
+_worker = {}
+
+
+def _initWorker(frames):
+    import matplotlib
+    matplotlib.use('Agg')
+    from plotDREAM import getPyplot
+    plt = getPyplot()
+    _worker['frames'] = frames
+    _worker['fig'], _worker['meshes'] = createFigure(frames, plt)
+
+
+def _renderFrame(args):
+    t, filename = args
+    updateFrame(_worker['frames'], _worker['meshes'], t)
+    _worker['fig'].suptitle(f"t = {_worker['frames']['t'][t]:.3g} s")
+    _worker['fig'].savefig(filename + '.part.png', dpi=100)
+    os.replace(filename + '.part.png', filename)
+    return filename
+
+
+def renderFrames(frames, frameDir, nWorkers=None):
+    """
+    Renders all frames not rendered before to PNG files in frameDir. Returns
+    the list of frame files.
+    """
+    os.makedirs(frameDir, exist_ok=True)
+    frameFiles = [os.path.join(frameDir, f'frame{t:04d}.png') for t in range(len(frames['t']))]
+    todo = [(t, fp) for t, fp in enumerate(frameFiles) if not os.path.exists(fp)]
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=nWorkers, initializer=_initWorker, initargs=(frames,)) as executor:
+            list(executor.map(_renderFrame, todo, chunksize=max(1, len(todo) // (4 * (os.cpu_count() or 1)))))
+
+    return frameFiles
+
+
+def encode(frameFiles, filename, fps=1):
+    """
+    Encodes rendered frames to a GIF (with Pillow) or a video (with ffmpeg).
+    """
+    if filename.lower().endswith('.gif'):
+        from PIL import Image
+        images = [Image.open(fp) for fp in frameFiles]
+        images[0].save(filename, save_all=True, append_images=images[1:],
+                       duration=int(1000 / fps), loop=0)
+    else:
+        if shutil.which('ffmpeg') is None:
+            raise Exception('Encoding videos requires ffmpeg, save as .gif instead.')
+        pattern = os.path.join(os.path.dirname(frameFiles[0]), 'frame%04d.png')
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', pattern,
+                        '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', filename],
+                       check=True)
+
+
+def show(frames, fps=1):
+    """
+    Shows the frames in a loop until the figure is closed, redrawing only the
+    distributions.
+    """
+    from matplotlib.animation import FuncAnimation
+    from plotDREAM import getPyplot
+    plt = getPyplot()
+
+    fig, meshes = createFigure(frames, plt)
+    anim = FuncAnimation(fig, lambda t: updateFrame(frames, meshes, t), frames=len(frames['t']),
+                         interval=1000 / fps, blit=True)
+    plt.show()
+    return anim
 
-# visualize specified output
-if len(sys.argv) == 2:
-    fig, ax = plt.subplots()
-    do = DREAMOutput(sys.argv[1])
-
-    dos = [do]
-    ax_list = [ax]
-
-# visualize all outputs
-elif len(sys.argv) == 1:  
-    files = sorted(glob.glob(outputDir+'/*.h5'))
-    fig, ax_list = plt.subplots(1, len(files))
-    
-    dos = []
-    for ind, fp in enumerate(files):
-        outputFile = os.path.join(outputDir, fp)
-        dos.append(DREAMOutput(outputFile))
-        
-        charge = dos[ind].eqsys.n_i.ions[0].Z
-        ax_list[ind].set_title(f'atomic charge: Z = {charge}')
-       
-else:
-    raise ValueError('Expected at most one argument.')
-        
-    
-# run animation
-while plt.fignum_exists(fig.number):
-    for t in range(1,len(dos[0].grid.t)):
-        for ind, do in enumerate(dos):
-            do.eqsys.f_hot.plot2D(r = -1, t = t, ax = ax_list[ind], coordinates = 'cylindrical', vmin = -15, vmax = 25, levels = 10)
-        try:
-            plt.pause(1)
-        except:
-            print('program closed')
-            break
-            
 
+if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Animate f_hot for one or all outputs.')
+    parser.add_argument('outputFile', nargs='?', default=None, help='Output to animate (default: all outputs).')
+    parser.add_argument('--save', default=None, help='Animation file (.gif, or a video format with ffmpeg).')
+    parser.add_argument('--fps', type=float, default=1., help='Frames per second.')
+    parser.add_argument('-r', '--radius', type=int, default=-1, help='Radial grid index.')
+    parser.add_argument('-n', '--nWorkers', type=int, default=None, help='No. rendering processes.')
+    args = parser.parse_args()
 
+    # visualize specified output, or all outputs
+    files = [args.outputFile] if args.outputFile else sorted(glob.glob(outputDir+'/*.h5'))
+    if not files:
+        raise Exception('No outputs to animate.')
 
+    frames = computeFrames(files, r=args.radius)
 
+    if args.save:
+        frameDir = os.path.join(FRAME_CACHE_DIR, getFrameKey(files, args.radius))
+        encode(renderFrames(frames, frameDir, nWorkers=args.nWorkers), args.save, fps=args.fps)
+        print(f"Saved {len(frames['t'])} frames to {args.save}")
+    else:
+        show(frames, fps=args.fps)
@@ -28,5 +28,6 @@ if __name__ == "__main__":
 
         ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer'],
                        ion=scanValue, verbose=(len(sys.argv)==2),
+                       visualize=(len(sys.argv)==2),
                        output=f'outputs/outputZ{scanValue[1]}.h5',
                        save=f'settings/settingZ{scanValue[1]}.h5')
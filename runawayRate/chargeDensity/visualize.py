@@ -6,7 +6,6 @@ Visualizes the cylindrical distribution and radial profile with
 respect to ion charge for one or more DREAM output files.
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os, glob
 import time
@@ -18,6 +17,8 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '../'))
 from plotDREAM import plotRunawayRateMinorRadius
 from plotDREAM import plotFluxSurface
+from plotDREAM import getPyplot
+plt = getPyplot()
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 # Settings object import
@@ -5,9 +5,11 @@ Modified by Hannes Bergström.
 
 This file contains helper functions for quick
 
+In terminal run (one process for all outputs of a scan):
+    $ python3 checkDREAM.py output.h5 [output.h5 ...]
 """
 import sys, os, warnings
-import numpy as np
+# numpy is imported by the functions using it, to keep startup fast (see checkStartup.py)
 
 dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -15,9 +17,6 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '..'))
 import parameters as p
 
-# Output object imports
-sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
 
 
 def checkElectronDensityRatio(do, interupt=False):
@@ -31,6 +30,8 @@ def checkElectronDensityRatio(do, interupt=False):
     bool interupt :         Interupts program by raising an exception rather
                             than only showing a warning.
     """
+    import numpy as np
+
     n_re = do.eqsys.n_re.data
     n_cold = do.eqsys.n_cold.data
     if np.max(n_re / n_cold) > p.TOL_ELECTRON_DENSITY_RATIO:
@@ -41,12 +42,39 @@ def checkElectronDensityRatio(do, interupt=False):
             warnings.warn(msg)
 
 
+def isRunawayRateConverged(runawayRate, time=None, minTime=0.):
+    """
+    Returns True if the relative difference between the runaway rate at the
+    last saved time and at LIM_RUNAWAY_RATE_CONVERGENCE of the simulated time
+    is smaller than TOL_RUNAWAY_RATE_CONVERGENCE (defined in parameters.py).
+    Returns False if fewer than MIN_SAVED_TIMES_CONVERGENCE distinct times are
+    saved, or if less than minTime has been simulated.
+
+    numpy.ndarray runawayRate : Runaway rate of shape (nt, nr).
+    numpy.ndarray time :        Saved times of shape (nt,), evenly spaced if None.
+    float minTime :             Simulated time needed before the runaway rate can be converged.
+    """
+    import numpy as np
+
+    runawayRate = np.asarray(runawayRate)
+    time = np.arange(runawayRate.shape[0], dtype=float) if time is None else np.asarray(time, dtype=float)
+    if len(np.unique(time)) < p.MIN_SAVED_TIMES_CONVERGENCE or time[-1] < minTime:
+        return False
+
+    # last saved time at or before LIM_RUNAWAY_RATE_CONVERGENCE of the simulated time
+    tSample = time[0] + p.LIM_RUNAWAY_RATE_CONVERGENCE * (time[-1] - time[0])
+    sample = np.searchsorted(time, tSample, side='right') - 1
+    if time[sample] == time[-1]:
+        return False
+    return np.max(np.abs(runawayRate[-1] - runawayRate[sample]) / runawayRate[-1]) < p.TOL_RUNAWAY_RATE_CONVERGENCE
+
+
 def checkRunawayRateConvergence(do, interupt=False):
     """
     Checks if the runaway rate in the given output has converged with respect to time.
     It is considered to have converged if the relative difference between the runaway rate
     at the last time step and the runaway rate at some percentage of the total simulated time
-    is smaller than some tolerance.
+    is smaller than some tolerance, and at least MIN_SAVED_TIMES_CONVERGENCE times are saved.
     The percentage at which the rates are compared is specified by LIM_RUNAWAY_RATE_CONVERGENCE
     and the tolerance is specified by TOL_RUNAWAY_RATE_CONVERGENCE (defined in parameters.py).
     If the runaway rate has not converged, a warning is shown (or exception if interupt is True).
@@ -55,14 +83,8 @@ def checkRunawayRateConvergence(do, interupt=False):
     bool interupt :         Interupts program by raising an exception rather
                             than only showing a warning.
     """
-    runawayRate = do.other.fluid.runawayRate.data
-    sample = int(p.LIM_RUNAWAY_RATE_CONVERGENCE * (runawayRate.shape[0]-1))
-    
-    converged = False
-    if np.max(np.abs(runawayRate[-1] - runawayRate[sample]) / runawayRate[-1]) < p.TOL_RUNAWAY_RATE_CONVERGENCE:
-    	converged = True
-    
-    if not converged:
+    runawayRate = do.other.fluid.runawayRate
+    if not isRunawayRateConverged(runawayRate.data, time=getattr(runawayRate, 'time', None)):
         msg = f"\n\nTransient convergence of runaway rate not obtained in {do.filename}. Convergence after {p.LIM_RUNAWAY_RATE_CONVERGENCE*100}% is not within {p.TOL_RUNAWAY_RATE_CONVERGENCE}"
         if interupt:
             raise Exception(msg)
@@ -73,12 +95,23 @@ def checkRunawayRateConvergence(do, interupt=False):
 
 if __name__ == '__main__':
 
-    print(sys.argv[1])
-    if not len(sys.argv) == 2:
+    if len(sys.argv) < 2:
         print(sys.argv)
-        raise Exception('Must include one argument being the DREAM output file.')
-
-
-    do = DREAMOutput(sys.argv[1])
-    checkElectronDensityRatio(do, interupt=True)
-    checkRunawayRateConvergence(do, interupt=True)
+        raise Exception('Must include at least one argument being a DREAM output file.')
+
+    # Output object import, only needed when checking outputs
+    p.requireDREAM()
+    from DREAM.DREAMOutput import DREAMOutput
+
+    nFailed = 0
+    for outputFile in sys.argv[1:]:
+        print(outputFile)
+        try:
+            do = DREAMOutput(outputFile)
+            checkElectronDensityRatio(do, interupt=True)
+            checkRunawayRateConvergence(do, interupt=True)
+        except Exception as err:
+            print(err)
+            nFailed += 1
+
+    sys.exit(int(nFailed > 0))
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""
+Measures the import time of the helper modules started once per scan (or per
+output) and compares it with a startup budget. Each module is imported in a
+fresh interpreter, and the best of a few repetitions is reported. The generate
+scripts need numpy for their scan values, so they are timed with numpy
+already imported, i.e. their budgets are on top of numpy. Modules needing
+DREAM at import are skipped if DREAM is not installed.
+
+In terminal run:
+    $ python3 checkStartup.py [-n REPEAT]
+"""
+import sys, os, subprocess, argparse
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Startup budgets [s] of importing each module (excluding interpreter startup)
+STARTUP_BUDGETS = {
+    'parameters':                                               0.01,
+    'checkDREAM':                                               0.03,   # numpy only on first check
+    'plotDREAM':                                                0.03,   # numpy and matplotlib only on first plot
+    'avalanche/generateAvalanche':                              0.03,
+    'chargeDensity/generateChargeScan':                         0.03,
+    'electricField/generateElectricScan':                       0.03,
+    'temperature/generateTemperatureScan':                      0.03,
+    'radialProfile/generateProfile':                            0.03,
+    'geometryScans/elongation/generateElongationScan':          0.03,
+    'geometryScans/shafranovShift/generateShafranovShiftScan':  0.03,
+    'geometryScans/triangularity/generateTriangularityScan':    0.03,
+    'geometryScans/epsilon/dreicer/generateEpsilonScan':        0.03,
+    'geometryScans/epsilon/avalanche/generateEpsilonScan':      0.03,
+}
+
+# Modules timed with numpy already imported
+PRELOADED = {'generate': 'numpy'}
+
+_TIMER = """
+import sys, time
+sys.path[:0] = [{path!r}, {dir!r}, {root!r}]
+{preload}
+tic = time.perf_counter()
+import {module}
+print(time.perf_counter() - tic)
+"""
+
+
+def getImportTime(module, repeat=5):
+    """
+    Returns the shortest time [s] out of repeat fresh imports of a module.
+
+    str module :    Module name, or path relative to this directory without
+                    '.py', e.g. 'electricField/generateElectricScan'.
+    int repeat :    No. repetitions.
+    """
+    path, name = os.path.split(module)
+    preload = ''.join(f'import {m}\n' for prefix, m in PRELOADED.items() if name.startswith(prefix))
+    code = _TIMER.format(path=os.path.join(dir, path), dir=dir, root=os.path.join(dir, '..'),
+                         preload=preload, module=name)
+    times = []
+    for _ in range(repeat):
+        res = subprocess.run([sys.executable, '-c', code], capture_output=True, check=True)
+        times.append(float(res.stdout.decode().strip().splitlines()[-1]))
+    return min(times)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Check import times against the startup budget.')
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='No. repetitions per module.')
+    args = parser.parse_args()
+
+    width = max(map(len, STARTUP_BUDGETS))
+    overBudget = False
+    for module, budget in STARTUP_BUDGETS.items():
+        try:
+            t = getImportTime(module, repeat=args.repeat)
+        except subprocess.CalledProcessError as err:
+            if b"No module named 'DREAM'" not in err.stderr:
+                raise
+            print(f'{module:<{width}s} {"-":>8s}     (budget {1e3*budget:6.1f} ms)  skipped, needs DREAM')
+            continue
+        status = 'ok' if t <= budget else 'OVER BUDGET'
+        overBudget |= t > budget
+        print(f'{module:<{width}s} {1e3*t:8.1f} ms  (budget {1e3*budget:6.1f} ms)  {status}')
+
+    sys.exit(int(overBudget))
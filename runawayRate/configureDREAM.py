@@ -5,26 +5,29 @@ modified by Hannes Bergström 26/8/21,
 modified by Peter Halldestam 4/9/21,
 modified by Hannes Bergström 8/9/21.
 modified by Hannes Bergström 25/11/21.
+
+Configuring DREAM settings is headless: this module never imports matplotlib
+and never plots, unless a geometry preview is explicitly asked for (see
+ConfigureDREAM.visualize). Without a display, matplotlib (if imported by DREAM
+itself) falls back on the non-interactive Agg backend.
 """
-import sys, os
-import numpy as np
-import matplotlib.pyplot as plt
+import sys, os, copy
+from concurrent.futures import ThreadPoolExecutor
 
 dir = os.path.dirname(os.path.realpath(__file__))
 
+# never block on a missing display
+if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
 # Parameters import (quite a few...)
 sys.path.append(os.path.join(dir, '..'))
 import parameters as p
 
-# Settings object imports
+# DREAM (settings objects) and numpy are imported by the methods using them,
+# so that importing this module, e.g. for its constants, is fast (see checkStartup.py)
 sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMSettings import DREAMSettings
-from DREAM.Settings.Equations.IonSpecies import IONS_PRESCRIBED_FULLY_IONIZED
-from DREAM.Settings.Equations.DistributionFunction import BC_F_0
-from DREAM.Settings.Equations.DistributionFunction import SYNCHROTRON_MODE_NEGLECT
-from DREAM.Settings.Equations.DistributionFunction import AD_INTERP_UPWIND, AD_INTERP_TCDF, AD_INTERP_JACOBIAN_UPWIND
-from DREAM.Settings.Solver import LINEAR_IMPLICIT, NONLINEAR, LINEAR_SOLVER_MKL
-from DREAM.Settings.Equations.RunawayElectrons import DREICER_RATE_NEURAL_NETWORK
+
 # Geometries
 CYLINDRICAL = 1
 TOROIDAL = 2
@@ -37,6 +40,47 @@ AVALANCHE_KINETIC   = 4
 AVALANCHE_TRAPPING_NEGLECT = 1
 AVALANCHE_TRAPPING_INCLUDE = 2
 
+# Fidelity, i.e. whether to resolve the electron distribution kinetically
+FIDELITY_KINETIC = 1
+FIDELITY_FLUID = 2
+
+# Other quantities which can only be produced with a kinetic grid
+KINETIC_QUANTITY_GROUPS = ['hottail', 'runaway']
+
+# Keyword arguments which ConfigureDREAM.update can change on an existing configuration
+GRID_KWARGS = {'geometry', 'minorRadius', 'majorRadius', 'wallRadius',
+               'maxElongation', 'maxTriangularity', 'maxShafranovShift',
+               'nRadius', 'nMomentum', 'nPitch', 'nTime'}
+EQUATION_KWARGS = {'electricField', 'temperature'}
+
+# Analyses run on outputs: the other quantities each needs, and the no. time
+# steps it needs saved (None for every time step)
+ANALYSES = {
+    'runawayRate':  (['fluid/runawayRate'], 1),                                         # final runaway rate profile
+    'dreicer':      (['fluid/runawayRate', 'fluid/gammaDreicer'], 1),                   # final Dreicer generation
+    'avalanche':    (['fluid/runawayRate', 'fluid/gammaDreicer', 'fluid/GammaAva'], 1), # final avalanche growth rate
+    'convergence':  (['fluid/runawayRate'], 5),                                         # checkDREAM.isRunawayRateConverged
+    'transient':    (['fluid/runawayRate'], None),                                      # runaway rate vs. time
+}
+
+
+def getOutputPolicy(analyses):
+    """
+    Returns the minimal other quantities to include and the no. time steps to
+    save (None for every time step), for a list of analyses (see ANALYSES) run
+    on an output. The timing file is always written, as it is small and needed
+    for solver profiling (see profileDREAM.py).
+    """
+    include, saveSteps = [], 1
+    for analysis in analyses:
+        if analysis not in ANALYSES:
+            raise ValueError(f"Unknown analysis '{analysis}'.")
+        quantities, steps = ANALYSES[analysis]
+        include += [quantity for quantity in quantities if quantity not in include]
+        saveSteps = None if None in (saveSteps, steps) else max(saveSteps, steps)
+
+    return include, saveSteps
+
 class ConfigureDREAM:
 
     def __init__(self, output='output.h5', save='settings.h5', **kwargs):
@@ -46,10 +90,14 @@ class ConfigureDREAM:
 
         OPTIONAL KEYWORD ARGUMENTS:
             str output :                Name of DREAM output object save file.
-            str save :                  Name of DREAM settings object save file.
+            str save :                  Name of DREAM settings object save file (None to not save).
             bool verbose :              Show information.
             DREAMSettings ds :          Settings object.
             str include :               Or list of strings, other quantities to include.
+            list analyses :             Analyses run on the output (see ANALYSES), adding the other
+                                        quantities they need to include, and setting saveSteps
+                                        (see getOutputPolicy).
+            int saveSteps :             No. saved time steps (besides the initial), every time step by default.
             int geometry :              Geometry type.
             float minorRadius :         Prescribed minor radius of the magnetic field.
             float majorRadius :         Prescribed major radius of the magnetic field.
@@ -61,6 +109,13 @@ class ConfigureDREAM:
             float maxShafranovShift :   Shaping parameter.
             tuple ion :                 Name and proton number pair describing the type of ion used in the plasma.
             bool avalanche :            If True, configures avalanche generation and appropriate biuniform grid.
+            int fidelity :              FIDELITY_KINETIC to evolve f_hot on a hot-tail grid, or FIDELITY_FLUID
+                                        to only evolve fluid quantities (no momentum grids, much cheaper).
+            bool visualize :            Preview the magnetic geometry (see visualize).
+            int nRadius :               No. radial grid points.
+            int nMomentum :             No. momentum grid points.
+            int nPitch :                No. pitch grid points (sets the max pitch step in a toroidal geometry).
+            int nTime :                 No. time steps.
 
         """
         self.verbose            = kwargs.get('verbose',             False)
@@ -78,9 +133,28 @@ class ConfigureDREAM:
         self.ion                = kwargs.get('ion',                 ('D', 1))
         self.avalanche          = kwargs.get('avalanche',           AVALANCHE_NEGLECT)
         self.avaTrapping        = kwargs.get('avaTrapping',         AVALANCHE_TRAPPING_NEGLECT)
+        self.fidelity           = kwargs.get('fidelity',            FIDELITY_KINETIC)
+        self.nRadius            = kwargs.get('nRadius',             p.N_RADIUS)
+        self.nMomentum          = kwargs.get('nMomentum',           p.N_MOMENTUM)
+        self.nPitch             = kwargs.get('nPitch',              p.N_PITCH)
+        self.nTime              = kwargs.get('nTime',               p.N_TIME)
+        self.analyses           = kwargs.get('analyses',            None)
+        self.saveSteps          = kwargs.get('saveSteps',           None)
+
+        # minimal output needed by the analyses
+        if self.analyses is not None:
+            include, saveSteps = getOutputPolicy(self.analyses)
+            if self.include is not None:
+                include = (self.include if type(self.include) is list else [self.include]) + include
+            self.include = list(dict.fromkeys(include))
+            if 'saveSteps' not in kwargs:
+                self.saveSteps = saveSteps
+
+        self.checkFidelity()
 
         # Creattope and configure DREAM settings
         if self.ds is None:
+            from DREAM.DREAMSettings import DREAMSettings
             self.ds = DREAMSettings()
             self.configureGrids()
             self.configureEquations()
@@ -92,17 +166,89 @@ class ConfigureDREAM:
                     self.ds.other.include(quantity)
             else:
                 self.ds.other.include(self.include)
-        # if self.geometry == TOROIDAL: self.ds.radialgrid.visualize()
 
         # prepare simulation
         self.ds.output.setTiming(stdout=True, file=True)
+        if self.saveSteps is not None:
+            self.ds.timestep.setNumberOfSaveSteps(self.saveSteps)
         self.ds.output.setFilename(output)
-        self.ds.save(save)
+        self.settingsFile = save
+        if save is not None:
+            self.ds.save(save)
+
+        if kwargs.get('visualize', False):
+            self.visualize()
+
+
+
+    def update(self, **kwargs):
+        """
+        Updating an existing configuration with new keyword arguments (see
+        __init__), re-configuring only the affected parts of the DREAM settings
+        object. Supports the arguments in GRID_KWARGS and EQUATION_KWARGS.
+        """
+        if self.verbose:
+            print(self.update.__doc__)
+
+        unsupported = kwargs.keys() - GRID_KWARGS - EQUATION_KWARGS
+        if unsupported:
+            raise ValueError(f'Cannot update {", ".join(sorted(unsupported))} of an existing configuration.')
 
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+        ds = self.ds
+
+        if kwargs.keys() & GRID_KWARGS:
+            self.configureGrids()
+
+        if 'electricField' in kwargs:
+            ds.eqsys.E_field.setPrescribedData(self.electricField)
+
+        if 'temperature' in kwargs:
+            ds.eqsys.T_cold.setPrescribedData(self.temperature)
+            if self.fidelity == FIDELITY_KINETIC:
+                ds.eqsys.f_hot.setInitialProfiles(n0=p.ELECTRON_DENSITY, T0=self.temperature)
+
+        return self
+
+
+    def visualize(self, **kwargs):
+        """
+        Plotting the magnetic geometry of the configured radial grid. This is
+        the only place where ConfigureDREAM plots anything. Keyword arguments
+        are passed to DREAM's RadialGrid.visualize.
+        """
+        if self.verbose:
+            print(self.visualize.__doc__)
+
+        if self.geometry == TOROIDAL:
+            self.ds.radialgrid.visualize(**kwargs)
+        elif self.verbose:
+            print('Nothing to visualize for a cylindrical geometry.')
 
 
     ## helper functions for configuring DREAM settings
 
+    def checkFidelity(self):
+        """
+        Checking that the requested quantities can be produced with the given fidelity.
+        """
+        if self.verbose:
+            print(self.checkFidelity.__doc__)
+
+        if self.fidelity not in (FIDELITY_KINETIC, FIDELITY_FLUID):
+            raise ValueError("Invalid fidelity input!")
+
+        if self.fidelity == FIDELITY_FLUID:
+            if self.avalanche == AVALANCHE_KINETIC:
+                raise ValueError('Kinetic avalanche generation requires FIDELITY_KINETIC.')
+
+            include = self.include if type(self.include) is list else [self.include]
+            for quantity in include:
+                if quantity is not None and quantity.split('/')[0] in KINETIC_QUANTITY_GROUPS:
+                    raise ValueError(f"Quantity '{quantity}' requires FIDELITY_KINETIC.")
+
     def setToroidal(self):
         """
         Setting up a toroidal geometry.
@@ -110,6 +256,7 @@ class ConfigureDREAM:
         if self.verbose:
             print(self.setToroidal.__doc__)
 
+        import numpy as np
         ds = self.ds
 
         # set type to 2
@@ -143,8 +290,8 @@ class ConfigureDREAM:
 
 
         # automatically adjust xi-grid
-        ds.hottailgrid.setTrappedPassingBoundaryLayerGrid(dxiMax=p.MAX_PITCH_STEP)
-        ds.radialgrid.visualize()
+        if self.fidelity == FIDELITY_KINETIC:
+            ds.hottailgrid.setTrappedPassingBoundaryLayerGrid(dxiMax=p.MAX_PITCH_STEP*p.N_PITCH/self.nPitch)
 
     def configureGrids(self):
         """
@@ -158,7 +305,7 @@ class ConfigureDREAM:
         # general radial grid settings
         ds.radialgrid.setWallRadius(self.wallRadius)
         ds.radialgrid.setMinorRadius(self.minorRadius)
-        ds.radialgrid.setNr(p.N_RADIUS)
+        ds.radialgrid.setNr(self.nRadius)
 
         if self.geometry == CYLINDRICAL:
             if self.verbose:
@@ -175,18 +322,23 @@ class ConfigureDREAM:
 
 
         # hot-tail and runaway grid settings
-        if self.avalanche == AVALANCHE_KINETIC:
-            ds.hottailgrid.setNxi(p.N_PITCH)
-            ds.hottailgrid.setNp(p.N_PSEP)
+        if self.fidelity == FIDELITY_FLUID:
+            ds.hottailgrid.setEnabled(False)
+            ds.runawaygrid.setEnabled(False)
+
+        elif self.avalanche == AVALANCHE_KINETIC:
+            nPsep = int(self.nMomentum + p.PSEP - p.MAX_MOMENTUM)
+            ds.hottailgrid.setNxi(self.nPitch)
+            ds.hottailgrid.setNp(nPsep)
             ds.hottailgrid.setPmax(p.PSEP)
             ds.runawaygrid.setEnabled(True)
-            ds.runawaygrid.setNxi(p.N_PITCH)
-            ds.runawaygrid.setNp(p.N_MOMENTUM-p.N_PSEP)
+            ds.runawaygrid.setNxi(self.nPitch)
+            ds.runawaygrid.setNp(self.nMomentum-nPsep)
             ds.runawaygrid.setPmax(p.MAX_MOMENTUM)
         else:
 
-            ds.hottailgrid.setNxi(p.N_PITCH)
-            ds.hottailgrid.setNp(p.N_MOMENTUM)
+            ds.hottailgrid.setNxi(self.nPitch)
+            ds.hottailgrid.setNp(self.nMomentum)
             ds.hottailgrid.setPmax(p.MAX_MOMENTUM)
 
 
@@ -200,7 +352,7 @@ class ConfigureDREAM:
 
         # time grid settings
         ds.timestep.setTmax(p.MAX_TIME)
-        ds.timestep.setNt(p.N_TIME)
+        ds.timestep.setNt(self.nTime)
 
 
     def configureEquations(self):
@@ -211,6 +363,13 @@ class ConfigureDREAM:
         if self.verbose:
             print(self.configureEquations.__doc__)
 
+        from DREAM.Settings.Equations.IonSpecies import IONS_PRESCRIBED_FULLY_IONIZED
+        from DREAM.Settings.Equations.DistributionFunction import BC_F_0
+        from DREAM.Settings.Equations.DistributionFunction import SYNCHROTRON_MODE_NEGLECT
+        from DREAM.Settings.Equations.DistributionFunction import AD_INTERP_UPWIND, AD_INTERP_TCDF, AD_INTERP_JACOBIAN_UPWIND
+        from DREAM.Settings.Solver import LINEAR_IMPLICIT, NONLINEAR, LINEAR_SOLVER_MKL
+        from DREAM.Settings.Equations.RunawayElectrons import DREICER_RATE_NEURAL_NETWORK
+
         ds = self.ds
 
         ds.eqsys.E_field.setPrescribedData(self.electricField)
@@ -221,7 +380,8 @@ class ConfigureDREAM:
         # ds.eqsys.T_cold.setPrescribedData(temperature=T, radius=rT)
 
         # Set initial hot electron Maxwellian
-        ds.eqsys.f_hot.setInitialProfiles(n0=p.ELECTRON_DENSITY, T0=self.temperature)
+        if self.fidelity == FIDELITY_KINETIC:
+            ds.eqsys.f_hot.setInitialProfiles(n0=p.ELECTRON_DENSITY, T0=self.temperature)
 
         # Set ions
         ds.eqsys.n_i.addIon(name=self.ion[0], Z=self.ion[1], n=p.ELECTRON_DENSITY/self.ion[1],
@@ -245,9 +405,10 @@ class ConfigureDREAM:
 
 
         # Set boundary condition type at pMax
-        ds.eqsys.f_hot.setBoundaryCondition(BC_F_0) # F=0 outside the boundary
-        ds.eqsys.f_hot.setSynchrotronMode(SYNCHROTRON_MODE_NEGLECT)
-        ds.eqsys.f_hot.setAdvectionInterpolationMethod(ad_int=AD_INTERP_UPWIND)
+        if self.fidelity == FIDELITY_KINETIC:
+            ds.eqsys.f_hot.setBoundaryCondition(BC_F_0) # F=0 outside the boundary
+            ds.eqsys.f_hot.setSynchrotronMode(SYNCHROTRON_MODE_NEGLECT)
+            ds.eqsys.f_hot.setAdvectionInterpolationMethod(ad_int=AD_INTERP_UPWIND)
         # ds.eqsys.f_hot.setAdvectionInterpolationMethod(ad_int=AD_INTERP_TCDF, ad_jac=AD_INTERP_JACOBIAN_UPWIND)
 
         # Set solver type
@@ -256,6 +417,44 @@ class ConfigureDREAM:
 
 
 
+def configureBatch(variants, nThreads=None, **kwargs):
+    """
+    Configures a batch of DREAM settings sharing one base configuration, e.g.
+    the points of a scan. The base settings object is configured once, each
+    variant is derived from a copy of it by ConfigureDREAM.update, and all
+    settings files are written in one pass on a thread pool. Returns the list
+    of ConfigureDREAM objects.
+
+    list variants :     Dicts with the keys 'output' and 'save' (see ConfigureDREAM),
+                        and keyword arguments overriding the base configuration
+                        (see ConfigureDREAM.update).
+    int nThreads :      No. threads writing settings files.
+    bool visualize :    Preview the magnetic geometry of each variant.
+
+    Remaining keyword arguments configure the base (see ConfigureDREAM).
+    """
+    visualize = kwargs.pop('visualize', False)
+    base = ConfigureDREAM(save=None, **kwargs)
+
+    configs = []
+    for variant in variants:
+        variant = dict(variant)
+        output, save = variant.pop('output'), variant.pop('save')
+
+        config = copy.deepcopy(base).update(**variant)
+        config.ds.output.setFilename(output)
+        configs.append((config, save))
+
+    with ThreadPoolExecutor(max_workers=nThreads) as executor:
+        list(executor.map(lambda args: args[0].ds.save(args[1]), configs))
+
+    if visualize:
+        for config, _ in configs:
+            config.visualize()
+
+    return [config for config, _ in configs]
+
+
 if __name__ == '__main__':
 
     ConfigureDREAM(geometry=CYLINDRICAL, include='fluid/runawayRate', verbose=(len(sys.argv)==2))
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""
+Grid convergence study of the final runaway rate. For each of the resolutions
+(Np, Nxi, Nt), a ladder of successively refined grids is run through
+ConfigureDREAM while the other two resolutions are kept at their finest level.
+The converged runaway rate is estimated by Richardson extrapolation of the
+three finest rungs of each ladder, and the cheapest resolution meeting the
+target error is reported. The target error is split evenly between the three
+resolutions.
+
+In terminal run:
+    $ python3 convergenceStudy.py [--tol TOL] [--levels N] [--toroidal]
+"""
+import sys, os, argparse
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Output object import
+sys.path.append(p.DREAM_PATH)
+from DREAM.DREAMOutput import DREAMOutput
+
+# helper function imports
+from configureDREAM import configureBatch, CYLINDRICAL, TOROIDAL
+from adaptiveScan import getFinalRunawayRate
+from runDREAM import runScan
+
+# Resolutions studied, as ConfigureDREAM keyword arguments, with their coarsest rung
+RESOLUTIONS = {
+    'nMomentum':    p.N_MOMENTUM // 2,
+    'nPitch':       p.N_PITCH // 2,
+    'nTime':        p.N_TIME // 2,
+}
+
+# Default study directory
+STUDY_DIR = os.path.join(dir, 'gridConvergence')
+
+
+def richardsonExtrapolate(values, ratio=2):
+    """
+    Returns the extrapolated limit and the observed order of convergence of a
+    quantity computed on grids refined by a constant ratio. Uses the three
+    finest values (coarse to fine). If the values do not converge monotonically,
+    nothing can be extrapolated and nan is returned for both.
+
+    list values :   Quantity on successively refined grids (at least three).
+    float ratio :   Refinement ratio between consecutive grids.
+    """
+    f1, f2, f3 = np.asarray(values, dtype=float)[-3:]
+    d12, d23 = f2 - f1, f3 - f2
+
+    if d23 == 0:
+        return f3, np.inf
+    if d12 == 0 or d12 * d23 < 0 or abs(d23) >= abs(d12):
+        return np.nan, np.nan
+
+    order = np.log(d12 / d23) / np.log(ratio)
+    return f3 + d23 / (ratio**order - 1), order
+
+
+def getLadder(coarsest, nLevels=3, ratio=2):
+    """
+    Returns the resolutions of a ladder of nLevels grids, coarse to fine.
+    """
+    return [int(round(coarsest * ratio**k)) for k in range(nLevels)]
+
+
+def convergenceStudy(tol=1e-2, nLevels=3, ratio=2, studyDir=STUDY_DIR, verbose=False, **kwargs):
+    """
+    Runs the grid convergence study. Returns a dict mapping each resolution
+    (see RESOLUTIONS) to a dict with its ladder, the final runaway rates, the
+    extrapolated runaway rate, the observed order, the relative errors, the
+    cheapest safe resolution (None if not even the finest rung is within tol)
+    and whether the ladder converges monotonically. If it does not, the
+    extrapolated runaway rate, order and errors are nan and the cheapest
+    resolution is None.
+
+    float tol :         Target relative error of the final runaway rate.
+    int nLevels :       No. rungs of each ladder (at least three).
+    float ratio :       Refinement ratio between rungs.
+    str studyDir :      Directory the settings and outputs are written to.
+    bool verbose :      Show information.
+
+    Remaining keyword arguments configure the base (see configureDREAM.ConfigureDREAM)
+    and may include 'runKwargs', passed to runDREAM.runScan.
+    """
+    if verbose:
+        print(convergenceStudy.__doc__)
+
+    if nLevels < 3:
+        raise ValueError('Richardson extrapolation needs at least three rungs.')
+
+    runKwargs = kwargs.pop('runKwargs', {})
+    ladders = {name: getLadder(coarsest, nLevels, ratio) for name, coarsest in RESOLUTIONS.items()}
+    finest = {name: ladder[-1] for name, ladder in ladders.items()}
+
+    # distinct grids: each ladder with the other resolutions at their finest rung
+    grids = {}
+    for name, ladder in ladders.items():
+        for n in ladder:
+            res = dict(finest, **{name: n})
+            grids[tuple(res[key] for key in RESOLUTIONS)] = res
+
+    settingsDir = os.path.join(studyDir, 'settings/')
+    outputDir = os.path.join(studyDir, 'outputs/')
+    os.makedirs(settingsDir, exist_ok=True)
+    os.makedirs(outputDir, exist_ok=True)
+
+    variants = []
+    for key, res in grids.items():
+        name = '_'.join(map(str, key))
+        variants.append(dict(res, output=os.path.join(outputDir, f'output{name}.h5'),
+                             save=os.path.join(settingsDir, f'settings{name}.h5')))
+
+    kwargs.setdefault('include', ['fluid/runawayRate'])
+    configureBatch(variants, verbose=verbose, **kwargs)
+    runScan(settingsDir, verbose=verbose, **runKwargs)
+
+    runawayRates = {}
+    for key, variant in zip(grids, variants):
+        if os.path.exists(variant['output']):
+            runawayRates[key] = getFinalRunawayRate(DREAMOutput(variant['output']))
+        elif verbose:
+            print(f'No output for resolution {key}, ignoring it.')
+
+    report = {}
+    for name, ladder in ladders.items():
+        keys = [tuple(dict(finest, **{name: n})[k] for k in RESOLUTIONS) for n in ladder]
+        if not all(key in runawayRates for key in keys):
+            raise Exception(f'Missing outputs of the {name} ladder.')
+
+        values = np.array([runawayRates[key] for key in keys])
+        extrapolated, order = richardsonExtrapolate(values, ratio)
+        converged = not np.isnan(extrapolated)
+        errors = np.abs(values - extrapolated) / abs(extrapolated)
+
+        safe = [n for n, error in zip(ladder, errors) if error <= tol / len(RESOLUTIONS)]
+        report[name] = {'ladder': ladder, 'runawayRates': values, 'extrapolated': extrapolated,
+                        'order': order, 'errors': errors, 'cheapest': safe[0] if safe else None,
+                        'converged': converged}
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Grid convergence study of the final runaway rate.')
+    parser.add_argument('--tol', type=float, default=1e-2, help='Target relative error.')
+    parser.add_argument('--levels', type=int, default=3, help='No. rungs per resolution.')
+    parser.add_argument('--toroidal', action='store_true', help='Use a toroidal rather than cylindrical geometry.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show information.')
+    args = parser.parse_args()
+
+    report = convergenceStudy(tol=args.tol, nLevels=args.levels, verbose=args.verbose,
+                              geometry=TOROIDAL if args.toroidal else CYLINDRICAL,
+                              runKwargs={'dreami': p.DREAMI_PATH})
+
+    for name, res in report.items():
+        if res['converged']:
+            print(f'{name}: extrapolated runaway rate {res["extrapolated"]:.4e}, order {res["order"]:.2f}')
+        else:
+            print(f'{name}: not converged, the runaway rate is non-monotonic in {name}')
+        for n, value, error in zip(res['ladder'], res['runawayRates'], res['errors']):
+            print(f'    {n:6d}  {value:.4e}  rel. error {error:.2e}')
+
+    cheapest = {name: res['cheapest'] for name, res in report.items()}
+    if not all(res['converged'] for res in report.values()):
+        print('Ladders are not converged, refine the coarsest rungs or add rungs.')
+        sys.exit(1)
+    if None in cheapest.values():
+        print(f'Finest grids are not within the target error {args.tol:g}, extend the ladders.')
+        sys.exit(1)
+    print('Cheapest resolution within target error: ' +
+          ', '.join(f'{name}={n}' for name, n in cheapest.items()))
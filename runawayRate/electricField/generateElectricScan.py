@@ -3,7 +3,10 @@
 Created by Peter Halldestam 19/8/21,
 modified by Peter Halldestam 8/9/21.
 
-Generates DREAM settings files for a range of electric fields.
+Generates DREAM settings files for a range of electric fields. Run with
+--adaptive to instead run an adaptively refined scan (see adaptiveScan.py),
+starting from a coarse grid of electric fields, as run.sh -a does. With
+--no-cache, cached outputs are not reused.
 """
 import sys, os
 import numpy as np
@@ -16,21 +19,39 @@ from parameters import ELECTRIC_FIELD
 
 # Baseline DREAM settings import
 sys.path.append(os.path.join(dir, '..'))
-from configureDREAM import ConfigureDREAM
+from configureDREAM import ConfigureDREAM, configureBatch
 from configureDREAM import CYLINDRICAL
+from adaptiveScan import adaptiveScan
 
 # Scan parameters
 nScanValues = 10
 scanValues = ELECTRIC_FIELD * np.linspace(.5, 3, nScanValues)
 
+# Adaptive scan parameters
+ADAPTIVE = '--adaptive' in sys.argv
+USE_CACHE = '--no-cache' not in sys.argv
+nInitialScanValues = 4
+maxRuns = 20
+
+
+def configure(scanValue, verbose=False):
+    return ConfigureDREAM(analyses=['dreicer', 'transient'],
+                          geometry=CYLINDRICAL,
+                          electricField=scanValue,
+                          output=f'outputs/output{scanValue}.h5',
+                          save=f'settings/setting{scanValue}.h5',
+                          verbose=verbose)
+
 
 if __name__ == "__main__":
 
-    for scanValue in scanValues:
+    if ADAPTIVE:
+        initialValues = ELECTRIC_FIELD * np.linspace(.5, 3, nInitialScanValues)
+        adaptiveScan(configure, initialValues, maxRuns=maxRuns, useCache=USE_CACHE, verbose=('-v' in sys.argv))
 
-        ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer'],
-                       geometry=CYLINDRICAL,
-                       electricField=scanValue,
-                       output=f'outputs/output{scanValue}.h5',
-                       save=f'settings/setting{scanValue}.h5',
-                       verbose=(len(sys.argv)==2))
+    else:
+        configureBatch([{'electricField': scanValue,
+                         'output': f'outputs/output{scanValue}.h5',
+                         'save': f'settings/setting{scanValue}.h5'} for scanValue in scanValues],
+                       analyses=['dreicer', 'transient'],
+                       geometry=CYLINDRICAL, verbose=(len(sys.argv)==2))
@@ -9,7 +9,6 @@ Visualizes DREAM output data for a range of electric fields.
 """
 
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os
 
@@ -27,6 +26,8 @@ from DREAM.DREAMOutput import DREAMOutput
 sys.path.append(os.path.join(dir, '..'))
 from plotDREAM import plotRunawayRateTime
 from plotDREAM import testplot
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 sys.path.append(os.path.join(dir, 'outputs'))
 outputDir = os.path.join(dir, 'outputs')
@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+"""
+Vectorized evaluation of DREAM's analytic toroidal magnetic geometry,
+
+    R(r, theta) = R0 + Delta(r) + r cos(theta + delta(r) sin(theta)),
+    z(r, theta) = r kappa(r) sin(theta),
+
+over a whole (r, theta) mesh in one NumPy call. Each shaping profile (kappa,
+delta and Delta) is either a constant or a piecewise linear profile given as
+a pair (values, rValues), linearly extrapolated outside rValues. The values
+may have leading batch dimensions, in which case all configurations of the
+batch are evaluated at once and results get shape (batch..., nr, ntheta).
+Results are memoized by grid and shaping parameters, and returned read-only.
+
+The Jacobian, |grad r|^2 and magnetic field strength of getMagneticField are
+cached per shaping configuration, so that large batches of configurations can
+be screened, e.g. for trapping effects, before running DREAM on them.
+
+In terminal run:
+    $ python3 geometryDREAM.py      screen a grid of maximum shaping parameters
+"""
+import sys, os
+from collections import OrderedDict
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Max no. memoized results
+MAX_CACHE_SIZE = 64
+
+
+def linearProfile(value, minorRadius=None):
+    """
+    Returns the shaping profile growing linearly from zero on the magnetic axis
+    to value at the minor radius (MINOR_RADIUS by default), as configured in
+    ConfigureDREAM.setToroidal.
+    """
+    minorRadius = p.MINOR_RADIUS if minorRadius is None else minorRadius
+    value = np.asarray(value, dtype=float)
+    return np.stack([np.zeros_like(value), value], axis=-1), np.array([0., minorRadius])
+
+
+def evaluateProfile(profile, r):
+    """
+    Returns the values and radial derivatives of a shaping profile at the minor
+    radii r, each of shape (batch..., nr).
+
+    profile :   Constant (or array of constants of shape batch), or pair
+                (values, rValues) with values of shape (batch..., len(rValues)).
+    array r :   Minor radii.
+    """
+    r = np.asarray(r, dtype=float)
+
+    if not isinstance(profile, tuple):
+        value = np.asarray(profile, dtype=float)[..., None]
+        return np.broadcast_to(value, value.shape[:-1] + r.shape), np.zeros(value.shape[:-1] + r.shape)
+
+    values, rValues = np.asarray(profile[0], dtype=float), np.asarray(profile[1], dtype=float)
+    if rValues.size == 1:
+        return evaluateProfile(values[..., 0], r)
+
+    i = np.clip(np.searchsorted(rValues, r) - 1, 0, rValues.size - 2)
+    slope = (values[..., i+1] - values[..., i]) / (rValues[i+1] - rValues[i])
+    return values[..., i] + slope * (r - rValues[i]), slope
+
+
+def _freeze(obj):
+    """
+    Returns a hashable key of (nested tuples of) arrays and numbers.
+    """
+    if isinstance(obj, tuple):
+        return tuple(_freeze(item) for item in obj)
+    if obj is None:
+        return None
+    arr = np.ascontiguousarray(obj, dtype=float)
+    return (arr.shape, arr.tobytes())
+
+
+def memoize(func):
+    """
+    Memoizes a function of arrays and shaping profiles, keeping the
+    MAX_CACHE_SIZE most recently used results. Returned arrays are read-only,
+    since they are shared between callers.
+    """
+    cache = OrderedDict()
+
+    def memoized(*args, **kwargs):
+        key = (_freeze(args), tuple((name, _freeze(value)) for name, value in sorted(kwargs.items())))
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        result = func(*args, **kwargs)
+        for value in (result.values() if isinstance(result, dict) else result):
+            value.setflags(write=False)
+
+        cache[key] = result
+        if len(cache) > MAX_CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+
+    memoized.cache = cache
+    memoized.__doc__ = func.__doc__
+    memoized.__name__ = func.__name__
+    return memoized
+
+
+@memoize
+def getShaping(r, kappa=1., delta=0., Delta=0.):
+    """
+    Returns a dict with the shaping profiles kappa, delta and Delta and their
+    radial derivatives dkappa, ddelta and dDelta at the minor radii r, each of
+    shape (batch..., nr).
+    """
+    shaping = {}
+    for name, profile in [('kappa', kappa), ('delta', delta), ('Delta', Delta)]:
+        value, derivative = evaluateProfile(profile, r)
+        shaping[name], shaping['d' + name] = np.array(value), np.array(derivative)
+    return shaping
+
+
+def _getCoordinates(r, theta, s, majorRadius):
+    """
+    Returns R, z and their derivatives with respect to r and theta, broadcast
+    to shape (batch..., nr, ntheta), given the shaping s of getShaping.
+    """
+    r_ = r[:, None]
+    kappa, dkappa, delta, ddelta, Delta, dDelta = [s[name][..., None] for name in
+                                                   ['kappa', 'dkappa', 'delta', 'ddelta', 'Delta', 'dDelta']]
+    angle = theta + delta * np.sin(theta)
+
+    R = majorRadius + Delta + r_ * np.cos(angle)
+    z = r_ * kappa * np.sin(theta)
+    dRdr = dDelta + np.cos(angle) - r_ * ddelta * np.sin(theta) * np.sin(angle)
+    dzdr = (kappa + r_ * dkappa) * np.sin(theta)
+    dRdtheta = -r_ * (1 + delta * np.cos(theta)) * np.sin(angle)
+    dzdtheta = r_ * kappa * np.cos(theta)
+    return np.broadcast_arrays(R, z, dRdr, dzdr, dRdtheta, dzdtheta)
+
+
+@memoize
+def getFluxSurfaces(r, theta, kappa=1., delta=0., Delta=0., majorRadius=None):
+    """
+    Returns the major radius R and height z of the flux surfaces at minor radii
+    r and poloidal angles theta, each of shape (batch..., nr, ntheta).
+
+    array r :               Minor radii.
+    array theta :           Poloidal angles.
+    kappa :                 Elongation profile (see evaluateProfile).
+    delta :                 Triangularity profile.
+    Delta :                 Shafranov shift profile.
+    float majorRadius :     Major radius (MAJOR_RADIUS by default).
+    """
+    majorRadius = p.MAJOR_RADIUS if majorRadius is None else majorRadius
+    r, theta = np.atleast_1d(np.asarray(r, dtype=float)), np.asarray(theta, dtype=float)
+    s = getShaping(r, kappa=kappa, delta=delta, Delta=Delta)
+    R, z = _getCoordinates(r, theta, s, majorRadius)[:2]
+    return np.array(R), np.array(z)
+
+
+## magnetic field, cached per shaping configuration
+
+# Max no. shaping configurations with a cached magnetic field
+MAX_FIELD_CACHE_SIZE = 1024
+
+FIELD_QUANTITIES = ['R', 'z', 'J', 'gradr2', 'B']
+
+_fieldCache = OrderedDict()
+
+
+def _getBatchShape(profile):
+    return np.shape(profile[0])[:-1] if isinstance(profile, tuple) else np.shape(profile)
+
+
+def _flattenProfile(profile, batchShape):
+    """
+    Returns the profile with its batch dimensions broadcast to batchShape and
+    flattened to one, and the profile of every configuration.
+    """
+    if isinstance(profile, tuple):
+        values, rValues = np.asarray(profile[0], dtype=float), np.asarray(profile[1], dtype=float)
+        values = np.broadcast_to(values, batchShape + values.shape[-1:]).reshape(-1, values.shape[-1])
+        return (values, rValues), [(v, rValues) for v in values]
+    values = np.broadcast_to(np.asarray(profile, dtype=float), batchShape).reshape(-1)
+    return values, list(values)
+
+
+def _selectProfile(profile, index):
+    if isinstance(profile, tuple):
+        return profile[0][index], profile[1]
+    return profile[index]
+
+
+def _computeMagneticField(r, theta, kappa, delta, Delta, majorRadius, magneticField, plasmaCurrent, minorRadius):
+    """
+    Evaluates the magnetic field quantities (see getMagneticField) of a batch
+    of configurations in one pass.
+    """
+    s = {}
+    for name, profile in [('kappa', kappa), ('delta', delta), ('Delta', Delta)]:
+        s[name], s['d' + name] = evaluateProfile(profile, r)
+    R, z, dRdr, dzdr, dRdtheta, dzdtheta = _getCoordinates(r, theta, s, majorRadius)
+
+    # Jacobian of (r, theta, phi) -> (R, z, phi) and |grad r|^2 = R^2 |dx/dtheta|^2 / J^2
+    J = R * (dRdr * dzdtheta - dRdtheta * dzdr)
+    gradr2 = (R / J) ** 2 * (dRdtheta ** 2 + dzdtheta ** 2)
+
+    # magnetic functions (assuming same as in /Docs/Python/frontend/DREAMSettings/radialgrid)
+    G = magneticField * majorRadius
+    psiDer = 2 * p.MU_0 * plasmaCurrent * r[:, None] / minorRadius
+    B = np.sqrt(G ** 2 + gradr2 * (psiDer / (2 * np.pi)) ** 2) / R
+    return dict(zip(FIELD_QUANTITIES, (R, z, J, gradr2, B)))
+
+
+def getMagneticField(r, theta, kappa=1., delta=0., Delta=0., majorRadius=None,
+                     magneticField=None, plasmaCurrent=None, minorRadius=None):
+    """
+    Returns a dict with the major radius R, height z, Jacobian J, |grad r|^2
+    gradr2 and magnetic field strength B of DREAM's analytic toroidal magnetic
+    field at minor radii r and poloidal angles theta, each of shape
+    (batch..., nr, ntheta), with batch the broadcast batch shape of the shaping
+    profiles. Results are cached per shaping configuration, and configurations
+    not cached are evaluated together in one pass.
+
+    array r :               Minor radii.
+    array theta :           Poloidal angles.
+    kappa :                 Elongation profile (see evaluateProfile).
+    delta :                 Triangularity profile.
+    Delta :                 Shafranov shift profile.
+    float majorRadius :     Major radius (MAJOR_RADIUS by default).
+    float magneticField :   Magnetic field strength on the axis (MAGNETIC_FIELD by default).
+    float plasmaCurrent :   Plasma current (PLASMA_CURRENT by default).
+    float minorRadius :     Minor radius (MINOR_RADIUS by default).
+    """
+    majorRadius = p.MAJOR_RADIUS if majorRadius is None else majorRadius
+    magneticField = p.MAGNETIC_FIELD if magneticField is None else magneticField
+    plasmaCurrent = p.PLASMA_CURRENT if plasmaCurrent is None else plasmaCurrent
+    minorRadius = p.MINOR_RADIUS if minorRadius is None else minorRadius
+    r, theta = np.atleast_1d(np.asarray(r, dtype=float)), np.asarray(theta, dtype=float)
+
+    batchShape = np.broadcast_shapes(*[_getBatchShape(profile) for profile in (kappa, delta, Delta)])
+    profiles, configs = zip(*[_flattenProfile(profile, batchShape) for profile in (kappa, delta, Delta)])
+
+    gridKey = _freeze((r, theta, majorRadius, magneticField, plasmaCurrent, minorRadius))
+    keys = [(gridKey, _freeze(config)) for config in zip(*configs)]
+
+    todo = np.array([i for i, key in enumerate(keys) if key not in _fieldCache], dtype=int)
+    if todo.size:
+        field = _computeMagneticField(r, theta, *[_selectProfile(profile, todo) for profile in profiles],
+                                      majorRadius, magneticField, plasmaCurrent, minorRadius)
+        for j, i in enumerate(todo):
+            result = {name: np.array(value[j]) for name, value in field.items()}
+            for value in result.values():
+                value.setflags(write=False)
+            _fieldCache[keys[i]] = result
+
+    results = []
+    for key in keys:
+        _fieldCache.move_to_end(key)
+        results.append(_fieldCache[key])
+    while len(_fieldCache) > MAX_FIELD_CACHE_SIZE:
+        _fieldCache.popitem(last=False)
+
+    shape = batchShape + (r.size, theta.size)
+    return {name: np.stack([result[name] for result in results]).reshape(shape) for name in FIELD_QUANTITIES}
+
+
+def getMirrorRatio(field):
+    """
+    Returns the mirror ratio Bmax/Bmin of every flux surface, of shape
+    (batch..., nr), given the magnetic field of getMagneticField on a full
+    poloidal period of theta.
+    """
+    return field['B'].max(axis=-1) / field['B'].min(axis=-1)
+
+
+if __name__ == '__main__':
+
+    # screen the maximum shaping parameters (linear profiles) for trapping
+    kappa, delta, Delta = np.meshgrid(np.linspace(1., 2., 11), np.linspace(0., .5, 11),
+                                      np.linspace(0., .1, 11) * p.MINOR_RADIUS, indexing='ij')
+    r = np.linspace(.01, 1., 20) * p.MINOR_RADIUS
+    theta = np.linspace(0, 2 * np.pi, 64)
+
+    field = getMagneticField(r, theta, kappa=linearProfile(kappa), delta=linearProfile(delta),
+                             Delta=linearProfile(Delta))
+    mirrorRatio = getMirrorRatio(field)[..., -1]
+
+    print(f'Screened {kappa.size} configurations, edge mirror ratio Bmax/Bmin:')
+    for i in np.argsort(mirrorRatio, axis=None)[[0, -1]]:
+        i = np.unravel_index(i, kappa.shape)
+        print(f'    kappa = {kappa[i]:.2f}, delta = {delta[i]:.2f}, Delta = {Delta[i]:.3f} m: {mirrorRatio[i]:.4f}')
@@ -18,19 +18,17 @@ from parameters import MAX_ELONGATION
 
 # helper function import
 sys.path.append(os.path.join(dir, '../..'))
-from configureDREAM import ConfigureDREAM
+from configureDREAM import ConfigureDREAM, configureBatch
+from configureDREAM import FIDELITY_FLUID
 
 # Scan parameters
 scanValues = [.1, 1, 10]
 
 if __name__ == "__main__":
 
-    ConfigureDREAM(include=['fluid'],)
-
-    for scanValue in scanValues:
-        print(scanValue)
-
-        ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer'],
-                       maxElongation=scanValue, verbose=(len(sys.argv)==2),
-                       output=f'outputs/output{scanValue}.h5',
-                       save=f'settings/setting{scanValue}.h5')
+    configureBatch([{'maxElongation': scanValue,
+                     'output': f'outputs/output{scanValue}.h5',
+                     'save': f'settings/setting{scanValue}.h5'} for scanValue in scanValues],
+                   analyses=['dreicer', 'convergence'],
+                   fidelity=FIDELITY_FLUID, verbose=(len(sys.argv)==2),
+                   visualize=(len(sys.argv)==2))
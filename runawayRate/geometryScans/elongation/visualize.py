@@ -7,7 +7,6 @@ modified by Peter Halldestam 21/9/2021.
 Visualizes DREAM output data for a range of elongations.
 """
 
-import matplotlib.pyplot as plt
 
 
 import numpy as np
@@ -18,16 +17,16 @@ dir = os.path.dirname(os.path.realpath(__file__))
 # plot helper function import
 sys.path.append(os.path.join(dir, '../..'))
 from plotDREAM import FIGSIZE
-from plotDREAM import plotRunawayRateMinorRadius
-from plotDREAM import plotEffectivePassingFractionMinorRadius
+from plotDREAM import getPyplot
+plt = getPyplot()
 
-# Settings object import
+# Parameters import
 sys.path.append(os.path.join(dir, '../../..'))
-from parameters import DREAM_PATH
-sys.path.append(DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
+from parameters import MINOR_RADIUS
+
+# scan result store import
+from storeDREAM import loadScan
 
-sys.path.append(os.path.join(dir, 'outputs'))
 outputDir = os.path.join(dir, 'outputs')
 
 
@@ -36,19 +35,19 @@ fig, ax = plt.subplots(1, 1, figsize=FIGSIZE)
 
 c = ['r', 'g', 'b']
 
-for i, fp in enumerate(sorted(os.listdir(outputDir), key=lambda x: float(x[len('output'):-len('.h5')]))):
-    if fp.startswith('output') and fp.endswith('.h5'):
-        kappa = float(fp[len('output'):-len('.h5')])
-        outputFile = os.path.join(outputDir, fp)
-        do = DREAMOutput(outputFile)
-        ax = plotRunawayRateMinorRadius(do, ax=ax, label=f'{kappa:4.5}', normalize=True, c=c[i])
-
-for i, fp in enumerate(sorted(os.listdir(outputDir), key=lambda x: float(x[len('output'):-len('.h5')]))):
-    if fp.startswith('output') and fp.endswith('.h5'):
-        kappa = float(fp[len('output'):-len('.h5')])
-        outputFile = os.path.join(outputDir, fp)
-        do = DREAMOutput(outputFile)
-        ax = plotEffectivePassingFractionMinorRadius(do, ax=ax, normalize=True, c=c[i])
+scan = loadScan(outputDir).query(sortBy='kappa')
+
+for i, kappa in enumerate(scan['kappa']):
+    r = scan['r'][i]
+    runawayRate = scan['runawayRate'][i,-1,:]
+
+    # normalize by the runaway rate linearly extrapolated to r=0
+    runawayRate0 = runawayRate[0] - r[0] * (runawayRate[1] - runawayRate[0]) / (r[1] - r[0])
+    ax.plot(r / MINOR_RADIUS, runawayRate / runawayRate0, label=f'{kappa:4.5}', c=c[i])
+
+for i, kappa in enumerate(scan['kappa']):
+    r = scan['r'][i]
+    ax.plot(r / np.nanmax(r), scan['effectivePassingFraction'][i], ls='--', c=c[i])
 
 
 ax.legend(title=r'Elongation $\kappa$')
@@ -37,7 +37,7 @@ E_field = 40 * n_e * q**3 * lnC / (4*np.pi * epsilon_0**2 * m_0 * c**2)
 
 if __name__ == "__main__":
 
-    ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer', 'fluid/GammaAva'],
+    ConfigureDREAM(analyses=['avalanche', 'convergence'],
                    avalanche=True,
                    temperature=T, electricField=E_field,
                    geometry=CYLINDRICAL, wallRadius=wR,
@@ -46,7 +46,7 @@ if __name__ == "__main__":
                    save=f'settings/setting_cyl.h5')
 
 
-    ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer', 'fluid/GammaAva'],
+    ConfigureDREAM(analyses=['avalanche', 'convergence'],
                    avalanche=True,
                    temperature=T, electricField=E_field,
                    geometry=TOROIDAL, wallRadius=wR,
@@ -5,7 +5,6 @@ Created by Hannes Bergström 25/11/2021.
 Visualizes DREAM runaway rate output as a function of epsilon = "minor radial coordinate" / "major radius".
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os, glob
 from matplotlib.lines import Line2D
@@ -16,14 +15,16 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '../../..'))
 from plotDREAM import FIGSIZE
 from plotDREAM import plotRunawayRateMinorRadius
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 # Parameters import
 sys.path.append(os.path.join(dir, '../../../..'))
 import parameters as p
 
-# Settings object import
-sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
+# Output reader import
+sys.path.append(os.path.join(dir, '../../../'))
+from readDREAM import LazyOutput
 
 sys.path.append(os.path.join(dir, 'outputs'))
 outputDir = os.path.join(dir, 'outputs')
@@ -75,8 +76,8 @@ if __name__ == '__main__':
     if fp_cyl and fp_tor:
 
         # loads data and determines growth rate
-        do_cyl = DREAMOutput(fp_cyl)
-        do_tor = DREAMOutput(fp_tor)
+        do_cyl = LazyOutput(fp_cyl)
+        do_tor = LazyOutput(fp_tor)
 
         GammaAvaCyl = extract_Gamma(do_cyl.other.fluid.runawayRate.data, do_cyl.eqsys.n_re.data)
         GammaAvaTor = extract_Gamma(do_tor.other.fluid.runawayRate.data, do_tor.eqsys.n_re.data)
@@ -49,7 +49,7 @@ E_field = 40 * n_e * q**3 * lnC / (4*np.pi * epsilon_0**2 * m_0 * c**2)
 # E=E_field
 if __name__ == "__main__":
 
-    ConfigureDREAM(include='fluid',
+    ConfigureDREAM(analyses=['dreicer', 'convergence'],
                    temperature=T, electricField=E,
                    geometry=CYLINDRICAL, wallRadius=b,
                    minorRadius=a, verbose=(len(sys.argv)==2),
@@ -57,7 +57,7 @@ if __name__ == "__main__":
                    save=f'settings/setting_cyl.h5')
 
 
-    ConfigureDREAM(include='fluid',
+    ConfigureDREAM(analyses=['dreicer', 'convergence'],
                    temperature=T, electricField=E,
                    geometry=TOROIDAL, wallRadius=b,
                    minorRadius=a, verbose=(len(sys.argv)==2),
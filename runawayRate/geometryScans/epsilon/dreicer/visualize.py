@@ -9,7 +9,6 @@ Effect of toroidicity, reproduction of fig. 6 in paper:
 (E Nilsson et al 2015 Plasma Phys. Control. Fusion 57 095006)
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os, glob
 from matplotlib.lines import Line2D
@@ -20,14 +19,19 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '../../../'))
 from plotDREAM import FIGSIZE
 from plotDREAM import plotRunawayRateMinorRadius
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 # Parameters import
 sys.path.append(os.path.join(dir, '../../../../'))
 import parameters as p
 
-# Settings object import
-sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
+# Output reader import
+sys.path.append(os.path.join(dir, '../../../'))
+from readDREAM import LazyOutput
+
+# Reference model imports
+from modelsDREAM import nilssonFit, helanderFit
 
 sys.path.append(os.path.join(dir, 'outputs'))
 outputDir = os.path.join(dir, 'outputs')
@@ -36,18 +40,13 @@ outputDir = os.path.join(dir, 'outputs')
 
 if __name__ == '__main__':
 
-    def dreicer_fit(epsilon):
-        return 1 - 1.2*np.sqrt(2*epsilon / (1 + epsilon))
-
     fig, ax = plt.subplots()
 
     eps_plot = np.linspace(0, 1)
-    d_fit = dreicer_fit(eps_plot)
+    d_fit = nilssonFit(eps_plot)
     eps_plot = eps_plot[d_fit >=0]
     d_fit = d_fit[d_fit >= 0]
 
-    helanderFit = lambda eps: 1 - .5*np.sqrt(2*eps)
-
     ax.plot(eps_plot, d_fit, alpha=0.8, label = r'E Nilsson et al')
     # ax.plot(eps_plot, helanderFit(eps_plot), label='Helander')
 
@@ -61,8 +60,8 @@ if __name__ == '__main__':
 
     # considers different cases of simulated geometries
     if fp_cyl and fp_tor:
-        do_cyl = DREAMOutput(fp_cyl)
-        do_tor = DREAMOutput(fp_tor)
+        do_cyl = LazyOutput(fp_cyl)
+        do_tor = LazyOutput(fp_tor)
 
         gammaDreicerCyl = do_cyl.other.fluid.runawayRate.data[-1,:]
         gammaDreicerTor = do_tor.other.fluid.runawayRate.data[-1,:]
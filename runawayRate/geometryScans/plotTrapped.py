@@ -14,19 +14,18 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '../..'))
 import parameters as p
 
+# Trapping import
+sys.path.append(os.path.join(dir, '..'))
+from trappingDREAM import getTrapping
 
-def trapped(eps):
-    a = p.MINOR_RADIUS
-    R0 = p.MAJOR_RADIUS
-    dMax = 0#p.MAX_TRIANGULARITY
-    DMax = 0#p.MAX_SHAFRANOV_SHIFT
-    print(a, R0, dMax, DMax)
-    return eps*(1-np.sin(dMax*eps*R0/a))/(1+eps*(1+DMax/a))
+# Reference model imports
+from modelsDREAM import trappedEstimate, nilssonFit
 
-def nilssonFit(eps):
-    return 1-1.2*np.sqrt(2*eps/(1+eps))
 
-eps = np.linspace(0, 1)
-plt.plot(eps, np.sqrt(1-trapped(eps)), '-')
+# the passing fraction is only defined inside the major radius (eps < 1),
+# here for the circular geometry of getTrapping's defaults
+eps = np.linspace(0, 1, endpoint=False)
+plt.plot(eps, np.sqrt(1-trappedEstimate(eps)), '-')
 plt.plot(eps, nilssonFit(eps), '.-')
+plt.plot(eps, 1 - getTrapping(eps), '--')
 plt.show()
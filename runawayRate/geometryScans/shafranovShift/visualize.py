@@ -6,7 +6,6 @@ modified by Peter Halldestam 7/9/2021.
 Visualizes DREAM output data for a range of maximum Shafranov shifts.
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os
 
@@ -18,6 +17,8 @@ from plotDREAM import FIGSIZE
 from plotDREAM import plotEffectivePassingFractionMinorRadius
 from plotDREAM import plotRunawayRateMinorRadius
 from plotDREAM import plotFluxSurface
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 # Settings object import
 sys.path.append(os.path.join(dir, '../../..'))
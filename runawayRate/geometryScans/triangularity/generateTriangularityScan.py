@@ -18,7 +18,8 @@ from parameters import MAX_TRIANGULARITY
 
 # helper function import
 sys.path.append(os.path.join(dir, '../..'))
-from configureDREAM import ConfigureDREAM
+from configureDREAM import ConfigureDREAM, configureBatch
+from configureDREAM import FIDELITY_FLUID
 
 # Scan parameters
 nScanValues = 5
@@ -26,9 +27,9 @@ scanValues = np.linspace(-1, 1, nScanValues) #* MAX_TRIANGULARITY
 
 if __name__ == "__main__":
 
-    for scanValue in scanValues:
-
-        ConfigureDREAM(include=['fluid/runawayRate', 'fluid/gammaDreicer'],
-                       maxTriangularity=scanValue, verbose=(len(sys.argv)==2),
-                       output=f'outputs/output{scanValue}.h5',
-                       save=f'settings/setting{scanValue}.h5')
+    configureBatch([{'maxTriangularity': scanValue,
+                     'output': f'outputs/output{scanValue}.h5',
+                     'save': f'settings/setting{scanValue}.h5'} for scanValue in scanValues],
+                   analyses=['dreicer', 'convergence'],
+                   fidelity=FIDELITY_FLUID, verbose=(len(sys.argv)==2),
+                   visualize=(len(sys.argv)==2))
@@ -7,7 +7,6 @@ modified by Peter Halldestam 21/9/2021.
 Visualizes DREAM output data for a range of triangularities.
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys, os
 
@@ -18,6 +17,8 @@ sys.path.append(os.path.join(dir, '../..'))
 from plotDREAM import FIGSIZE
 from plotDREAM import plotRunawayRateMinorRadius
 from plotDREAM import plotFluxSurface
+from plotDREAM import getPyplot
+plt = getPyplot()
 
 # Settings object import
 sys.path.append(os.path.join(dir, '../../..'))
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+"""
+Analytic reference models which DREAM results are compared against, as
+broadcasting NumPy kernels:
+
+    nilssonFit(epsilon)         Dreicer rate reduction gamma_tor/gamma_cyl
+                                (E Nilsson et al 2015 Plasma Phys. Control. Fusion 57 095006)
+    helanderFit(epsilon)        Helander's estimate of the same reduction
+    trappedEstimate(epsilon)    Trapped fraction estimate of eq. 3 in the project report
+    chandrasekhar(x)            Chandrasekhar function (collisional drag vs. v/v_th)
+
+The geometric models share the signature model(epsilon, EOverEc=None), where
+the normalized electric field E/E_c is broadcast against epsilon, so that all
+of them can be evaluated on, and cached for, a dense (epsilon, E/E_c) grid
+with getModelGrid.
+"""
+import sys, os
+import numpy as np
+from scipy.special import erf
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Memoization import
+from geometryDREAM import memoize
+
+# Below this x, the Chandrasekhar function is evaluated by its Taylor series
+SMALL_X = .05
+
+
+def _broadcast(value, EOverEc):
+    return value if EOverEc is None else np.broadcast_arrays(value, np.asarray(EOverEc, dtype=float))[0]
+
+
+def nilssonFit(epsilon, EOverEc=None):
+    """
+    Returns the fit of the toroidal to cylindrical Dreicer runaway rate ratio
+    by E Nilsson et al, 1 - 1.2 sqrt(2 epsilon/(1 + epsilon)). Negative for
+    epsilon above ~.53, where the fit is not valid.
+
+    array epsilon :     Inverse aspect ratio.
+    array EOverEc :     Normalized electric field (the fit is independent of it).
+    """
+    epsilon = np.asarray(epsilon, dtype=float)
+    return _broadcast(1 - 1.2 * np.sqrt(2 * epsilon / (1 + epsilon)), EOverEc)
+
+
+def helanderFit(epsilon, EOverEc=None):
+    """
+    Returns Helander's estimate of the toroidal to cylindrical Dreicer runaway
+    rate ratio, 1 - sqrt(2 epsilon)/2.
+
+    array epsilon :     Inverse aspect ratio.
+    array EOverEc :     Normalized electric field (the estimate is independent of it).
+    """
+    epsilon = np.asarray(epsilon, dtype=float)
+    return _broadcast(1 - .5 * np.sqrt(2 * epsilon), EOverEc)
+
+
+def trappedEstimate(epsilon, EOverEc=None, maxTriangularity=0., maxShafranovShift=0.):
+    """
+    Returns the estimate of the trapped fraction of eq. 3 in the project report,
+    epsilon (1 - sin(delta epsilon R0/a))/(1 + epsilon (1 + Delta/a)).
+
+    array epsilon :             Inverse aspect ratio.
+    array EOverEc :             Normalized electric field (the estimate is independent of it).
+    float maxTriangularity :    Triangularity at the minor radius.
+    float maxShafranovShift :   Shafranov shift at the minor radius.
+    """
+    epsilon = np.asarray(epsilon, dtype=float)
+    a, R0 = p.MINOR_RADIUS, p.MAJOR_RADIUS
+    ft = epsilon * (1 - np.sin(maxTriangularity * epsilon * R0 / a)) / (1 + epsilon * (1 + maxShafranovShift / a))
+    return _broadcast(ft, EOverEc)
+
+
+def erfDer(x):
+    """
+    Returns the derivative of the error function.
+    """
+    return 2 * np.exp(-np.asarray(x, dtype=float)**2) / np.sqrt(np.pi)
+
+
+def chandrasekhar(x):
+    """
+    Returns the Chandrasekhar function (erf(x) - x erf'(x))/(2 x^2). Below
+    SMALL_X, where the difference cancels, its Taylor series
+    (2x/3 - 2x^3/5 + x^5/7 - x^7/27)/sqrt(pi) is used.
+
+    array x :   Velocity normalized to the thermal velocity.
+    """
+    x = np.asarray(x, dtype=float)
+    small = np.abs(x) < SMALL_X
+
+    x2 = np.where(small, x, 1.)**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        G = (erf(x) - x * erfDer(x)) / (2 * x**2)
+    series = x * (2/3 - x2 * (2/5 - x2 * (1/7 - x2 / 27))) / np.sqrt(np.pi)
+    return np.where(small, series, G)
+
+
+# Geometric models evaluated by getModelGrid
+MODELS = {'nilsson': nilssonFit, 'helander': helanderFit, 'trapped': trappedEstimate}
+
+
+def _gridEvaluator(model):
+    # memoize returns (tuples of) read-only arrays
+    return memoize(lambda epsilon, EOverEc: (np.array(model(epsilon[:, None], EOverEc[None, :])),))
+
+
+_gridEvaluators = {name: _gridEvaluator(model) for name, model in MODELS.items()}
+
+
+def getModelGrid(name, epsilon, EOverEc=None):
+    """
+    Returns the model with the given name (see MODELS) on the grid of epsilon
+    and E/E_c, of shape (len(epsilon), len(EOverEc)), cached per grid. The
+    result is read-only.
+
+    str name :          Model name.
+    array epsilon :     Inverse aspect ratios.
+    array EOverEc :     Normalized electric fields (one, E/E_c = 1, by default).
+    """
+    if name not in MODELS:
+        raise ValueError(f"Unknown model '{name}', expected one of {list(MODELS)}.")
+    EOverEc = np.ones(1) if EOverEc is None else EOverEc
+    return _gridEvaluators[name](np.atleast_1d(np.asarray(epsilon, dtype=float)),
+                                 np.atleast_1d(np.asarray(EOverEc, dtype=float)))[0]
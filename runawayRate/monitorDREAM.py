@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+"""
+Live monitoring of a running scan (see runDREAM.py). The scan manifest is
+polled for the state of every job, and the transient diagnostics written so
+far are collected: the runaway rate and n_re/n_cold at the innermost radius
+vs. time, and the wall time per time step. DREAM only writes its output once
+dreami exits, so running jobs show data chunk by chunk when the scan is run
+with --chunks, and otherwise only the tail of the dreami stdout log.
+
+The diagnostics are shown in a live plot, or published as JSON on a local
+HTTP endpoint:
+
+    GET /               diagnostics of all jobs
+    POST /control       control a job, with a JSON body {"job": NAME, "action": ACTION}
+                        and the header X-Control-Token set to the token printed by --serve
+
+where NAME is the output file name without extension and ACTION is 'stop'
+(stop a chunked job after its current chunk), 'kill' (terminate the dreami
+process of a job) or 'extend' (with "maxTime": T, let a chunked job run up to
+T seconds). Control requests need the token of the session, so that other web
+pages open in a browser cannot forge them. Jobs are controlled by requests in
+their control file (see runDREAM.readControl), which the scan executor
+follows, so that only the dreami processes it started are ever signalled.
+
+In terminal run:
+    $ python3 monitorDREAM.py [manifest] [--plot] [--serve PORT] [--interval SECONDS]
+    $ python3 monitorDREAM.py [manifest] --stop NAME | --kill NAME | --extend NAME TIME
+"""
+import sys, os, glob, json, time, hmac, secrets, argparse
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Scan executor import
+from runDREAM import Job, JOB_RUNNING, JOB_DONE, PARTIAL_SUFFIX, LOG_SUFFIX
+from runDREAM import readManifest, getChunkDir, writeControl
+
+# Output reader import
+from readDREAM import LazyOutput
+
+# No. dreami stdout lines shown of running jobs
+N_LOG_LINES = 5
+
+# Header holding the token of control requests
+TOKEN_HEADER = 'X-Control-Token'
+
+
+def getName(job):
+    return os.path.splitext(os.path.basename(job.outputFile))[0]
+
+
+def loadJobs(manifestFile):
+    """
+    Returns the jobs recorded in a scan manifest.
+    """
+    return [Job.fromdict(d) for d in readManifest(manifestFile).values()]
+
+
+def _tail(filename, n=N_LOG_LINES):
+    try:
+        with open(filename, 'rb') as fp:
+            fp.seek(0, os.SEEK_END)
+            fp.seek(max(0, fp.tell() - 4096))
+            return fp.read().decode(errors='replace').splitlines()[-n:]
+    except OSError:
+        return []
+
+
+def _readSeries(outputFile):
+    """
+    Returns the time, runaway rate and n_re/n_cold at the innermost radius of
+    an output, and its no. time steps.
+    """
+    with LazyOutput(outputFile) as do:
+        runawayRate = do.other.fluid.runawayRate
+        n_re, n_cold = do.eqsys.n_re[:,0], do.eqsys.n_cold[:,0]
+        return runawayRate.time, runawayRate[:,0], (n_re / n_cold)[-len(runawayRate):], len(do.grid.t) - 1
+
+
+def getDiagnostics(job):
+    """
+    Returns a dict with the state and transient diagnostics of a job: name,
+    status, message, elapsed wall time, time, runawayRate, densityRatio
+    (n_re/n_cold), stepTime (wall time per time step of each chunk) and the
+    tail of the dreami log of a running job.
+    """
+    diag = {'name': getName(job), 'status': job.status, 'message': job.message,
+            'elapsed': job.wallTime, 'time': [], 'runawayRate': [], 'densityRatio': [],
+            'stepTime': [], 'log': []}
+
+    if job.status == JOB_RUNNING:
+        diag['elapsed'] = None if job.started is None else time.time() - job.started
+        outputs = sorted(glob.glob(os.path.join(getChunkDir(job.outputFile), 'output*.h5')),
+                         key=lambda fp: int(os.path.basename(fp)[len('output'):-len('.h5')]))
+        logs = glob.glob(os.path.join(getChunkDir(job.outputFile), '*' + PARTIAL_SUFFIX + LOG_SUFFIX))
+        logs.append(job.outputFile + PARTIAL_SUFFIX + LOG_SUFFIX)
+        diag['log'] = sum((_tail(fp) for fp in logs), [])
+    elif job.status == JOB_DONE and os.path.exists(job.outputFile):
+        outputs = [job.outputFile]
+    else:
+        outputs = []
+
+    # chunks may restart their time grid at zero
+    tEnd, mtime = 0., job.started
+    for fp in outputs:
+        try:
+            t, runawayRate, densityRatio, nt = _readSeries(fp)
+        except (OSError, AttributeError):
+            continue
+        if len(t) and t[0] < tEnd:
+            t = t + tEnd
+        tEnd = t[-1] if len(t) else tEnd
+
+        diag['time'] += list(t)
+        diag['runawayRate'] += list(runawayRate)
+        diag['densityRatio'] += list(densityRatio)
+
+        if job.status == JOB_RUNNING and mtime is not None:
+            diag['stepTime'].append((os.path.getmtime(fp) - mtime) / max(nt, 1))
+            mtime = os.path.getmtime(fp)
+
+    return diag
+
+
+def getSnapshot(manifestFile):
+    """
+    Returns the diagnostics (see getDiagnostics) of all jobs in a scan.
+    """
+    return [getDiagnostics(job) for job in loadJobs(manifestFile)]
+
+
+def control(manifestFile, name, action, maxTime=None):
+    """
+    Stops, kills or extends the job with the given name. Returns a message.
+
+    str action :        'stop' (chunked jobs, after the current chunk), 'kill'
+                        (terminate dreami, the job fails) or 'extend' (chunked
+                        jobs, up to maxTime).
+    float maxTime :     Maximum simulation time of an extended job.
+
+    The request is written to the control file of the job and carried out by
+    the scan executor running it (see runDREAM.readControl).
+    """
+    jobs = {getName(job): job for job in loadJobs(manifestFile)}
+    if name not in jobs:
+        raise ValueError(f"No job named '{name}'.")
+    job = jobs[name]
+    if job.status != JOB_RUNNING:
+        raise ValueError(f"Job '{name}' is not running.")
+
+    if action in ('stop', 'extend') and not os.path.isdir(getChunkDir(job.outputFile)):
+        raise ValueError(f"Job '{name}' is not being run in chunks.")
+
+    if action == 'stop':
+        writeControl(job.outputFile, stop=True)
+    elif action == 'extend':
+        if maxTime is None:
+            raise ValueError('Extending a job needs a maximum simulation time.')
+        writeControl(job.outputFile, maxTime=float(maxTime))
+    elif action == 'kill':
+        writeControl(job.outputFile, kill=True)
+    else:
+        raise ValueError(f"Invalid action '{action}'.")
+
+    return f'{action}: {name}'
+
+
+def serve(manifestFile, port=8000, token=None):
+    """
+    Publishes the diagnostics of a scan on http://localhost:port (see module
+    docstring) until interrupted. Control requests need the given token (a new
+    random one by default, printed when serving).
+    """
+    token = secrets.token_urlsafe(16) if token is None else token
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            try:
+                if path == '/':
+                    self.reply(getSnapshot(manifestFile))
+                elif path == '/control':
+                    self.reply({'message': 'control requests must be POSTed'}, 405)
+                else:
+                    self.reply({'message': 'not found'}, 404)
+            except Exception as err:
+                self.reply({'message': str(err)}, 400)
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/control':
+                return self.reply({'message': 'not found'}, 404)
+            if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode(), token.encode()):
+                return self.reply({'message': 'invalid control token'}, 403)
+            try:
+                query = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self.reply({'message': control(manifestFile, query.get('job'), query.get('action'),
+                                               maxTime=query.get('maxTime'))})
+            except Exception as err:
+                self.reply({'message': str(err)}, 400)
+
+        def reply(self, body, code=200):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f'Serving diagnostics of {manifestFile} on http://localhost:{port}')
+    print(f'Control requests need the header {TOKEN_HEADER}: {token}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def livePlot(manifestFile, interval=5.):
+    """
+    Plots the runaway rate and n_re/n_cold vs. time of all jobs, refreshed
+    every interval seconds until the figure is closed.
+    """
+    from plotDREAM import getPyplot
+    plt = getPyplot()
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    while plt.fignum_exists(fig.number):
+        snapshot = getSnapshot(manifestFile)
+
+        for ax in (ax1, ax2):
+            ax.clear()
+        for diag in snapshot:
+            if diag['time']:
+                label = f"{diag['name']} ({diag['status']})"
+                ax1.semilogy(diag['time'], np.abs(diag['runawayRate']), label=label)
+                ax2.semilogy(diag['time'], diag['densityRatio'], label=label)
+
+        nRunning = sum(diag['status'] == JOB_RUNNING for diag in snapshot)
+        fig.suptitle(f'{nRunning} of {len(snapshot)} jobs running')
+        ax1.set_xlabel(r'time [s]')
+        ax1.set_ylabel(r'runaway rate [s$^{-1}$m$^{-3}$]')
+        ax2.set_xlabel(r'time [s]')
+        ax2.set_ylabel(r'$n_{re}/n_{cold}$')
+        if ax1.lines:
+            ax1.legend(fontsize='small')
+
+        plt.pause(interval)
+
+
+def printSnapshot(manifestFile):
+    for diag in getSnapshot(manifestFile):
+        elapsed = '' if diag['elapsed'] is None else f"{diag['elapsed']:8.1f} s"
+        latest = f"t = {diag['time'][-1]:.3g} s, runaway rate {diag['runawayRate'][-1]:.3e}" if diag['time'] else ''
+        print(f"{diag['name']:<24s} {diag['status']:<8s} {elapsed:>10s}  {latest} {diag['message']}")
+        for line in diag['log']:
+            print(f'    | {line}')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Monitor a running scan.')
+    parser.add_argument('manifest', nargs='?', default='manifest.jsonl', help='Scan manifest file.')
+    parser.add_argument('--plot', action='store_true', help='Show a live plot.')
+    parser.add_argument('--serve', type=int, default=None, metavar='PORT',
+                        help='Publish the diagnostics on a local HTTP endpoint.')
+    parser.add_argument('--interval', type=float, default=5., help='Refresh interval in seconds.')
+    parser.add_argument('--stop', metavar='NAME', help='Stop a chunked job after its current chunk.')
+    parser.add_argument('--kill', metavar='NAME', help='Terminate the dreami process of a job.')
+    parser.add_argument('--extend', nargs=2, metavar=('NAME', 'TIME'),
+                        help='Let a chunked job run up to TIME seconds of simulation time.')
+    args = parser.parse_args()
+
+    if args.stop:
+        print(control(args.manifest, args.stop, 'stop'))
+    elif args.kill:
+        print(control(args.manifest, args.kill, 'kill'))
+    elif args.extend:
+        print(control(args.manifest, args.extend[0], 'extend', maxTime=args.extend[1]))
+    elif args.serve is not None:
+        serve(args.manifest, port=args.serve)
+    elif args.plot:
+        livePlot(args.manifest, interval=args.interval)
+    else:
+        printSnapshot(args.manifest)
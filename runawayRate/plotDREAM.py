@@ -4,8 +4,9 @@ Created by Peter Halldestam 7/9/21,
 modified by Peter Halldestam 22/9/21.
 """
 import sys, os
-import numpy as np
-import matplotlib.pyplot as plt
+from contextlib import contextmanager
+# numpy, matplotlib and geometryDREAM are imported by the functions using
+# them, to keep startup fast (see checkStartup.py)
 
 dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -13,24 +14,55 @@ dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir, '..'))
 import parameters as p
 
-# Settings object import
-sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMOutput import DREAMOutput
-
-# set font sizes
+# font sizes
 SMALL_SIZE = 14
 MEDIUM_SIZE = 16
 # BIGGER_SIZE = 18
-plt.rc('font', size=SMALL_SIZE)          # default
-plt.rc('axes', titlesize=SMALL_SIZE)     # axes title
-plt.rc('axes', labelsize=MEDIUM_SIZE)    # x and y labels
-plt.rc('xtick', labelsize=SMALL_SIZE)    # x tick labels
-plt.rc('ytick', labelsize=SMALL_SIZE)    # y tick labels
-plt.rc('legend', fontsize=SMALL_SIZE)    # legend
 
 # figure size (import this)
 FIGSIZE = (7, 5)
 
+_pyplotStyled = False
+
+
+def getPyplot():
+    """
+    Returns matplotlib.pyplot, importing it and setting the font sizes on first
+    use, so that importing this module does not load matplotlib. Scripts
+    creating their own figures should get pyplot from here.
+    """
+    global _pyplotStyled
+    import matplotlib.pyplot as plt
+
+    if not _pyplotStyled:
+        plt.rc('font', size=SMALL_SIZE)          # default
+        plt.rc('axes', titlesize=SMALL_SIZE)     # axes title
+        plt.rc('axes', labelsize=MEDIUM_SIZE)    # x and y labels
+        plt.rc('xtick', labelsize=SMALL_SIZE)    # x tick labels
+        plt.rc('ytick', labelsize=SMALL_SIZE)    # y tick labels
+        plt.rc('legend', fontsize=SMALL_SIZE)    # legend
+        _pyplotStyled = True
+
+    return plt
+
+
+@contextmanager
+def openOutput(do):
+    """
+    Context manager giving a DREAM output object: do itself, or a
+    readDREAM.LazyOutput reading only the plotted slices if do is the name of
+    an output file. Only outputs opened here are closed on exit.
+
+    do :    DREAM.DREAMOutput, readDREAM.LazyOutput or output file name.
+    """
+    if not isinstance(do, str):
+        yield do
+        return
+
+    from readDREAM import LazyOutput
+    with LazyOutput(do) as lazyOutput:
+        yield lazyOutput
+
 
 def plotAvalancheMultiplicationFactor(do, ax=None, label=None, normalize=False, show=False, verbose=False):
     """
@@ -38,7 +70,7 @@ def plotAvalancheMultiplicationFactor(do, ax=None, label=None, normalize=False,
     NOTE: assumes dn_re/dt = gammaDreicer + n_re * GammaAva.
 
 
-    DREAM.DREAMOutput do :      DREAM settings object.
+    DREAM.DREAMOutput do :      DREAM output object (see openOutput).
     matplotlib.axes.Axes ax :   Axes object used for plotting.
     str label :                 Legend label.
     bool normalize :            Normalize such that the first element of
@@ -47,18 +79,21 @@ def plotAvalancheMultiplicationFactor(do, ax=None, label=None, normalize=False,
     bool verbose :              Show information.
 
     """
+    plt = getPyplot()
+
     if verbose:
         print(plotAvalancheMultiplicationFactor.__doc__)
 
-    try:
-        gammaDreicer = do.other.fluid.gammaDreicer[-1,:]
-        runawayRate = do.other.fluid.runawayRate[-1,:]
-        nRe = do.eqsys.n_re[-1,:]
-        GammaAva = (runawayRate - gammaDreicer) / nRe
+    with openOutput(do) as do:
+        try:
+            gammaDreicer = do.other.fluid.gammaDreicer[-1,:]
+            runawayRate = do.other.fluid.runawayRate[-1,:]
+            nRe = do.eqsys.n_re[-1,:]
+            GammaAva = (runawayRate - gammaDreicer) / nRe
 
-        epsilon = do.grid.r / p.MAJOR_RADIUS
-    except AttributeError as err:
-        raise Exception('Output does not include needed data.') from err
+            epsilon = do.grid.r / p.MAJOR_RADIUS
+        except AttributeError as err:
+            raise Exception('Output does not include needed data.') from err
 
     if normalize:
         GammaAva /= GammaAva[0]
@@ -79,7 +114,7 @@ def plotRunawayRateTime(do, ax=None, label=None, normalize=False, show=False, ve
     """
     Plot runaway rate vs. time to check convergence. Returns Axes object.
 
-    DREAM.DREAMOutput do :      DREAM settings object.2.2e-1
+    DREAM.DREAMOutput do :      DREAM output object (see openOutput).
     matplotlib.axes.Axes ax :   Axes object used for plotting.
     str label :                 Legend label.
     bool normalize :            Normalize such that the first element of
@@ -87,15 +122,17 @@ def plotRunawayRateTime(do, ax=None, label=None, normalize=False, show=False, ve
     bool show :                 Show figure.
     bool verbose :              Show information.
     """
+    plt = getPyplot()
+
     if verbose:
         print(plotRunawayRate.__doc__)
 
-    try:
-        runawayRate = do.other.fluid.runawayRate.data[:,0]
-        time = do.other.fluid.runawayRate.time
-
-    except AttributeError as err:
-        raise Exception('Output does not include needed data.') from err
+    with openOutput(do) as do:
+        try:
+            runawayRate = do.other.fluid.runawayRate.data[:,0]
+            time = do.other.fluid.runawayRate.time
+        except AttributeError as err:
+            raise Exception('Output does not include needed data.') from err
 
     if normalize:
         runawayRate /= p.MINOR_RADIUS
@@ -116,7 +153,7 @@ def plotRunawayRateMinorRadius(do, ax=None, label=None, normalize=False, c='k',
     Plot runaway rate vs. the minor radius of the analytical toroidal magnetic
     field to check convergence. Returns Axes object.
 
-    DREAM.DREAMOutput do :      DREAM settings object.
+    DREAM.DREAMOutput do :      DREAM output object (see openOutput).
     matplotlib.axes.Axes ax :   Axes object used for plotting.
     str label :                 Legend label.
     bool normalize :            Normalize such that the first element of
@@ -124,15 +161,17 @@ def plotRunawayRateMinorRadius(do, ax=None, label=None, normalize=False, c='k',
     bool show :                 Show figure.
     bool verbose :              Show information.
     """
+    plt = getPyplot()
+
     if verbose:
         print(plotRunawayRateMinorRadius.__doc__)
 
-    try:
-        runawayRate = do.other.fluid.runawayRate.data[-1,:] # at final time step
-        minorRadius = do.grid.r
-
-    except AttributeError as err:
-        raise Exception(f'Output does not include needed data.') from err
+    with openOutput(do) as do:
+        try:
+            runawayRate = do.other.fluid.runawayRate.data[-1,:] # at final time step
+            minorRadius = do.grid.r
+        except AttributeError as err:
+            raise Exception(f'Output does not include needed data.') from err
 
     if normalize:
 
@@ -160,21 +199,23 @@ def plotEffectivePassingFractionMinorRadius(do, ax=None, label=None, normalize=F
     Plot effective passing fraction associated with a DREAM output geometry.
     Returns Axes object.
 
-    DREAM.DREAMOutput do :      DREAM settings object.
+    DREAM.DREAMOutput do :      DREAM output object (see openOutput).
     matplotlib.axes.Axes ax :   Axes object used for plotting.
     str label :                 Legend label.
     bool show :                 Show figure.
     bool verbose :              Show information.
     """
+    plt = getPyplot()
+
     if verbose:
         print(plotEffectivePassingFractionMinorRadius.__doc__)
 
-    try:
-        effectivePassingFraction = do.grid.effectivePassingFraction
-        minorRadius = do.grid.r
-
-    except AttributeError as err:
-        raise Exception(f'Output does not include needed data.') from err
+    with openOutput(do) as do:
+        try:
+            effectivePassingFraction = do.grid.effectivePassingFraction
+            minorRadius = do.grid.r
+        except AttributeError as err:
+            raise Exception(f'Output does not include needed data.') from err
 
     print(c)
     if normalize:
@@ -198,7 +239,7 @@ def plotFluxSurface(r=None, kappa=None, delta=None, Delta=None, nNodes=100,
     delta, and Delta in DREAM's analytical toroidal magnetic field model.
     Returns Axes object.
 
-    float r :                   Minor radius coordinate.
+    float r :                   Minor radius coordinate, or array of them to plot several flux surfaces.
     float kappa :               Elongation paramater
     float delta :               Triangularity paramater
     float Delta :               Shafranov shift paramater
@@ -209,6 +250,10 @@ def plotFluxSurface(r=None, kappa=None, delta=None, Delta=None, nNodes=100,
     bool show :                 Show figure.
     bool verbose :              Show information.
     """
+    import numpy as np
+    from geometryDREAM import getFluxSurfaces, linearProfile
+    plt = getPyplot()
+
     if verbose:
         print(plotFluxSurface.__doc__)
         if all(x is None for x in [kappa, delta, Delta]):
@@ -218,22 +263,18 @@ def plotFluxSurface(r=None, kappa=None, delta=None, Delta=None, nNodes=100,
     delta = p.MAX_TRIANGULARITY if delta is None else delta
     Delta = p.MAX_SHAFRANOV_SHIFT if Delta is None else Delta
 
-    get = lambda max, r: max * r / p.MINOR_RADIUS
-
     r = p.MINOR_RADIUS if r is None else r
     theta = np.linspace(0, 2 * np.pi, nNodes) # poloidal angles
 
-
-    print('f')
-    print(get(Delta, p.MINOR_RADIUS))
-
-    x = p.MAJOR_RADIUS + get(Delta, r) + r * np.cos(theta + get(delta, r) * np.sin(theta))
-    z = r * get(kappa, r) * np.sin(theta)
+    # shaping parameters grow linearly with the minor radius
+    x, z = getFluxSurfaces(r, theta, kappa=linearProfile(kappa), delta=linearProfile(delta),
+                           Delta=linearProfile(Delta))
 
     ax = plt.axes() if ax is None else ax
 
     fmt = 'k-' if fmt is None else fmt
-    plt.plot(x, z, f'{fmt}', label=label)
+    lines = ax.plot(x.T, z.T, f'{fmt}')
+    lines[0].set_label(label)
 
     if show:
         plt.show()
@@ -253,41 +294,22 @@ def plotMagneticFieldStrength(ax=None, nr=50, ntheta=50, show=False, verbose=Fal
     bool show :                 Show figure.
     bool verbose :              Show information.
     """
+    import numpy as np
+    from geometryDREAM import getMagneticField, linearProfile
+    plt = getPyplot()
+
     if verbose:
         print(plotMagneticFieldStrength.__doc__)
 
     # define grid
     r = np.linspace(.01, 1.5, nr) * p.MINOR_RADIUS
     theta = np.linspace(0, 2 * np.pi, ntheta)
-    rGrid, thetaGrid = np.meshgrid(r, theta)
-
-    # get shaping parameters
-    maxList = [p.MAX_ELONGATION, p.MAX_TRIANGULARITY, p.MAX_SHAFRANOV_SHIFT]
-    kappa, delta, Delta = [max * rGrid / p.MINOR_RADIUS for max in maxList]
-    DeltaDer = p.MAX_SHAFRANOV_SHIFT / p.MINOR_RADIUS
-
-    # get R,z from r, theta through coordinate transform
-    RGrid = p.MAJOR_RADIUS + Delta + rGrid * np.cos(thetaGrid + delta * np.sin(thetaGrid))
-    zGrid = rGrid * kappa * np.sin(thetaGrid)
 
-    # compute Jacobian
-    jac = np.sin(thetaGrid) * np.sin(thetaGrid + delta * np.sin(thetaGrid))
-    jac *= 1 + delta * np.cos(thetaGrid)
-    jac += np.cos(delta * np.sin(thetaGrid)) + DeltaDer * np.cos(thetaGrid)
-    jac *= kappa * rGrid * RGrid
-
-    # compute scale factor |\grad{r}|^2
-    sf = np.sin(thetaGrid + delta * np.sin(thetaGrid)) ** 2
-    sf *= (1 + delta * np.cos(thetaGrid)) ** 2
-    sf += (kappa * np.cos(thetaGrid)) ** 2
-    sf *= (kappa * rGrid * RGrid / jac) ** 2
-
-    # magnetic functions (assuming same as in /Docs/Python/frontend/DREAMSettings/radialgrid)
-    G = p.MAGNETIC_FIELD * p.MAJOR_RADIUS
-    psiDer = 2 * p.MU_0 * p.PLASMA_CURRENT * rGrid / p.MINOR_RADIUS
-
-    # finally compute the magnetic field strength
-    magneticFieldStrength = np.sqrt(G ** 2 + sf * (psiDer / (2 * np.pi)) ** 2) / RGrid
+    # linear shaping profiles, compute R, z and B (shape (ntheta, nr))
+    shaping = dict(kappa=linearProfile(p.MAX_ELONGATION), delta=linearProfile(p.MAX_TRIANGULARITY),
+                   Delta=linearProfile(p.MAX_SHAFRANOV_SHIFT))
+    field = getMagneticField(r, theta, **shaping)
+    RGrid, zGrid, magneticFieldStrength = [field[name].T for name in ['R', 'z', 'B']]
 
     if ax is None:
         ax = plt.axes()
@@ -306,21 +328,25 @@ def plotMagneticFieldStrength(ax=None, nr=50, ntheta=50, show=False, verbose=Fal
 
 def testplot(outputDir='outputs/', ax=None, label=None, show=False):
 
+    import numpy as np
+    from readDREAM import LazyOutput
+    plt = getPyplot()
+
     runawayRateValues = []
     gammaDreicerValues = []
     electricFieldValues = []
 
     for fp in os.listdir(outputDir):
         if fp.endswith('.h5'):
-            do = DREAMOutput(os.path.join(outputDir, fp))
-            try:
-                print(do.other.fluid.runawayRate.data)
-                runawayRateValues.append(do.other.fluid.runawayRate.data[-1,0])
-                gammaDreicerValues.append(do.other.fluid.gammaDreicer.data[-1,0])
-                electricFieldValues.append(np.mean(do.eqsys.E_field.data))
+            with LazyOutput(os.path.join(outputDir, fp)) as do:
+                try:
+                    print(do.other.fluid.runawayRate.data[-1,:])
+                    runawayRateValues.append(do.other.fluid.runawayRate.data[-1,0])
+                    gammaDreicerValues.append(do.other.fluid.gammaDreicer.data[-1,0])
+                    electricFieldValues.append(np.mean(do.eqsys.E_field.data))
 
-            except AttributeError as err:
-                raise Exception('Output does not include needed data.') from err
+                except AttributeError as err:
+                    raise Exception('Output does not include needed data.') from err
 
     if ax is None:
         ax = plt.axes()
@@ -341,17 +367,16 @@ def testplot(outputDir='outputs/', ax=None, label=None, show=False):
 
 if __name__ == '__main__':
 
+    import numpy as np
+    plt = getPyplot()
     Delta = .5*p.MINOR_RADIUS
 
+    r = p.MINOR_RADIUS * np.arange(10) / 10
     ax = plotFluxSurface(Delta=Delta, verbose=(len(sys.argv)==2))
-    n = 10
-    for i in range(n):
-        plotFluxSurface(fmt='grey', Delta=Delta, ax=ax, r=p.MINOR_RADIUS * i / n, verbose=(len(sys.argv)==2))
+    plotFluxSurface(fmt='grey', Delta=Delta, ax=ax, r=r)
 
     ax = plotFluxSurface(Delta=-Delta, ax=ax, verbose=(len(sys.argv)==2))
-    n = 10
-    for i in range(n):
-        plotFluxSurface(fmt='grey', Delta=-Delta, ax=ax, r=p.MINOR_RADIUS * i / n, verbose=(len(sys.argv)==2))
+    plotFluxSurface(fmt='grey', Delta=-Delta, ax=ax, r=r)
 
     plotMagneticFieldStrength(ax=ax)
 
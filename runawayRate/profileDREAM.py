@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+"""
+Solver profiling of DREAM runs. ConfigureDREAM has dreami write its timing
+information to the output file (output.setTiming(file=True)). This module
+reads the timings of every output of a scan into a table, one row per run,
+joined to the grid sizes and solver settings stored with the output:
+
+    outputFile, nr, np, nxi, nt, cells (nr * max(np, 1) * max(nxi, 1)),
+    solver (LINEAR_IMPLICIT or NONLINEAR), linearSolver (e.g. MKL),
+    preconditioner, total, assembly, linearSolve, stepTime (total / nt),
+
+plus one column per timing in the output, e.g. 'solver/invert'. Timings are
+attributed to matrix assembly or the linear solve by their names (see
+ASSEMBLY_PATTERNS and SOLVE_PATTERNS). From the table, hotspots (the timings
+taking the largest share of the total) and scaling curves (time per step vs.
+no. cells, with fitted power laws per solver configuration) are reported.
+
+In terminal run:
+    $ python3 profileDREAM.py output.h5 [output.h5 ...] [-n NTOP] [--csv FILE] [--plot]
+"""
+import os, csv, argparse
+import numpy as np
+import h5py
+
+# Timing names attributed to matrix assembly and to the linear solve
+ASSEMBLY_PATTERNS = ['rebuild', 'jacobian', 'assembl', 'build']
+SOLVE_PATTERNS = ['invert', 'linsolv', 'solve', 'factor', 'ksp']
+
+# Solver settings, as numbered in DREAM.Settings.Solver
+SOLVER_NAMES = {1: 'LINEAR_IMPLICIT', 2: 'NONLINEAR'}
+LINEAR_SOLVER_NAMES = {1: 'LU', 2: 'MUMPS', 3: 'MKL', 4: 'SUPERLU', 5: 'GMRES'}
+
+# Columns describing a run (the remaining columns are timings)
+INFO_COLUMNS = ['outputFile', 'nr', 'np', 'nxi', 'nt', 'cells', 'solver', 'linearSolver', 'preconditioner']
+SUMMARY_COLUMNS = ['total', 'assembly', 'linearSolve', 'stepTime']
+
+
+def _get(group, path, default=None):
+    if path not in group:
+        return default
+    value = group[path][()]
+    if isinstance(value, bytes):
+        return value.decode()
+    return value.item() if np.ndim(value) == 0 and hasattr(value, 'item') else value
+
+
+def readTimings(outputFile):
+    """
+    Returns the timings [s] of an output as a flat dict, e.g.
+    {'total': ..., 'solver/invert': ...}, empty if none were written.
+    """
+    timings = {}
+    with h5py.File(outputFile, 'r') as fp:
+        if 'timings' not in fp:
+            return timings
+
+        def visit(name, item):
+            if isinstance(item, h5py.Dataset) and item.size == 1 and np.issubdtype(item.dtype, np.number):
+                timings[name] = float(np.ravel(item[()])[0])
+
+        fp['timings'].visititems(visit)
+    return timings
+
+
+def readRunInfo(outputFile):
+    """
+    Returns the grid sizes and solver settings of an output, from the settings
+    stored with it.
+    """
+    with h5py.File(outputFile, 'r') as fp:
+        s = fp['settings'] if 'settings' in fp else fp
+        hottail = bool(_get(s, 'hottailgrid/enabled', False))
+        info = {'outputFile': outputFile,
+                'nr': int(_get(s, 'radialgrid/nr', 0)),
+                'np': int(_get(s, 'hottailgrid/np', 0)) if hottail else 0,
+                'nxi': int(_get(s, 'hottailgrid/nxi', 0)) if hottail else 0,
+                'nt': int(_get(s, 'timestep/nt', 0)),
+                'solver': SOLVER_NAMES.get(_get(s, 'solver/type'), str(_get(s, 'solver/type'))),
+                'linearSolver': LINEAR_SOLVER_NAMES.get(_get(s, 'solver/linsolv'), str(_get(s, 'solver/linsolv'))),
+                'preconditioner': bool(_get(s, 'solver/preconditioner/enabled', False))}
+    info['cells'] = info['nr'] * max(info['np'], 1) * max(info['nxi'], 1)
+    return info
+
+
+def _isAggregate(name):
+    leaf = name.split('/')[-1].lower()
+    return leaf == 'total' or leaf.endswith('tot')
+
+
+def getCategoryTime(timings, patterns):
+    """
+    Returns the time of the timings whose (leaf) names match any of the patterns,
+    summing the individual timings, or the aggregate ones (e.g. rebuildTot)
+    if there are no individual ones, so that nothing is counted twice.
+    """
+    matches = [name for name in timings if any(pattern in name.split('/')[-1].lower() for pattern in patterns)]
+    leaves = [name for name in matches if not _isAggregate(name)]
+    return sum(timings[name] for name in (leaves or matches))
+
+
+def getProfile(outputFile):
+    """
+    Returns the profile of one run: a table row (see module docstring), or
+    None if the output has no timings.
+    """
+    timings = readTimings(outputFile)
+    if not timings:
+        return None
+
+    row = readRunInfo(outputFile)
+    total = timings.get('total', sum(t for name, t in timings.items() if '/' not in name))
+    row.update({'total': total,
+                'assembly': getCategoryTime(timings, ASSEMBLY_PATTERNS),
+                'linearSolve': getCategoryTime(timings, SOLVE_PATTERNS),
+                'stepTime': total / max(row['nt'], 1)})
+    row.update(timings)
+    return row
+
+
+def profileScan(outputFiles):
+    """
+    Returns the profiles of a scan as a table: a dict of columns (numpy
+    arrays), NaN where a run lacks a timing. Outputs without timings are
+    skipped.
+    """
+    rows = [row for row in map(getProfile, outputFiles) if row is not None]
+    names = INFO_COLUMNS + SUMMARY_COLUMNS
+    names += sorted({name for row in rows for name in row} - set(names))
+
+    dtypes = {'outputFile': object, 'solver': object, 'linearSolver': object, 'preconditioner': bool,
+              'nr': int, 'np': int, 'nxi': int, 'nt': int, 'cells': int}
+    return {name: np.array([row.get(name, np.nan) for row in rows], dtype=dtypes.get(name, float)) for name in names}
+
+
+def getHotspots(table, n=10):
+    """
+    Returns the n timings with the largest share of the total time of all runs,
+    as (name, time [s], share) tuples.
+    """
+    total = np.nansum(table['total'])
+    timings = [name for name in table if name not in INFO_COLUMNS + SUMMARY_COLUMNS and name != 'total'
+               and not _isAggregate(name)]
+    hotspots = [(name, np.nansum(table[name]), np.nansum(table[name]) / total) for name in timings]
+    return sorted(hotspots, key=lambda hotspot: -hotspot[1])[:n]
+
+
+def getConfigurations(table):
+    """
+    Returns the solver configurations of the table, and for each run the index
+    of its configuration.
+    """
+    keys = [f'{solver}/{linearSolver}' + ('/PC' if pc else '')
+            for solver, linearSolver, pc in zip(table['solver'], table['linearSolver'], table['preconditioner'])]
+    configurations = sorted(set(keys))
+    return configurations, np.array([configurations.index(key) for key in keys], dtype=int)
+
+
+def getScaling(table, column='stepTime'):
+    """
+    Returns the power law fit time = c * cells^alpha of a timing column for
+    every solver configuration, as {configuration: (c, alpha)}. Needs at least
+    two distinct no. cells per configuration.
+    """
+    configurations, index = getConfigurations(table)
+    scaling = {}
+    for i, configuration in enumerate(configurations):
+        cells, t = table['cells'][index == i], table[column][index == i]
+        ok = (t > 0) & np.isfinite(t)
+        if len(np.unique(cells[ok])) >= 2:
+            alpha, logc = np.polyfit(np.log(cells[ok]), np.log(t[ok]), 1)
+            scaling[configuration] = (np.exp(logc), alpha)
+    return scaling
+
+
+def writeCSV(table, filename):
+    with open(filename, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(list(table))
+        writer.writerows(zip(*table.values()))
+
+
+def plotScaling(table, ax=None, show=False):
+    """
+    Plots the time per step vs. no. cells of every run, with the fitted power
+    law of each solver configuration. Returns Axes object.
+    """
+    from plotDREAM import getPyplot
+    plt = getPyplot()
+
+    if ax is None:
+        ax = plt.axes()
+
+    configurations, index = getConfigurations(table)
+    scaling = getScaling(table)
+    for i, configuration in enumerate(configurations):
+        cells, t = table['cells'][index == i], table['stepTime'][index == i]
+        line, = ax.loglog(cells, t, 'o', label=configuration)
+        if configuration in scaling:
+            c, alpha = scaling[configuration]
+            x = np.geomspace(cells.min(), cells.max())
+            ax.loglog(x, c * x**alpha, '--', c=line.get_color(), label=rf'$\propto N^{{{alpha:.2f}}}$')
+
+    ax.set_xlabel('no. cells')
+    ax.set_ylabel('time per step [s]')
+    ax.legend()
+
+    if show:
+        plt.show()
+
+    return ax
+
+
+def printReport(table, n=10):
+    print(f"{len(table['total'])} runs, {np.nansum(table['total']):.1f} s in total, "
+          f"{np.nansum(table['assembly']):.1f} s assembly, {np.nansum(table['linearSolve']):.1f} s linear solve")
+
+    print('\nhotspots:')
+    for name, t, share in getHotspots(table, n=n):
+        print(f'    {name:<40s} {t:10.2f} s  {100 * share:5.1f}%')
+
+    print('\nscaling of the time per step with the no. cells:')
+    for configuration, (c, alpha) in getScaling(table).items():
+        print(f'    {configuration:<40s} ~ N^{alpha:.2f}')
+
+    print('\nslowest runs:')
+    for i in np.argsort(-table['stepTime'])[:n]:
+        print(f"    {os.path.basename(table['outputFile'][i]):<30s} {table['stepTime'][i]:10.4f} s/step  "
+              f"nr={table['nr'][i]:.0f} np={table['np'][i]:.0f} nxi={table['nxi'][i]:.0f}  "
+              f"{table['solver'][i]}/{table['linearSolver'][i]}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Profile the solver timings of DREAM outputs.')
+    parser.add_argument('outputFiles', nargs='+', help='DREAM output files.')
+    parser.add_argument('-n', '--top', type=int, default=10, help='No. hotspots and slowest runs shown.')
+    parser.add_argument('--csv', default=None, help='Write the table to a CSV file.')
+    parser.add_argument('--plot', action='store_true', help='Plot the scaling curves.')
+    args = parser.parse_args()
+
+    table = profileScan(args.outputFiles)
+    if len(table['total']) == 0:
+        raise Exception('No outputs with timings, see ConfigureDREAM (output.setTiming).')
+
+    printReport(table, n=args.top)
+    if args.csv:
+        writeCSV(table, args.csv)
+    if args.plot:
+        plotScaling(table, show=True)
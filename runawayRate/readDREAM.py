@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+"""
+Lightweight, lazy reader of DREAM output files. A LazyOutput can be used in
+place of a DREAMOutput by the plot helpers: it mirrors the attribute layout
+(do.grid.r, do.eqsys.n_re, do.other.fluid.runawayRate.data, ...), but only
+opens the HDF5 file and reads the requested slices of the unknowns and other
+quantities, e.g. runawayRate.data[-1,:], so that the distribution function is
+never loaded unless asked for. Grid and settings data are small and read in
+full on first access.
+
+In terminal run:
+    $ python3 readDREAM.py outputFile [path ...]    list the output, or print quantities (e.g. other/fluid/runawayRate)
+"""
+import sys
+from types import SimpleNamespace
+import numpy as np
+import h5py
+
+# Groups holding time dependent quantities, read lazily
+LAZY_GROUPS = ['eqsys', 'other']
+
+
+class LazyQuantity:
+
+    def __init__(self, dataset, output):
+        """
+        Time dependent quantity of a DREAM output, read slice by slice.
+
+        h5py.Dataset dataset :  Dataset of the quantity.
+        LazyOutput output :     Output the quantity belongs to.
+        """
+        self.dataset    = dataset
+        self.output     = output
+        self.name       = dataset.name.split('/')[-1]
+
+    @property
+    def data(self):
+        return self
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def ndim(self):
+        return self.dataset.ndim
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, key):
+        return self.dataset[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.dataset[()], dtype=dtype)
+
+    @property
+    def time(self):
+        """
+        Time grid of the quantity. Other quantities are not saved at the initial
+        time, so the last len(self) times of the output time grid are used.
+        """
+        return self.output.grid.t[-len(self):]
+
+    @property
+    def ions(self):
+        """
+        Ion species (name and proton number Z) of the ion densities n_i.
+        """
+        meta = self.output.file['ionmeta']
+        names = meta['names'][()]
+        names = names.decode() if isinstance(names, bytes) else str(names)
+        Z = np.atleast_1d(meta['Z'][()])
+        return [SimpleNamespace(name=name, Z=int(z)) for name, z in zip(names.split(';'), Z)]
+
+    def __repr__(self):
+        return f'LazyQuantity({self.dataset.name}, shape={self.shape})'
+
+
+class LazyGroup:
+
+    def __init__(self, group, output):
+        """
+        Group of a DREAM output. Subgroups and datasets are available as
+        attributes.
+
+        h5py.Group group :      HDF5 group.
+        LazyOutput output :     Output the group belongs to.
+        """
+        self._group     = group
+        self._output    = output
+        self._lazy      = group.name.split('/')[1] in LAZY_GROUPS if group.name != '/' else False
+        self._children  = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self._children:
+            if name not in self._group:
+                raise AttributeError(f"Output has no quantity '{self._group.name.rstrip('/')}/{name}'.")
+            self._children[name] = self._load(self._group[name])
+        return self._children[name]
+
+    def __contains__(self, name):
+        return name in self._group
+
+    def keys(self):
+        return self._group.keys()
+
+    def _load(self, item):
+        if isinstance(item, h5py.Group):
+            return LazyGroup(item, self._output)
+        if self._lazy and item.ndim > 0:
+            return LazyQuantity(item, self._output)
+
+        value = item[()]
+        if isinstance(value, bytes):
+            return value.decode()
+        if np.ndim(value) == 0:
+            return value.item() if hasattr(value, 'item') else value
+        return value
+
+
+class LazyOutput:
+
+    def __init__(self, filename):
+        """
+        Lazily read DREAM output. Use as a context manager, or call close,
+        to release the file.
+
+        str filename :  Name of DREAM output file.
+        """
+        self.filename   = filename
+        self.file       = h5py.File(filename, 'r')
+        self._root      = LazyGroup(self.file, self)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('file', 'filename'):
+            raise AttributeError(name)
+        return getattr(self._root, name)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        raise ValueError('Expected an output file.')
+
+    with LazyOutput(sys.argv[1]) as do:
+        if len(sys.argv) == 2:
+            do.file.visit(lambda name: print(name, getattr(do.file[name], 'shape', '')))
+
+        for path in sys.argv[2:]:
+            node = do
+            for name in path.strip('/').split('/'):
+                node = getattr(node, name)
+            print(f'{path}:\n{np.asarray(node)}')
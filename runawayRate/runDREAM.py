@@ -0,0 +1,807 @@
+#!/usr/bin/python3
+"""
+Parallel scan executor. Runs dreami for every DREAM settings file in a
+directory on a pool of workers sized to the machine, instead of the serial
+loop previously found in each run.sh. Outputs are written to a temporary file
+and renamed once dreami has finished, so an interrupted job never leaves a
+partial output behind. Outputs are looked up in (and added to) the output
+cache of cacheDREAM.py, so only configurations not simulated before are run.
+The state of every job is checkpointed to a manifest file, so that a scan
+restarted after a crash only re-queues jobs that did not finish. With
+--chunks, each simulation is split into restartable chunks in time and stopped
+as soon as the runaway rate has converged (see checkDREAM.py). With
+--warm-start, jobs are ordered along a scan axis and initialised from the final
+f_hot and n_re of the nearest finished neighbour instead of a Maxwellian.
+Running jobs can be followed, stopped, killed or extended with monitorDREAM.py.
+With --dreami standin, the synthetic stand-in of standinDREAM.py is run
+instead of dreami.
+
+In terminal run:
+    $ python3 runDREAM.py [settingsDir] [-n NWORKERS] [-t NTHREADS] [--dreami DREAMI] [--no-cache]
+                               [--manifest MANIFEST] [--restart] [--chunks NCHUNKS]
+                               [--warm-start SCANAXIS]
+"""
+import sys, os, glob, time, json, shutil, tempfile, subprocess, argparse, threading
+import numpy as np
+import h5py
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import count
+from bisect import bisect_left
+from heapq import heappush, heappop
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Settings object import
+sys.path.append(p.DREAM_PATH)
+from DREAM.DREAMSettings import DREAMSettings
+
+# Output cache import
+from cacheDREAM import OutputCache, getSettingsHash
+
+# Convergence criterion import
+from checkDREAM import isRunawayRateConverged
+
+# Job states
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE    = 'done'
+JOB_FAILED  = 'failed'
+
+# Suffix of outputs still being written by dreami
+PARTIAL_SUFFIX = '.part'
+
+# Suffix of the dreami stdout log of a partial output
+LOG_SUFFIX = '.log'
+
+# Directory, next to the settings files, holding the temporary settings given to dreami
+TMP_DIR = '.tmp'
+
+# Suffix of the control file of a running job (see readControl)
+CONTROL_SUFFIX = '.control.json'
+
+# Interval [s] at which a running dreami process is checked for kill requests
+CONTROL_INTERVAL = 1.
+
+# Unknowns taken from the neighbouring output when warm starting
+WARM_START_UNKNOWNS = ['f_hot', 'n_re']
+
+# Max no. cold jobs run at once when warm starting, before any job is done
+N_COLD_STARTS = 3
+
+
+class JobKilled(Exception):
+    """
+    Raised when a running job is killed on request (see readControl).
+    """
+
+
+class Job:
+
+    def __init__(self, settingsFile, outputFile=None, settingsModified=None):
+        """
+        Bookkeeping of a single dreami run.
+
+        str settingsFile :          DREAM settings file to run.
+        str outputFile :            DREAM output file, read from the settings file if None.
+        float settingsModified :    Modification time of the settings file, read from it if None.
+        """
+        self.settingsFile       = settingsFile
+        self.outputFile         = outputFile
+        self.settingsModified   = settingsModified
+        self.status         = JOB_PENDING
+        self.wallTime       = None
+        self.message        = ''
+        self.pid            = None
+        self.started        = None
+
+        if self.outputFile is None:
+            self.outputFile = DREAMSettings(settingsFile).output.filename
+        if self.settingsModified is None:
+            self.settingsModified = os.path.getmtime(settingsFile)
+
+    def __repr__(self):
+        wallTime = '' if self.wallTime is None else f' ({self.wallTime:.1f} s)'
+        return f'{self.settingsFile}: {self.status}{wallTime} {self.message}'.rstrip()
+
+    def todict(self):
+        return {'settingsFile': self.settingsFile, 'outputFile': self.outputFile,
+                'settingsModified': self.settingsModified,
+                'status': self.status, 'wallTime': self.wallTime, 'message': self.message,
+                'pid': self.pid, 'started': self.started}
+
+    @staticmethod
+    def fromdict(d):
+        job = Job(d['settingsFile'], outputFile=d['outputFile'], settingsModified=d['settingsModified'])
+        job.status      = d['status']
+        job.wallTime    = d['wallTime']
+        job.message     = d['message']
+        job.pid         = d.get('pid')
+        job.started     = d.get('started')
+        return job
+
+
+def readManifest(filename):
+    """
+    Returns the last recorded state of every job in a manifest file, as a dict
+    of job records (see Job.todict) keyed by settings file. A last line cut
+    short by a crash is ignored.
+    """
+    records = {}
+    with open(filename) as fp:
+        for line in fp:
+            try:
+                d = json.loads(line)
+            except ValueError:
+                continue
+            records[d['settingsFile']] = d
+    return records
+
+
+class Manifest:
+
+    def __init__(self, filename='manifest.jsonl'):
+        """
+        Crash-safe record of the state of all jobs in a scan. Every change of
+        state of a job is appended to the manifest as one JSON line, so that
+        a crash loses at most the line being written. When loaded, only the
+        last record of each job is kept, and compact rewrites the manifest
+        with one line per job.
+
+        str filename :  Path to the manifest file.
+        """
+        self.filename   = filename
+        self.jobs       = {}
+        self.lock       = threading.Lock()
+        self.fp         = None
+
+        if os.path.exists(filename):
+            for d in readManifest(filename).values():
+                if not os.path.exists(d['settingsFile']):
+                    continue
+                job = Job.fromdict(d)
+                settingsModified = os.path.getmtime(job.settingsFile)
+
+                # re-queue jobs that did not finish, or whose settings or output changed since
+                if job.status != JOB_DONE or not os.path.exists(job.outputFile) \
+                        or job.settingsModified != settingsModified:
+                    job.status = JOB_PENDING
+                job.settingsModified = settingsModified
+                self.jobs[job.settingsFile] = job
+
+    def getJob(self, settingsFile):
+        """
+        Returns the recorded job of a settings file, or a new pending job.
+        """
+        if settingsFile not in self.jobs:
+            self.jobs[settingsFile] = Job(settingsFile)
+        return self.jobs[settingsFile]
+
+    def update(self, job):
+        """
+        Appends the current state of a job to the manifest.
+        """
+        with self.lock:
+            if self.fp is None:
+                self.fp = open(self.filename, 'a')
+            self.fp.write(json.dumps(job.todict()) + '\n')
+            self.fp.flush()
+
+    def compact(self):
+        """
+        Rewrites the manifest atomically with the current state of all jobs,
+        one line per job.
+        """
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+            tmp = self.filename + PARTIAL_SUFFIX
+            with open(tmp, 'w') as fp:
+                fp.writelines(json.dumps(job.todict()) + '\n' for job in self.jobs.values())
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp, self.filename)
+
+
+def setWarmStart(ds, outputFile, unknowns=WARM_START_UNKNOWNS):
+    """
+    Initialises the given unknowns of a settings object from the final time
+    step of an existing output, leaving all other unknowns at their configured
+    initial values.
+
+    DREAMSettings ds :  Settings object.
+    str outputFile :    DREAM output to initialise from.
+    list unknowns :     Names of the unknowns to initialise.
+    """
+    with h5py.File(outputFile, 'r') as fp:
+        ignore = [name for name in fp['eqsys'] if name not in unknowns]
+    ds.fromOutput(os.path.abspath(outputFile), ignore=ignore)
+
+
+def getScanValue(settingsFile, scanAxis):
+    """
+    Returns the scan value of a settings file.
+
+    str settingsFile :  DREAM settings file.
+    scanAxis :          Path in the settings tree, e.g. 'eqsys/E_field/data' (its
+                        mean is used), or a function of the DREAMSettings object.
+    """
+    ds = DREAMSettings(settingsFile)
+    if callable(scanAxis):
+        return float(scanAxis(ds))
+
+    value = ds.todict()
+    for key in scanAxis.strip('/').split('/'):
+        value = value[key]
+    if isinstance(value, dict):
+        value = value['x']
+    return float(np.mean(value))
+
+
+def getChunkDir(outputFile):
+    """
+    Returns the directory holding the chunk settings and outputs of a chunked run.
+    """
+    name = os.path.splitext(os.path.basename(outputFile))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(outputFile)), f'.{name}_chunks')
+
+
+def getControlFile(outputFile):
+    """
+    Returns the control file of a running job, kept next to the job output.
+    """
+    name = os.path.splitext(os.path.basename(outputFile))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(outputFile)), f'.{name}{CONTROL_SUFFIX}')
+
+
+def readControl(outputFile):
+    """
+    Returns the control requests of a running job: 'kill' to terminate dreami
+    (the job fails), checked every CONTROL_INTERVAL seconds, and for chunked
+    runs, read before every chunk, 'stop' to stop after the current chunk,
+    keeping its output, and 'maxTime' to change the maximum simulation time.
+    """
+    try:
+        with open(getControlFile(outputFile)) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def writeControl(outputFile, **requests):
+    """
+    Adds control requests (see readControl) to a running job.
+    """
+    controlFile = getControlFile(outputFile)
+    control = dict(readControl(outputFile), **requests)
+    with open(controlFile + PARTIAL_SUFFIX, 'w') as fp:
+        json.dump(control, fp)
+    os.replace(controlFile + PARTIAL_SUFFIX, controlFile)
+
+
+def clearControl(outputFile):
+    """
+    Removes the control requests of a job, e.g. left over from a previous run.
+    """
+    try:
+        os.remove(getControlFile(outputFile))
+    except FileNotFoundError:
+        pass
+
+
+def runSimulation(job, dreami=None, nThreads=1, timeout=None, cache=None, manifest=None,
+                  init=None, onStart=None, parent=None, verbose=False):
+    """
+    Runs dreami for a single job and updates its status and wall time. The
+    settings are copied to a temporary file pointing dreami to a partial output
+    file, which replaces the job output only if dreami exits successfully.
+    While dreami runs, the control file of the job is checked for kill requests
+    (see readControl), on which the dreami process started here is terminated.
+    Returns the job.
+
+    Job job :           Job to run.
+    str dreami :        Path to the dreami executable (DREAMI_PATH by default, 'standin' for the stand-in).
+    int nThreads :      No. OpenMP threads given to dreami.
+    float timeout :     Maximum wall time in seconds.
+    OutputCache cache : Output cache to look up and store the output in.
+    Manifest manifest : Manifest to checkpoint the job state in.
+    str init :          Output to warm start f_hot and n_re from.
+    callable onStart :  Called with the process id once dreami has started.
+    Job parent :        Job this is a chunk of, whose control requests are followed.
+    bool verbose :      Show dreami stdout (otherwise it is logged next to the partial output).
+    """
+    dreami = p.getDreami(dreami)
+    update = (lambda: None) if manifest is None else partial(manifest.update, job)
+    controlled = job if parent is None else parent
+
+    partialFile = job.outputFile + PARTIAL_SUFFIX
+    logFile = partialFile + LOG_SUFFIX
+    tmpSettings, stdout, cached = None, None, False
+
+    tic = time.time()
+    try:
+        ds = DREAMSettings(job.settingsFile)
+        if init is not None:
+            setWarmStart(ds, init)
+
+        # reuse the output of an identical configuration
+        if cache is not None:
+            key = getSettingsHash(ds, dreami=dreami)
+            if cache.get(key, job.outputFile):
+                cached = True
+                job.status = JOB_DONE
+                job.message = 'cached'
+                return job
+
+        os.makedirs(os.path.dirname(os.path.abspath(job.outputFile)), exist_ok=True)
+
+        # point a temporary copy of the settings to the partial output, kept
+        # out of the settings and output directories
+        tmpDir = os.path.join(os.path.dirname(os.path.abspath(job.settingsFile)), TMP_DIR)
+        os.makedirs(tmpDir, exist_ok=True)
+        ds.output.setFilename(partialFile)
+        fd, tmpSettings = tempfile.mkstemp(suffix='.h5', dir=tmpDir)
+        os.close(fd)
+        ds.save(tmpSettings)
+
+        env = dict(os.environ, OMP_NUM_THREADS=str(nThreads))
+        stdout = None if verbose else open(logFile, 'wb')
+
+        if parent is None:
+            clearControl(job.outputFile)
+
+        job.status = JOB_RUNNING
+        proc = subprocess.Popen([dreami, tmpSettings], env=env, stdout=stdout, stderr=subprocess.PIPE)
+        job.pid, job.started = proc.pid, tic
+        update()
+        if onStart is not None:
+            onStart(proc.pid)
+
+        # wait for dreami, following kill requests (only this process is ever signalled)
+        while True:
+            try:
+                _, stderr = proc.communicate(timeout=CONTROL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if timeout is not None and time.time() - tic > timeout:
+                    proc.kill()
+                    proc.communicate()
+                    raise subprocess.TimeoutExpired(proc.args, timeout)
+                if readControl(controlled.outputFile).get('kill'):
+                    proc.terminate()
+                    proc.communicate()
+                    raise JobKilled()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=stderr)
+
+        os.replace(partialFile, job.outputFile)
+        job.status = JOB_DONE
+        job.message = ''
+        if cache is not None:
+            cache.put(key, job.outputFile)
+
+    except subprocess.CalledProcessError as err:
+        job.status = JOB_FAILED
+        job.message = f'dreami exited with code {err.returncode}'
+        if err.stderr:
+            job.message += ': ' + err.stderr.decode(errors='replace').strip().splitlines()[-1]
+
+    except JobKilled:
+        job.status = JOB_FAILED
+        job.message = 'killed'
+
+    except (subprocess.TimeoutExpired, OSError) as err:
+        job.status = JOB_FAILED
+        job.message = str(err)
+
+    # e.g. an unreadable settings file, which must not abort the whole scan
+    except Exception as err:
+        job.status = JOB_FAILED
+        job.message = f'{type(err).__name__}: {err}'
+
+    finally:
+        job.wallTime = 0. if cached else time.time() - tic
+        job.pid = None
+        if parent is None:
+            clearControl(job.outputFile)
+        if tmpSettings is not None and os.path.exists(tmpSettings):
+            os.remove(tmpSettings)
+        if stdout is not None:
+            stdout.close()
+            os.remove(logFile)
+        if os.path.exists(partialFile):
+            os.remove(partialFile)
+        update()
+
+    return job
+
+
+def concatenateOutputs(outputFiles, outputFile):
+    """
+    Joins the outputs of consecutive chunks of a run (see runSimulationChunked)
+    in time into one output. Every chunk restarts its time grid at zero from
+    the final state of the previous chunk, so the time grids are shifted to
+    follow each other, and the initial state of the unknowns (eqsys), repeated
+    from the previous chunk, is dropped. Other quantities (other) have no
+    initial state and are joined as they are. Everything else is copied from
+    the first chunk, with the timings summed over all chunks and the time step
+    settings of the whole run. The output is written to a partial file which
+    then replaces outputFile.
+
+    list outputFiles :  Outputs of the chunks, in order.
+    str outputFile :    Output file of the whole run.
+    """
+    partialFile = outputFile + PARTIAL_SUFFIX
+    chunks = [h5py.File(fp, 'r') for fp in outputFiles]
+    try:
+        first = chunks[0]
+        times = [chunk['grid/t'][()] for chunk in chunks]
+        tEnd = np.cumsum([t[-1] - t[0] for t in times])
+        t = np.concatenate([times[0]] + [t[1:] - t[0] + tEnd[i] for i, t in enumerate(times[1:])])
+
+        with h5py.File(partialFile, 'w') as out:
+            for name in first:
+                if name not in ('eqsys', 'other'):
+                    first.copy(first[name], out, name=name)
+            del out['grid/t']
+            out['grid/t'] = t
+
+            for group, nInitial in [('eqsys', 1), ('other', 0)]:
+                if group not in first:
+                    continue
+
+                def join(name, item):
+                    path = f'{group}/{name}'
+                    if not isinstance(item, h5py.Dataset):
+                        out.require_group(path)
+                        return
+                    parts = [chunk[path] for chunk in chunks if path in chunk]
+                    if item.ndim == 0 or len(parts) != len(chunks) \
+                            or any(part.shape[1:] != item.shape[1:] for part in parts):
+                        chunks[-1].copy(chunks[-1][path] if path in chunks[-1] else item, out, name=path)
+                        return
+
+                    nRows = [part.shape[0] - (nInitial if i else 0) for i, part in enumerate(parts)]
+                    dataset = out.create_dataset(path, (sum(nRows),) + item.shape[1:], dtype=item.dtype)
+                    dataset.attrs.update(item.attrs)
+                    start = 0
+                    for i, part in enumerate(parts):
+                        dataset[start:start+nRows[i]] = part[(nInitial if i else 0):]
+                        start += nRows[i]
+
+                first[group].visititems(join)
+
+            # timings and time step settings of the whole run
+            if 'timings' in out:
+                def addTimings(name, item):
+                    if isinstance(item, h5py.Dataset) and item.size == 1 and np.issubdtype(item.dtype, np.number):
+                        item[()] = sum(np.ravel(chunk['timings'][name][()])[0] for chunk in chunks
+                                       if name in chunk.get('timings', {}))
+                out['timings'].visititems(addTimings)
+            if 'settings/timestep/tmax' in out:
+                out['settings/timestep/tmax'][()] = t[-1] - t[0]
+            if 'settings/timestep/nt' in out:
+                out['settings/timestep/nt'][()] = sum(int(chunk['settings/timestep/nt'][()]) for chunk in chunks
+                                                      if 'settings/timestep/nt' in chunk)
+    finally:
+        for chunk in chunks:
+            chunk.close()
+
+    os.replace(partialFile, outputFile)
+
+
+def runSimulationChunked(job, nChunks=None, maxTime=None, manifest=None, init=None,
+                         verbose=False, **kwargs):
+    """
+    Runs dreami for a single job in chunks of equal simulation time, each
+    restarted from the final state of the previous one. After every chunk the
+    runaway rate time series so far is tested with the convergence criterion of
+    checkDREAM.py, and the simulation is stopped as soon as it passes. Runs not
+    converged at the original end time are extended chunk by chunk up to
+    maxTime. The outputs of all chunks are joined in time into the job output
+    (see concatenateOutputs). Returns the job.
+
+    Job job :           Job to run.
+    int nChunks :       No. chunks the original simulation time is split into (N_TIME_CHUNKS by default).
+    float maxTime :     Maximum simulation time (MAX_TIME_EXTENSION times the original by default).
+    Manifest manifest : Manifest to checkpoint the job state in.
+    str init :          Output to warm start the first chunk from.
+    bool verbose :      Show information.
+
+    Before every chunk, requests to stop, to kill or to change maxTime are
+    read from the control file of the job (see readControl), which is also
+    followed by the running chunk. Remaining keyword arguments are passed to
+    runSimulation.
+    """
+    update = (lambda: None) if manifest is None else partial(manifest.update, job)
+    chunkDir = getChunkDir(job.outputFile)
+
+    job.wallTime = 0.
+    try:
+        _runChunks(job, chunkDir, update, nChunks=nChunks, maxTime=maxTime, init=init, verbose=verbose, **kwargs)
+
+    # e.g. an unreadable settings file, which must not abort the whole scan
+    except Exception as err:
+        job.status = JOB_FAILED
+        job.message = f'{type(err).__name__}: {err}'
+
+    finally:
+        job.pid = None
+        shutil.rmtree(chunkDir, ignore_errors=True)
+        clearControl(job.outputFile)
+        update()
+
+    if verbose:
+        print(f'{job.settingsFile}: {job.message}')
+
+    return job
+
+
+def _runChunks(job, chunkDir, update, nChunks=None, maxTime=None, init=None, verbose=False, **kwargs):
+    """
+    Runs the chunks of a job in chunkDir (see runSimulationChunked), adding
+    their wall times to that of the job.
+    """
+    nChunks = p.N_TIME_CHUNKS if nChunks is None else nChunks
+
+    ds = DREAMSettings(job.settingsFile)
+    if init is not None:
+        setWarmStart(ds, init)
+    tMax, nt = ds.timestep.tmax, ds.timestep.nt
+    nSaveSteps = getattr(ds.timestep, 'nSaveSteps', 0)
+    maxTime = p.MAX_TIME_EXTENSION * tMax if maxTime is None else maxTime
+    chunkTime = tMax / nChunks
+
+    # chunk settings and outputs are kept next to the job output
+    shutil.rmtree(chunkDir, ignore_errors=True)
+    os.makedirs(chunkDir)
+    clearControl(job.outputFile)
+
+    def onStart(pid):
+        job.pid = pid
+        update()
+
+    job.status = JOB_RUNNING
+    job.started = time.time()
+    update()
+
+    runawayRates, times = [], []
+    chunkOutputs = []
+    chunkOutput = None
+    i = 0
+    while True:
+
+        # requests from monitorDREAM.py
+        control = readControl(job.outputFile)
+        if control.get('kill'):
+            job.status = JOB_FAILED
+            job.message = 'killed'
+            break
+        if control.get('stop') and chunkOutput is not None:
+            job.message = f'stopped after {i*chunkTime:.3g} s'
+            break
+        nChunksMax = int(np.ceil(control.get('maxTime', maxTime) / chunkTime - 1e-9))
+        if i >= nChunksMax:
+            job.message = f'not converged after {i*chunkTime:.3g} s'
+            break
+
+        # at least two saved times per chunk, for the convergence test below
+        ds.timestep.setTmax(chunkTime)
+        ds.timestep.setNt(max(2, int(round(nt / nChunks))))
+        if nSaveSteps:
+            ds.timestep.setNumberOfSaveSteps(max(2, min(nSaveSteps, ds.timestep.nt)))
+        if chunkOutput is not None:
+            ds.fromOutput(chunkOutput)
+
+        chunkSettings = os.path.join(chunkDir, f'settings{i}.h5')
+        ds.output.setFilename(os.path.join(chunkDir, f'output{i}.h5'))
+        ds.save(chunkSettings)
+
+        chunkJob = runSimulation(Job(chunkSettings), onStart=onStart, parent=job, verbose=verbose, **kwargs)
+        job.wallTime += chunkJob.wallTime
+        if chunkJob.status == JOB_FAILED:
+            job.status = JOB_FAILED
+            job.message = f'chunk {i+1}: {chunkJob.message}'
+            break
+
+        chunkOutput = chunkJob.outputFile
+        chunkOutputs.append(chunkOutput)
+        with h5py.File(chunkOutput, 'r') as fp:
+            if 'other/fluid/runawayRate' not in fp:
+                job.status = JOB_FAILED
+                job.message = 'chunked runs need fluid/runawayRate to be included'
+                break
+            runawayRate = fp['other/fluid/runawayRate'][()]
+            runawayRates.append(runawayRate)
+            times.append(i*chunkTime + fp['grid/t'][-len(runawayRate):])
+
+        if isRunawayRateConverged(np.concatenate(runawayRates), time=np.concatenate(times), minTime=p.MIN_TIME_CONVERGENCE * tMax):
+            job.message = f'converged after {(i+1)*chunkTime:.3g} s'
+            break
+        i += 1
+
+    if chunkOutputs and job.status != JOB_FAILED:
+        concatenateOutputs(chunkOutputs, job.outputFile)
+        job.status = JOB_DONE
+
+
+def _runWarmStarted(executor, run, queue, jobs, scanAxis, nWorkers, **kwargs):
+    """
+    Submits the queued jobs ordered along the scan axis and yields them as they
+    finish. While no job is done, at most N_COLD_STARTS cold jobs spread
+    evenly along the axis are run and the other workers are left idle, so that
+    the remaining jobs wait for a neighbour; afterwards the pending job closest
+    to a finished one is started next, warm started from its nearest finished
+    neighbour. If all cold jobs fail, new ones are started.
+
+    The pending jobs are kept sorted by scan value, and the pending jobs
+    nearest to each finished job on either side, found by bisection, in a heap
+    ordered by distance. Entries of jobs started in the meantime are replaced
+    as they are popped, so that each job is picked in O(log N).
+    """
+    scanValues = {job.settingsFile: getScanValue(job.settingsFile, scanAxis) for job in jobs}
+    value = lambda job: scanValues[job.settingsFile]
+
+    pending = sorted(queue, key=value)
+    pendingValues = [value(job) for job in pending]
+    running = {}
+    nearest, tiebreak = [], count()
+
+    def pushNearest(neighbour):
+        i = bisect_left(pendingValues, value(neighbour))
+        for j in (i-1, i):
+            if 0 <= j < len(pending):
+                heappush(nearest, (abs(pendingValues[j] - value(neighbour)), next(tiebreak), pending[j], neighbour))
+
+    def popPending(i):
+        pendingValues.pop(i)
+        return pending.pop(i)
+
+    done = [job for job in jobs if job.status == JOB_DONE]
+    for neighbour in done:
+        pushNearest(neighbour)
+
+    while pending or running:
+
+        while pending and len(running) < nWorkers:
+            if done:
+                _, _, job, neighbour = heappop(nearest)
+                i = bisect_left(pendingValues, value(job))
+                while i < len(pending) and pending[i] is not job and pendingValues[i] == value(job):
+                    i += 1
+                if i < len(pending) and pending[i] is job:
+                    popPending(i)
+                    running[executor.submit(run, job, init=neighbour.outputFile, **kwargs)] = job
+                pushNearest(neighbour)
+            else:
+                # only cold jobs run while none is done
+                nFree = min(nWorkers, N_COLD_STARTS, len(pending) + len(running)) - len(running)
+                if nFree <= 0:
+                    break
+                for i in sorted(set(np.linspace(0, len(pending)-1, nFree).round().astype(int)), reverse=True):
+                    job = popPending(i)
+                    running[executor.submit(run, job, **kwargs)] = job
+                break
+
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            job = future.result()
+            del running[future]
+            if job.status == JOB_DONE:
+                done.append(job)
+                pushNearest(job)
+            yield job
+
+
+def runScan(settingsDir='settings/', nWorkers=None, nThreads=1, dreami=None,
+            timeout=None, useCache=True, manifestFile=None, restart=False, nChunks=None,
+            scanAxis=None, settingsFiles=None, verbose=False):
+    """
+    Runs dreami for all settings files in a directory in parallel. Each job is
+    a separate dreami process, so a thread pool is enough to keep nWorkers
+    processes busy. Prints the status of each job as it finishes and returns
+    the list of jobs. Jobs recorded as done in the scan manifest are skipped,
+    unless restart is True.
+
+    str settingsDir :   Directory containing DREAM settings files.
+    int nWorkers :      No. simultaneous dreami processes (default: no. cores / nThreads).
+    int nThreads :      No. OpenMP threads given to each dreami process.
+    str dreami :        Path to the dreami executable (DREAMI_PATH by default).
+    float timeout :     Maximum wall time in seconds for each job.
+    bool useCache :     Reuse cached outputs of identical configurations.
+    str manifestFile :  Scan manifest (default: manifest.jsonl next to settingsDir).
+    bool restart :      Discard the manifest and re-run all jobs.
+    int nChunks :       If given, run each job in nChunks chunks with early stopping
+                        on convergence (see runSimulationChunked).
+    scanAxis :          If given, warm start jobs along this scan axis (see getScanValue).
+    list settingsFiles :    Settings files to run, instead of all in settingsDir.
+    bool verbose :      Show dreami stdout.
+    """
+    if settingsFiles is None:
+        settingsFiles = sorted(glob.glob(os.path.join(settingsDir, '*.h5')))
+    if not settingsFiles:
+        raise Exception(f'No DREAM settings files found in {settingsDir}')
+
+    if nWorkers is None:
+        nWorkers = max(1, (os.cpu_count() or 1) // nThreads)
+
+    if manifestFile is None:
+        manifestFile = os.path.join(os.path.dirname(os.path.normpath(settingsDir)), 'manifest.jsonl')
+    if restart and os.path.exists(manifestFile):
+        os.remove(manifestFile)
+
+    cache = OutputCache() if useCache else None
+    manifest = Manifest(manifestFile)
+
+    jobs = [manifest.getJob(settingsFile) for settingsFile in settingsFiles]
+    manifest.compact()
+
+    queue = [job for job in jobs if job.status != JOB_DONE]
+    n = len(queue)
+    if n < len(jobs):
+        print(f'{len(jobs) - n} of {len(jobs)} simulations already done according to {manifestFile}.')
+    print(f'Running {n} simulations on {min(nWorkers, n)} workers.')
+
+    run = runSimulation if nChunks is None else partial(runSimulationChunked, nChunks=nChunks)
+
+    kwargs = dict(dreami=dreami, nThreads=nThreads, timeout=timeout, cache=cache,
+                  manifest=manifest, verbose=verbose)
+
+    try:
+        with ThreadPoolExecutor(max_workers=nWorkers) as executor:
+            if scanAxis is None:
+                futures = [executor.submit(run, job, **kwargs) for job in queue]
+                finished = (future.result() for future in as_completed(futures))
+            else:
+                finished = _runWarmStarted(executor, run, queue, jobs, scanAxis, nWorkers, **kwargs)
+
+            for i, job in enumerate(finished):
+                print(f'[{i+1}/{n}] {job}')
+    finally:
+        manifest.compact()
+
+    nFailed = sum(job.status == JOB_FAILED for job in jobs)
+    if nFailed:
+        print(f'{nFailed} of {n} simulations failed.')
+
+    return jobs
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run dreami for all settings files in a directory.')
+    parser.add_argument('settingsDir', nargs='?', default='settings/',
+                        help='Directory containing DREAM settings files.')
+    parser.add_argument('-n', '--nWorkers', type=int, default=None,
+                        help='No. simultaneous dreami processes.')
+    parser.add_argument('-t', '--nThreads', type=int, default=1,
+                        help='No. OpenMP threads per dreami process.')
+    parser.add_argument('--dreami', default=None,
+                        help="Path to the dreami executable ('standin' for the synthetic stand-in).")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Maximum wall time in seconds for each job.')
+    parser.add_argument('--no-cache', dest='useCache', action='store_false',
+                        help='Always run dreami, ignoring the output cache.')
+    parser.add_argument('--manifest', dest='manifestFile', default=None,
+                        help='Scan manifest file (default: manifest.jsonl next to settingsDir).')
+    parser.add_argument('--restart', action='store_true',
+                        help='Discard the scan manifest and re-run all simulations.')
+    parser.add_argument('--chunks', dest='nChunks', type=int, default=None,
+                        help='Run each simulation in chunks, stopping once the runaway rate has converged.')
+    parser.add_argument('--warm-start', dest='scanAxis', default=None,
+                        help='Warm start simulations along this scan axis, e.g. eqsys/E_field/data.')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Show dreami stdout.')
+    args = parser.parse_args()
+
+    jobs = runScan(args.settingsDir, nWorkers=args.nWorkers, nThreads=args.nThreads,
+                   dreami=args.dreami, timeout=args.timeout, useCache=args.useCache,
+                   manifestFile=args.manifestFile, restart=args.restart,
+                   nChunks=args.nChunks, scanAxis=args.scanAxis, verbose=args.verbose)
+
+    sys.exit(int(any(job.status == JOB_FAILED for job in jobs)))
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+"""
+Synthetic stand-in for dreami, for exercising and load testing the scan
+orchestration (runDREAM.py, cacheDREAM.py, checkDREAM.py, the visualizers,
+...) without DREAM. Like dreami, it takes a DREAM settings file, which is
+read with h5py only. It sleeps for a time growing with the grid size,
+
+    STANDIN_BASE_TIME + STANDIN_TIME_PER_CELL * nt * nr * np * nxi,
+
+(np = nxi = 1 without a hot-tail grid) and writes an output file with the
+layout of a DREAM output: the grids (t, r, effectivePassingFraction, the
+hot-tail momentum grid), the unknowns (n_re, n_cold, E_field, T_cold, n_i and
+f_hot), ion metadata, the fluid other quantities (runawayRate, gammaDreicer,
+GammaAva), timings and a copy of the settings. The physics is only a simple
+analytic model (Connor-Hastie Dreicer rate, trapping by the circular
+passing fraction and, if enabled, avalanche growth), good for plausible,
+smooth data.
+
+Select it as the dreami executable, e.g.
+    $ python3 runDREAM.py settings/ --dreami standin
+    $ DREAMI=standin ./run.sh
+
+Environment variables:
+    DREAMI_STANDIN_SCALE    Factor of the sleep time (0 to not sleep at all).
+    DREAMI_STANDIN_FAIL     Probability of failing, to exercise error handling.
+
+In terminal run:
+    $ python3 standinDREAM.py settings.h5
+"""
+import sys, os, time
+import numpy as np
+import h5py
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Sleep time [s] of a run
+STANDIN_BASE_TIME = 5e-2
+STANDIN_TIME_PER_CELL = 1e-6
+
+# Physical constants
+e = 1.602176634e-19     # elementary charge [C]
+m = 9.1093837015e-31    # electron mass [kg]
+c = 299792458.          # speed of light [m/s]
+eps0 = 8.8541878128e-12 # vacuum permittivity [F/m]
+LN_LAMBDA = 15.         # Coulomb logarithm
+
+
+def _get(settings, path, default=None):
+    """
+    Returns the value at path of a settings file, or default if missing.
+    """
+    if path not in settings:
+        return default
+    value = settings[path][()]
+    if isinstance(value, bytes):
+        return value.decode()
+    return value.item() if np.ndim(value) == 0 and hasattr(value, 'item') else value
+
+
+def _getProfile(settings, name, default):
+    """
+    Returns the (spatially averaged) prescribed value of an unknown.
+    """
+    value = _get(settings, f'eqsys/{name}/data/x')
+    return default if value is None else float(np.mean(value))
+
+
+def getGrid(settings):
+    """
+    Returns the time, radial and momentum grid sizes of a settings file.
+    """
+    nt = int(_get(settings, 'timestep/nt', p.N_TIME))
+    nSaveSteps = int(_get(settings, 'timestep/nsavesteps', 0) or 0)
+    grid = {'tMax': float(_get(settings, 'timestep/tmax', p.MAX_TIME)), 'nt': nt,
+            'nSave': min(nSaveSteps, nt) if nSaveSteps > 0 else nt,
+            'nr': int(_get(settings, 'radialgrid/nr', p.N_RADIUS)),
+            'a': float(_get(settings, 'radialgrid/a', p.MINOR_RADIUS)),
+            'R0': float(_get(settings, 'radialgrid/R0', np.inf)),
+            'np': 0, 'nxi': 0, 'pMax': p.MAX_MOMENTUM}
+    if int(_get(settings, 'radialgrid/type', 1)) == 1:
+        grid['R0'] = np.inf
+    if _get(settings, 'hottailgrid/enabled', False):
+        grid['np'] = int(_get(settings, 'hottailgrid/np', p.N_MOMENTUM))
+        grid['nxi'] = int(_get(settings, 'hottailgrid/nxi', p.N_PITCH))
+        grid['pMax'] = float(_get(settings, 'hottailgrid/pmax', p.MAX_MOMENTUM))
+    return grid
+
+
+def getSleepTime(grid):
+    scale = float(os.environ.get('DREAMI_STANDIN_SCALE', 1.))
+    cells = grid['nt'] * grid['nr'] * max(grid['np'], 1) * max(grid['nxi'], 1)
+    return scale * (STANDIN_BASE_TIME + STANDIN_TIME_PER_CELL * cells)
+
+
+def getDreicerRate(E, T, n):
+    """
+    Returns the Connor-Hastie Dreicer generation rate [s^-1] per electron.
+
+    float E :   Electric field [V/m].
+    float T :   Temperature [eV].
+    float n :   Electron density [m^-3].
+    """
+    nu = n * e**4 * LN_LAMBDA / (4 * np.pi * eps0**2 * m**2 * (2 * e * T / m)**1.5)
+    ED = n * e**3 * LN_LAMBDA / (4 * np.pi * eps0**2 * e * T)
+    x = max(E, 1e-30) / ED
+    return nu * x**(-3/16) * np.exp(-1 / (4 * x) - np.sqrt(2 / x))
+
+
+def getAvalancheRate(E, n):
+    """
+    Returns the avalanche growth rate [s^-1] of the Rosenbluth-Putvinski model.
+    """
+    Ec = n * e**3 * LN_LAMBDA / (4 * np.pi * eps0**2 * m * c**2)
+    tau = 4 * np.pi * eps0**2 * m**2 * c**3 / (n * e**4 * LN_LAMBDA)
+    return max(E / Ec - 1, 0.) / (tau * LN_LAMBDA)
+
+
+def writeOutput(outputFile, grid, settings, wallTime=0.):
+    """
+    Writes a synthetic DREAM output of the given settings, with timings
+    splitting wallTime between matrix assembly, linear solve and the rest.
+    """
+    from trappingDREAM import getPassingFraction
+
+    E = _getProfile(settings, 'E_field', p.ELECTRIC_FIELD)
+    T = _getProfile(settings, 'T_cold', p.TEMPERATURE)
+    n = p.ELECTRON_DENSITY
+
+    nr, nSave = grid['nr'], grid['nSave']
+    rf = np.linspace(0, grid['a'], nr + 1)
+    r = (rf[1:] + rf[:-1]) / 2
+    t = np.linspace(0, grid['tMax'], nSave + 1)
+    epf = np.ones(nr) if np.isinf(grid['R0']) else getPassingFraction(r, majorRadius=grid['R0'], minorRadius=grid['a'])
+
+    # radially decaying temperature, trapping reduces the Dreicer rate
+    profile = 1 - .5 * (r / grid['a'])**2
+    gammaDreicer = n * np.array([getDreicerRate(E, T * x, n) for x in profile]) * epf
+    # avalanche only if enabled (AVALANCHE_NEGLECT = 1 in configureDREAM.py)
+    avalanche = int(_get(settings, 'eqsys/n_re/avalanche', 1)) != 1
+    GammaAva = getAvalancheRate(E, n) * np.ones(nr) * avalanche
+
+    # warm start (see runDREAM.setWarmStart)
+    n_re0 = np.zeros(nr)
+    init = _get(settings, 'init/fromfile')
+    if init and os.path.exists(init):
+        with h5py.File(init, 'r') as fp:
+            if 'eqsys/n_re' in fp and fp['eqsys/n_re'].shape[1] == nr:
+                n_re0 = fp['eqsys/n_re'][-1]
+
+    # n_re' = gammaDreicer + GammaAva n_re
+    tt, G = t[:, None], np.where(GammaAva > 0, GammaAva, 1.)
+    growth = np.where(GammaAva > 0, np.expm1(GammaAva * tt) / G, tt)
+    n_re = np.minimum(n_re0 * np.exp(GammaAva * tt) + gammaDreicer * growth, n)
+    runawayRate = np.where(n_re[1:] < n, gammaDreicer + GammaAva * n_re[1:], 0.)
+    n_cold = n - n_re
+
+    with h5py.File(outputFile, 'w') as fp:
+        g = fp.create_group('grid')
+        g['t'], g['r'], g['r_f'], g['dr'] = t, r, rf, np.diff(rf)
+        g['VpVol'] = 4 * np.pi**2 * (grid['R0'] if np.isfinite(grid['R0']) else 1.) * r
+        g['effectivePassingFraction'] = epf
+
+        eq = fp.create_group('eqsys')
+        eq['n_re'], eq['n_cold'] = n_re, n_cold
+        eq['E_field'] = E * np.ones((nSave + 1, nr))
+        eq['T_cold'] = T * profile * np.ones((nSave + 1, 1))
+        eq['n_i'] = n * np.ones((nSave + 1, 1, nr))
+
+        if grid['np']:
+            pGrid = np.linspace(0, grid['pMax'], grid['np'] + 1)
+            xiGrid = np.linspace(-1, 1, grid['nxi'] + 1)
+            hottail = g.create_group('hottail')
+            hottail['p1'], hottail['p2'] = (pGrid[1:] + pGrid[:-1]) / 2, (xiGrid[1:] + xiGrid[:-1]) / 2
+            hottail['p1_f'], hottail['p2_f'] = pGrid, xiGrid
+
+            # Maxwellian of temperature T
+            p2 = hottail['p1'][()]**2
+            pth2 = 2 * T * profile / p.m_e
+            maxwellian = n / (np.pi**1.5 * pth2**1.5)[:, None] * np.exp(-p2 / pth2[:, None])
+            fHot = eq.create_dataset('f_hot', (nSave + 1, nr, grid['nxi'], grid['np']), dtype=float)
+            for i in range(nSave + 1):
+                fHot[i] = np.broadcast_to(maxwellian[:, None, :], fHot.shape[1:])
+
+        fluid = fp.create_group('other/fluid')
+        fluid['runawayRate'] = runawayRate
+        fluid['gammaDreicer'] = np.broadcast_to(gammaDreicer, (nSave, nr))
+        fluid['GammaAva'] = np.broadcast_to(GammaAva, (nSave, nr))
+
+        ionmeta = fp.create_group('ionmeta')
+        ionmeta['names'] = np.bytes_(_get(settings, 'eqsys/n_i/names', 'D;'))
+        ionmeta['Z'] = np.atleast_1d(_get(settings, 'eqsys/n_i/Z', 1))
+
+        timings = fp.create_group('timings')
+        timings['total'] = wallTime
+        timings['solver/rebuild'] = .55 * wallTime
+        timings['solver/invert'] = .35 * wallTime
+        timings['output'] = .1 * wallTime
+
+        settings.copy(settings['/'], fp, name='settings')
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        raise ValueError('Expected a DREAM settings file.')
+    settingsFile = sys.argv[1]
+
+    with h5py.File(settingsFile, 'r') as settings:
+        grid = getGrid(settings)
+        outputFile = _get(settings, 'output/filename', 'output.h5')
+
+        print(f"dreami stand-in: nt = {grid['nt']}, nr = {grid['nr']}, np = {grid['np']}, nxi = {grid['nxi']}", flush=True)
+        tic = time.time()
+        tSleep = getSleepTime(grid)
+        for i in range(grid['nt']):
+            time.sleep(tSleep / grid['nt'])
+            print(f"Time step {i+1}/{grid['nt']}", flush=True)
+
+        if np.random.random() < float(os.environ.get('DREAMI_STANDIN_FAIL', 0.)):
+            sys.exit('dreami stand-in: simulated failure')
+
+        writeOutput(outputFile, grid, settings, wallTime=time.time() - tic)
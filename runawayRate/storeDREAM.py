@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+Columnar store of scan results. Ingesting a directory of DREAM outputs extracts
+the scan parameters and the (small) quantities we plot into one column per
+quantity, saved in a single .npz file next to the outputs. Plotting a scan is
+then a query on the store rather than opening every output, and scan parameters
+are read from the outputs rather than parsed from file names. Ingestion is
+incremental: only new or modified outputs are opened.
+
+In terminal run:
+    $ python3 storeDREAM.py outputDir [outputDir ...]    ingest outputs and list the scan
+"""
+import sys, os, glob
+from functools import reduce
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Output reader import
+from readDREAM import LazyOutput
+
+# Scan parameters indexing the store, with their default if not in the output
+PARAMETERS = {
+    'E':        None,
+    'T':        None,
+    'n':        None,
+    'Z':        None,
+    'kappa':    1.,
+    'delta':    0.,
+    'Delta':    0.,
+}
+
+# Stored quantities and their paths in a DREAM output
+QUANTITIES = {
+    'r':                        'grid.r',
+    'effectivePassingFraction': 'grid.effectivePassingFraction',
+    'time':                     'other.fluid.runawayRate.time',
+    'runawayRate':              'other.fluid.runawayRate.data',
+    'gammaDreicer':             'other.fluid.gammaDreicer.data',
+    'GammaAva':                 'other.fluid.GammaAva.data',
+    'n_re':                     'eqsys.n_re.data',
+    'n_cold':                   'eqsys.n_cold.data',
+}
+
+# Default store file name, placed next to the output directory
+STORE_FILE = 'scan.npz'
+
+
+def getStoreFile(outputDir):
+    """
+    Returns the default store file of an output directory.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(outputDir)), STORE_FILE)
+
+
+def _getQuantity(do, path):
+    """
+    Returns the quantity at path (e.g. 'grid.r') of a DREAM output as an array,
+    or None if the output does not include it.
+    """
+    try:
+        return np.asarray(reduce(getattr, path.split('.'), do), dtype=float)
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def getScanParameters(do):
+    """
+    Returns a dict with the scan parameters (see PARAMETERS) of a DREAM output:
+    the initial on-axis electric field, temperature, density and ion charge,
+    and the maximum elongation, triangularity and Shafranov shift of the
+    magnetic geometry.
+
+    DREAM.DREAMOutput do :  DREAM output object.
+    """
+    def first(path):
+        value = _getQuantity(do, path)
+        return np.nan if value is None else float(value.flat[0])
+
+    params = {'E': first('eqsys.E_field.data'),
+              'T': first('eqsys.T_cold.data'),
+              'n': first('eqsys.n_cold.data')}
+
+    try:
+        params['Z'] = float(do.eqsys.n_i.ions[0].Z)
+    except (AttributeError, IndexError):
+        params['Z'] = np.nan
+
+    radialgrid = getattr(getattr(do, 'settings', None), 'radialgrid', None)
+    for name in ['kappa', 'delta', 'Delta']:
+        value = _getEdgeValue(getattr(radialgrid, name, None))
+        params[name] = PARAMETERS[name] if value is None else value
+
+    return params
+
+
+def _getEdgeValue(value):
+    """
+    Returns the value of largest magnitude of a radial profile of the magnetic
+    geometry, i.e. its value at the edge, or None if it is missing or not
+    numeric. Profiles stored as groups {x, r} (as in the settings of a
+    toroidal output) are reduced over x.
+    """
+    value = getattr(value, 'x', value)
+    try:
+        value = np.atleast_1d(np.asarray(value, dtype=float))
+    except (TypeError, ValueError):
+        return None
+    if value.size == 0 or not np.isfinite(value).any():
+        return None
+    return float(value[np.nanargmax(np.abs(value))])
+
+
+def _pad(arrays):
+    """
+    Stacks arrays of possibly different shapes (or None) into one array,
+    padding with nan.
+    """
+    present = [a for a in arrays if a is not None]
+    if not present:
+        return np.full(len(arrays), np.nan)
+
+    ndim = max(a.ndim for a in present)
+    present = [a.reshape(a.shape + (1,) * (ndim - a.ndim)) for a in present]
+    shape = tuple(max(a.shape[i] for a in present) for i in range(ndim))
+
+    stacked = np.full((len(arrays),) + shape, np.nan)
+    for i, a in enumerate(arrays):
+        if a is not None:
+            a = a.reshape(a.shape + (1,) * (ndim - a.ndim))
+            stacked[(i,) + tuple(slice(0, n) for n in a.shape)] = a
+    return stacked
+
+
+class ScanStore:
+
+    def __init__(self, filename=None, verbose=False):
+        """
+        Columnar store of the scan parameters and plotted quantities of a set
+        of DREAM outputs, one row per output. Loads filename if it exists.
+
+        str filename :  Store file (.npz).
+        bool verbose :  Show information.
+        """
+        self.filename   = filename
+        self.verbose    = verbose
+        self.rows       = {}  # output file -> dict of mtime, parameters and quantities
+
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ingest(self, outputs):
+        """
+        Adds new or modified outputs to the store. Returns the number of outputs
+        read.
+
+        outputs :   Output directory, or list of output files.
+        """
+        if isinstance(outputs, str):
+            outputs = sorted(glob.glob(os.path.join(outputs, '*.h5')))
+
+
+        nRead = 0
+        for fp in outputs:
+            fp = os.path.abspath(fp)
+            mtime = os.path.getmtime(fp)
+            if fp in self.rows and self.rows[fp]['mtime'] == mtime:
+                continue
+
+            if self.verbose:
+                print(f'Ingesting {fp}')
+            do = LazyOutput(fp)
+            row = {'mtime': mtime}
+            row.update(getScanParameters(do))
+            row.update({name: _getQuantity(do, path) for name, path in QUANTITIES.items()})
+            do.close()
+
+            self.rows[fp] = row
+            nRead += 1
+
+        # forget outputs which have been removed
+        for fp in [fp for fp in self.rows if not os.path.exists(fp)]:
+            del self.rows[fp]
+
+        return nRead
+
+    def columns(self):
+        """
+        Returns a dict of columns: 'outputFile', 'mtime', the scan parameters and the
+        quantities, each stacked along the first axis (padded with nan).
+        """
+        files = list(self.rows)
+        columns = {'outputFile': np.array(files, dtype=str),
+                   'mtime': np.array([self.rows[fp]['mtime'] for fp in files])}
+        for name in PARAMETERS:
+            columns[name] = np.array([self.rows[fp][name] for fp in files], dtype=float)
+        for name in QUANTITIES:
+            columns[name] = _pad([self.rows[fp][name] for fp in files])
+        return columns
+
+    def query(self, sortBy=None, **where):
+        """
+        Returns the columns (see columns) of the outputs matching all conditions,
+        sorted by a scan parameter.
+
+        str sortBy :    Scan parameter to sort by.
+
+        Remaining keyword arguments are conditions on scan parameters: a value
+        (matched with np.isclose) or a (min, max) tuple.
+        """
+        columns = self.columns()
+        mask = np.ones(len(self), dtype=bool)
+        for name, cond in where.items():
+            if name not in PARAMETERS:
+                raise ValueError(f"Unknown scan parameter '{name}'.")
+            if isinstance(cond, tuple):
+                mask &= (columns[name] >= cond[0]) & (columns[name] <= cond[1])
+            else:
+                mask &= np.isclose(columns[name], cond)
+
+        index = np.flatnonzero(mask)
+        if sortBy is not None:
+            index = index[np.argsort(columns[sortBy][index], kind='stable')]
+        return {name: column[index] for name, column in columns.items()}
+
+    def save(self, filename=None):
+        """
+        Saves the store atomically.
+        """
+        filename = self.filename if filename is None else filename
+        tmp = filename + '.part.npz'
+        np.savez(tmp, **self.columns())
+        os.replace(tmp, filename)
+
+    def load(self, filename):
+        data = np.load(filename)
+        self.rows = {}
+        for i, fp in enumerate(data['outputFile']):
+            row = {'mtime': float(data['mtime'][i])}
+            row.update({name: float(data[name][i]) for name in PARAMETERS})
+            row.update({name: data[name][i] for name in QUANTITIES})
+            self.rows[str(fp)] = row
+
+
+def loadScan(outputDir, filename=None, verbose=False):
+    """
+    Returns the store of an output directory, ingesting new or modified outputs
+    (and saving the store) if needed.
+
+    str outputDir :     Directory of DREAM outputs.
+    str filename :      Store file (see getStoreFile by default).
+    bool verbose :      Show information.
+    """
+    filename = getStoreFile(outputDir) if filename is None else filename
+    store = ScanStore(filename, verbose=verbose)
+    nStored = len(store)
+    if store.ingest(outputDir) or len(store) != nStored:
+        store.save()
+    return store
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        raise ValueError('Expected at least one output directory.')
+
+    for outputDir in sys.argv[1:]:
+        store = loadScan(outputDir, verbose=True)
+        columns = store.query()
+        print(f'{getStoreFile(outputDir)}: {len(store)} outputs')
+        print(' '.join(f'{name:>10s}' for name in PARAMETERS))
+        for i in range(len(store)):
+            print(' '.join(f'{columns[name][i]:10.4g}' for name in PARAMETERS))
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+"""
+Streaming reductions of the hot-tail distribution f_hot (time x radius x xi x
+p) of a DREAM output, for outputs too large to load. f_hot is read from the
+HDF5 file chunk by chunk, along time or radius, and every chunk is reduced
+over momentum space before the next one is read, so that peak memory is
+bounded by one chunk (MAX_CHUNK_BYTES by default) instead of the whole
+distribution. The reductions are weighted sums over (xi, p) with weights
+precomputed on the momentum grid (see getWeights), contracted with einsum so
+that no temporaries of the size of a chunk are made:
+
+    density         n = int f d^3p                          [m^-3]
+    hotDensity      density above the momentum pc           [m^-3]
+    current         j = e c int xi p/gamma f d^3p           [A/m^2]
+    energy          W = m_e c^2 int (gamma - 1) f d^3p      [eV m^-3]
+    spectrum        pitch-integrated dn/dp                  [m^-3]
+
+with d^3p = 2 pi p^2 dp dxi (p in units of m_e c). The mean energy is W/n.
+
+In terminal run:
+    $ python3 streamDREAM.py output.h5 [--pc PC] [--axis time|radius] [--chunk-mb MB] [--save moments.npz]
+"""
+import sys, os, argparse
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Output reader import
+from readDREAM import LazyOutput
+
+# Max size of an f_hot chunk read at once
+MAX_CHUNK_BYTES = 2**27
+
+# Elementary charge [C] and speed of light [m/s]
+ELEMENTARY_CHARGE = 1.602176634e-19
+SPEED_OF_LIGHT = 299792458.
+
+# Chunk axes of f_hot
+AXES = {'time': 0, 'radius': 1}
+
+
+def getMomentumGrid(do):
+    """
+    Returns the momentum p (np,), pitch xi (nxi,) and cell widths dp and dxi
+    of the hot-tail grid of an output.
+    """
+    hottail = do.grid.hottail
+    pGrid, xiGrid = np.asarray(hottail.p1), np.asarray(hottail.p2)
+    dp = np.diff(hottail.p1_f) if 'p1_f' in hottail else np.gradient(pGrid)
+    dxi = np.diff(hottail.p2_f) if 'p2_f' in hottail else np.gradient(xiGrid)
+    return pGrid, xiGrid, dp, dxi
+
+
+def getWeights(do, pc=None):
+    """
+    Returns the reductions of f_hot (see module docstring) as a dict of
+    (weights, subscripts) pairs: each reduction of a chunk f of shape
+    (..., nxi, np) is einsum(subscripts, f, weights).
+
+    float pc :  Momentum above which hotDensity counts electrons (PSEP by default).
+    """
+    pc = p.PSEP if pc is None else pc
+    pGrid, xiGrid, dp, dxi = getMomentumGrid(do)
+    P, XI = np.meshgrid(pGrid, xiGrid)
+    gamma = np.sqrt(1 + P**2)
+    dV = 2 * np.pi * P**2 * np.outer(dxi, dp)
+
+    moment = '...ij,ij->...'
+    return {'density':      (dV, moment),
+            'hotDensity':   (dV * (P > pc), moment),
+            'current':      (ELEMENTARY_CHARGE * SPEED_OF_LIGHT * dV * XI * P / gamma, moment),
+            'energy':       (p.m_e * dV * (gamma - 1), moment),
+            'spectrum':     (dV / dp, '...ij,ij->...j')}
+
+
+def getChunkSize(dataset, axis, maxBytes=MAX_CHUNK_BYTES):
+    """
+    Returns the no. slices along axis read at once: as many as fit in maxBytes
+    (at least one), rounded down to whole HDF5 chunks if the dataset is chunked.
+    """
+    sliceBytes = dataset.dtype.itemsize * np.prod(dataset.shape) // dataset.shape[axis]
+    size = max(1, int(maxBytes // max(sliceBytes, 1)))
+    if dataset.chunks is not None and size >= dataset.chunks[axis]:
+        size -= size % dataset.chunks[axis]
+    return min(size, dataset.shape[axis])
+
+
+def streamReduce(dataset, reductions, axis=0, chunkSize=None, maxBytes=MAX_CHUNK_BYTES):
+    """
+    Returns the reductions of a 4D dataset (nt, nr, nxi, np), read chunk by
+    chunk along axis, as a dict of arrays of shape (nt, nr, ...).
+
+    h5py.Dataset dataset :  Dataset, e.g. f_hot.
+    dict reductions :       Name and (weights, subscripts) pairs (see getWeights).
+    int axis :              0 to read chunks of time steps, 1 of radii.
+    int chunkSize :         No. slices per chunk (see getChunkSize by default).
+    int maxBytes :          Max chunk size in bytes, if chunkSize is None.
+    """
+    chunkSize = getChunkSize(dataset, axis, maxBytes=maxBytes) if chunkSize is None else chunkSize
+    n = dataset.shape[axis]
+
+    results = {}
+    for start in range(0, n, chunkSize):
+        index = [slice(None)] * dataset.ndim
+        index[axis] = slice(start, min(start + chunkSize, n))
+        chunk = dataset[tuple(index)]
+
+        for name, (weights, subscripts) in reductions.items():
+            value = np.einsum(subscripts, chunk, weights)
+            if name not in results:
+                shape = list(value.shape)
+                shape[axis] = n
+                results[name] = np.empty(shape)
+            results[name][tuple(index[:value.ndim])] = value
+        del chunk
+
+    return results
+
+
+def getMoments(outputFile, pc=None, axis='time', chunkSize=None, maxBytes=MAX_CHUNK_BYTES):
+    """
+    Returns the moments of f_hot of an output (see module docstring), of shape
+    (nt, nr), the spectrum of shape (nt, nr, np), the mean energy [eV] and the
+    grids t, r and p, streaming f_hot chunk by chunk.
+
+    str outputFile :    DREAM output file.
+    float pc :          Momentum above which hotDensity counts electrons (PSEP by default).
+    str axis :          'time' or 'radius', the axis f_hot is read in chunks along.
+    int chunkSize :     No. slices per chunk (see getChunkSize by default).
+    int maxBytes :      Max chunk size in bytes, if chunkSize is None.
+    """
+    if axis not in AXES:
+        raise ValueError(f"Invalid axis '{axis}', expected one of {list(AXES)}.")
+
+    with LazyOutput(outputFile) as do:
+        if 'f_hot' not in do.eqsys:
+            raise Exception(f'No f_hot in {outputFile}, which needs FIDELITY_KINETIC.')
+
+        moments = streamReduce(do.eqsys.f_hot.dataset, getWeights(do, pc=pc), axis=AXES[axis],
+                               chunkSize=chunkSize, maxBytes=maxBytes)
+        moments.update({'t': np.asarray(do.grid.t), 'r': np.asarray(do.grid.r), 'p': getMomentumGrid(do)[0]})
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        moments['meanEnergy'] = moments['energy'] / moments['density']
+    return moments
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Moments of f_hot, streamed chunk by chunk.')
+    parser.add_argument('outputFile', help='DREAM output file.')
+    parser.add_argument('--pc', type=float, default=None, help='Momentum above which hot electrons are counted.')
+    parser.add_argument('--axis', default='time', choices=list(AXES), help='Axis f_hot is read in chunks along.')
+    parser.add_argument('--chunk-mb', type=float, default=MAX_CHUNK_BYTES / 2**20, help='Max chunk size in MiB.')
+    parser.add_argument('--save', default=None, help='Save the moments to an .npz file.')
+    args = parser.parse_args()
+
+    moments = getMoments(args.outputFile, pc=args.pc, axis=args.axis, maxBytes=int(args.chunk_mb * 2**20))
+
+    print(f"final time step (t = {moments['t'][-1]:.3g} s):")
+    print(f"{'r [m]':>10s} {'n [m^-3]':>12s} {'n(p>pc)':>12s} {'j [A/m^2]':>12s} {'<E> [eV]':>12s}")
+    for i, r in enumerate(moments['r']):
+        print(f"{r:10.4f} {moments['density'][-1,i]:12.4e} {moments['hotDensity'][-1,i]:12.4e} "
+              f"{moments['current'][-1,i]:12.4e} {moments['meanEnergy'][-1,i]:12.4e}")
+
+    if args.save:
+        np.savez(args.save, **moments)
@@ -0,0 +1,375 @@
+#!/usr/bin/python3
+"""
+Surrogate model of the final runaway rate, trained on existing DREAM outputs.
+A Gaussian process with a squared exponential kernel (one length scale per
+input) is fitted to log10 of the runaway rate as a function of
+
+    E, T, n, Z, epsilon, kappa, delta, Delta
+
+where each output gives N_RADIAL_SAMPLES samples, at radial grid points
+spread evenly from the axis to the edge. Predictions come with an uncertainty,
+and RunawayRateSurrogate.query only calls DREAM (see simulatePoint) when the
+uncertainty exceeds a given tolerance. New outputs are added to the model
+incrementally by extending the Cholesky factorization and its inverse.
+
+In terminal run:
+    $ python3 surrogateDREAM.py outputDir [outputDir ...]    fit to all outputs and save the model
+"""
+import sys, os, glob, hashlib
+import numpy as np
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.optimize import minimize
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Output object import
+sys.path.append(p.DREAM_PATH)
+from DREAM.DREAMOutput import DREAMOutput
+
+# Surrogate inputs, and whether they are modelled in log10
+INPUTS = ['E', 'T', 'n', 'Z', 'epsilon', 'kappa', 'delta', 'Delta']
+LOG_INPUTS = ['E', 'T', 'n']
+
+# No. samples (radial grid points) taken from each output
+N_RADIAL_SAMPLES = 3
+
+# Default save file
+SURROGATE_FILE = os.path.join(dir, 'surrogate.npz')
+
+# Directory of the settings and outputs of simulatePoint
+SIMULATE_DIR = os.path.join(dir, 'surrogate')
+
+
+def _getProfile(ds, name, r):
+    """
+    Returns the shaping profile name (e.g. 'kappa') of the radial grid
+    settings evaluated at r, or its cylindrical default if not set.
+    """
+    default = 1. if name == 'kappa' else 0.
+    value = getattr(ds.radialgrid, name, None)
+    if value is None:
+        return np.full(r.shape, default)
+
+    value = np.atleast_1d(np.asarray(value, dtype=float))
+    if value.size == 1:
+        return np.full(r.shape, value[0])
+    return np.interp(r, getattr(ds.radialgrid, 'r' + name), value)
+
+
+def getSamples(do, atEpsilon=None):
+    """
+    Returns the surrogate inputs X of shape (N, len(INPUTS)) and the final
+    runaway rates y of shape (N,) of a DREAM output, one sample at each of
+    N_RADIAL_SAMPLES radial grid points spread evenly along the grid, and at
+    the grid point closest to atEpsilon if given.
+
+    DREAM.DREAMOutput do :  DREAM output object.
+    float atEpsilon :       Inverse aspect ratio r/R0 to also take a sample at.
+    """
+    try:
+        r = do.grid.r
+        runawayRate = do.other.fluid.runawayRate.data[-1,:]
+        E = do.eqsys.E_field.data[-1,:]
+        T = do.eqsys.T_cold.data[-1,:]
+        n = do.eqsys.n_cold.data[-1,:]
+        Z = np.full(r.shape, do.eqsys.n_i.ions[0].Z)
+        epsilon = r / do.grid.R0 if np.isfinite(do.grid.R0) else np.zeros(r.shape)
+    except AttributeError as err:
+        raise Exception('Output does not include needed data.') from err
+
+    ds = do.settings
+    shaping = [_getProfile(ds, name, r) for name in ['kappa', 'delta', 'Delta']]
+
+    X = np.column_stack([E, T, n, Z, epsilon] + shaping)
+
+    samples = np.linspace(0, r.size-1, min(N_RADIAL_SAMPLES, r.size)).round().astype(int)
+    if atEpsilon is not None:
+        samples = np.append(samples, np.argmin(np.abs(epsilon - atEpsilon)))
+    samples = np.unique(samples)
+    return X[samples], runawayRate[samples]
+
+
+def simulatePoint(point, dreami=None, nThreads=1, **kwargs):
+    """
+    Configures and runs DREAM at a surrogate input point, and returns the name
+    of the output. The electric field, temperature, ion charge and elongation
+    are set from the point, and the triangularity and Shafranov shift maxima
+    such that the linear profiles of ConfigureDREAM take the values of the point
+    at r = epsilon * R0. The density is that of ConfigureDREAM. The settings and
+    output are kept in SIMULATE_DIR, named by the point.
+
+    dict point :    Surrogate inputs (keys of INPUTS).
+    str dreami :    Path to the dreami executable (see runDREAM.runSimulation).
+    int nThreads :  No. OpenMP threads given to dreami.
+    **kwargs :      Passed on to ConfigureDREAM.
+    """
+    from configureDREAM import ConfigureDREAM
+    from runDREAM import Job, runSimulation, JOB_FAILED
+
+    minorRadius = kwargs.get('minorRadius', p.MINOR_RADIUS)
+    majorRadius = kwargs.get('majorRadius', p.MAJOR_RADIUS)
+    radius = min(point['epsilon'] * majorRadius / minorRadius, 1.)
+    maxProfile = lambda value: value / radius if radius > 0 else 0.
+    Z = int(round(point['Z']))
+
+    key = hashlib.sha1(np.array([point[name] for name in INPUTS], dtype=float).tobytes()).hexdigest()[:12]
+    settingsFile = os.path.join(SIMULATE_DIR, 'settings', f'settings_{key}.h5')
+    outputFile = os.path.join(SIMULATE_DIR, 'outputs', f'output_{key}.h5')
+    for fp in (settingsFile, outputFile):
+        os.makedirs(os.path.dirname(fp), exist_ok=True)
+
+    kwargs = {'analyses': ['runawayRate'], 'electricField': point['E'],
+              'temperature': point['T'], 'ion': (f'Z{Z}', Z),
+              'maxElongation': point['kappa'],
+              'maxTriangularity': maxProfile(point['delta']),
+              'maxShafranovShift': maxProfile(point['Delta']), **kwargs}
+    ConfigureDREAM(output=outputFile, save=settingsFile, **kwargs)
+
+    job = runSimulation(Job(settingsFile, outputFile), dreami=dreami, nThreads=nThreads)
+    if job.status == JOB_FAILED:
+        raise Exception(f'DREAM run at the surrogate point failed: {job.message}')
+    return outputFile
+
+
+class RunawayRateSurrogate:
+
+    def __init__(self, noise=1e-2, verbose=False):
+        """
+        Gaussian process model of log10 of the final runaway rate.
+
+        float noise :   Initial noise standard deviation of log10(runawayRate).
+        bool verbose :  Show information.
+        """
+        self.verbose        = verbose
+        self.X              = np.zeros((0, len(INPUTS)))
+        self.y              = np.zeros(0)
+
+        # hyperparameters: log length scales, log signal std and log noise std
+        self.logLengthScales = np.zeros(len(INPUTS))
+        self.logSignal       = 0.
+        self.logNoise        = np.log(noise)
+
+        # input and output normalization, fixed at the first fit
+        self.xMean = self.xScale = self.yMean = None
+
+        # training inputs (normalized), Cholesky factor of the kernel matrix,
+        # its inverse and the weights alpha = K^-1 (y - yMean) of the predictions
+        self.Z = self.L = self.Linv = self.alpha = None
+
+    ## data
+
+    def _transform(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float)).copy()
+        for i, name in enumerate(INPUTS):
+            if name in LOG_INPUTS:
+                X[:,i] = np.log10(X[:,i])
+        return (X - self.xMean) / self.xScale
+
+    def addOutput(self, do, atEpsilon=None):
+        """
+        Adds the samples of a DREAM output (object or file name) to the model,
+        updating the fit incrementally if the model has been fitted. If atEpsilon
+        is given, the sample closest to it is added as well (see getSamples).
+        """
+        if isinstance(do, str):
+            do = DREAMOutput(do)
+        X, y = getSamples(do, atEpsilon=atEpsilon)
+        self.addSamples(X, y)
+
+    def addSamples(self, X, y):
+        """
+        Adds samples with inputs X of shape (N, len(INPUTS)) and runaway rates y
+        of shape (N,). Samples with non-positive runaway rates are ignored.
+        """
+        X, y = np.atleast_2d(X), np.atleast_1d(y)
+        valid = y > 0
+        X, logY = X[valid], np.log10(y[valid])
+        if not logY.size:
+            return
+
+        nOld = self.y.size
+        self.X = np.vstack([self.X, X])
+        self.y = np.concatenate([self.y, logY])
+
+        if self.L is not None:
+            self._extend(nOld)
+
+    ## Gaussian process
+
+    def _kernel(self, A, B):
+        A = A / np.exp(self.logLengthScales)
+        B = B / np.exp(self.logLengthScales)
+        sqDist = (A**2).sum(1)[:,None] + (B**2).sum(1)[None,:] - 2 * A @ B.T
+        return np.exp(2 * self.logSignal - .5 * np.maximum(sqDist, 0))
+
+    def _factorize(self):
+        """
+        Factorizes the kernel matrix of all samples, and returns its noise-free
+        part.
+        """
+        self.Z = self._transform(self.X)
+        Kf = self._kernel(self.Z, self.Z)
+        self.L = np.linalg.cholesky(Kf + np.exp(2 * self.logNoise) * np.eye(self.y.size))
+        self.Linv = solve_triangular(self.L, np.eye(self.y.size), lower=True)
+        self.alpha = cho_solve((self.L, True), self.y - self.yMean)
+        return Kf
+
+    def _extend(self, nOld):
+        """
+        Extends the Cholesky factor and its inverse with the samples added after
+        the first nOld ones, without refactorizing the full kernel matrix.
+        """
+        self.Z = self._transform(self.X)
+        Zold, Znew = self.Z[:nOld], self.Z[nOld:]
+        K12 = self._kernel(Zold, Znew)
+        K22 = self._kernel(Znew, Znew) + np.exp(2 * self.logNoise) * np.eye(len(Znew))
+
+        L21 = solve_triangular(self.L, K12, lower=True).T
+        L22 = np.linalg.cholesky(K22 - L21 @ L21.T)
+
+        n = self.y.size
+        L = np.zeros((n, n))
+        L[:nOld,:nOld] = self.L
+        L[nOld:,:nOld] = L21
+        L[nOld:,nOld:] = L22
+        self.L = L
+
+        L22inv = solve_triangular(L22, np.eye(n - nOld), lower=True)
+        Linv = np.zeros((n, n))
+        Linv[:nOld,:nOld] = self.Linv
+        Linv[nOld:,:nOld] = -L22inv @ L21 @ self.Linv
+        Linv[nOld:,nOld:] = L22inv
+        self.Linv = Linv
+        self.alpha = cho_solve((self.L, True), self.y - self.yMean)
+
+    def _negLogMarginalLikelihood(self, theta):
+        """
+        Returns the negative log marginal likelihood of the hyperparameters
+        theta (log length scales, log signal std and log noise std) and its
+        gradient, 1/2 tr((K^-1 - alpha alpha^T) dK/dtheta).
+        """
+        self.logLengthScales, self.logSignal, self.logNoise = theta[:-2], theta[-2], theta[-1]
+        try:
+            Kf = self._factorize()
+        except np.linalg.LinAlgError:
+            return np.inf, np.zeros(theta.size)
+
+        W = self.Linv.T @ self.Linv - np.outer(self.alpha, self.alpha)
+        WKf = W * Kf
+        grad = np.empty(theta.size)
+        for i in range(len(INPUTS)):
+            sqDist = (self.Z[:,i,None] - self.Z[None,:,i])**2
+            grad[i] = .5 * (WKf * sqDist).sum() / np.exp(2 * self.logLengthScales[i])
+        grad[-2] = WKf.sum()
+        grad[-1] = np.exp(2 * self.logNoise) * np.trace(W)
+
+        return .5 * (self.y - self.yMean) @ self.alpha + np.log(np.diag(self.L)).sum(), grad
+
+    def fit(self, optimize=True):
+        """
+        Fits the model to all samples. If optimize is True, the hyperparameters
+        are chosen by maximizing the marginal likelihood.
+        """
+        if not self.y.size:
+            raise Exception('No samples to fit the surrogate model to.')
+
+        if self.xMean is None:
+            self.xMean, self.xScale = 0., 1.
+            Z = self._transform(self.X)
+            self.xMean, self.xScale = Z.mean(0), Z.std(0)
+            self.xScale[self.xScale == 0] = 1.
+            self.yMean = self.y.mean()
+            self.logSignal = np.log(max(self.y.std(), 1e-3))
+
+        if optimize:
+            theta0 = np.concatenate([self.logLengthScales, [self.logSignal, self.logNoise]])
+            res = minimize(self._negLogMarginalLikelihood, theta0, method='L-BFGS-B', jac=True,
+                           bounds=[(-5, 5)] * len(INPUTS) + [(-5, 5), (-10, 1)])
+            self._negLogMarginalLikelihood(res.x)
+            if self.verbose:
+                print(f'Fitted surrogate to {self.y.size} samples: {res.message}')
+        else:
+            self._factorize()
+
+        return self
+
+    def predict(self, X, returnStd=False):
+        """
+        Returns the predicted runaway rate at inputs X of shape (N, len(INPUTS))
+        and, if returnStd is True, the predictive standard deviation of
+        log10(runawayRate).
+        """
+        if self.L is None:
+            raise Exception('Surrogate model has not been fitted.')
+
+        Ks = self._kernel(self._transform(X), self.Z)
+        runawayRate = 10 ** (self.yMean + Ks @ self.alpha)
+        if not returnStd:
+            return runawayRate
+
+        v = self.Linv @ Ks.T
+        var = np.exp(2 * self.logSignal) - (v**2).sum(0)
+        return runawayRate, np.sqrt(np.maximum(var, 0))
+
+    def query(self, x, tol, simulate=simulatePoint):
+        """
+        Returns the runaway rate at a single input x (dict with the keys of
+        INPUTS, or sequence in their order). If the predicted standard deviation
+        of log10(runawayRate) exceeds tol, simulate(x) is called to produce a
+        DREAM output (file name) which is added to the model, and the prediction
+        is repeated. By default DREAM is configured and run at x (see
+        simulatePoint); with simulate None the model is never extended.
+        Returns the runaway rate and its standard deviation.
+        """
+        if isinstance(x, dict):
+            x = [x[name] for name in INPUTS]
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+
+        runawayRate, std = self.predict(x, returnStd=True)
+        if std[0] > tol and simulate is not None:
+            if self.verbose:
+                print(f'Surrogate uncertainty {std[0]:.3g} > {tol}, running DREAM.')
+            self.addOutput(simulate(dict(zip(INPUTS, x[0]))), atEpsilon=x[0,INPUTS.index('epsilon')])
+            runawayRate, std = self.predict(x, returnStd=True)
+
+        return runawayRate[0], std[0]
+
+    ## persistence
+
+    def save(self, filename=SURROGATE_FILE):
+        np.savez(filename, X=self.X, y=self.y, logLengthScales=self.logLengthScales,
+                 logSignal=self.logSignal, logNoise=self.logNoise,
+                 xMean=self.xMean, xScale=self.xScale, yMean=self.yMean)
+
+    @staticmethod
+    def load(filename=SURROGATE_FILE, verbose=False):
+        data = np.load(filename)
+        model = RunawayRateSurrogate(verbose=verbose)
+        model.X, model.y = data['X'], data['y']
+        model.logLengthScales = data['logLengthScales']
+        model.logSignal, model.logNoise = float(data['logSignal']), float(data['logNoise'])
+        model.xMean, model.xScale, model.yMean = data['xMean'], data['xScale'], float(data['yMean'])
+        model._factorize()
+        return model
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        raise ValueError('Expected at least one output directory.')
+
+    model = RunawayRateSurrogate(verbose=True)
+    for outputDir in sys.argv[1:]:
+        for fp in sorted(glob.glob(os.path.join(outputDir, '*.h5'))):
+            try:
+                model.addOutput(fp)
+            except Exception as err:
+                print(f'Skipping {fp}: {err}')
+
+    model.fit()
+    model.save()
+    print(f'Saved surrogate model to {SURROGATE_FILE}')
@@ -2,7 +2,10 @@
 """
 Created by Peter Halldestam 19/8/21.
 
-Generates DREAM settings files for a range of temperatures.
+Generates DREAM settings files for a range of temperatures. Run with
+--adaptive to instead run an adaptively refined scan (see adaptiveScan.py),
+starting from a coarse logarithmic grid of temperatures, as run.sh -a does.
+With --no-cache, cached outputs are not reused.
 """
 import sys, os
 import numpy as np
@@ -15,32 +18,37 @@ import parameters as p
 
 # Baseline DREAM settings import
 sys.path.append(os.path.join(dir, '..'))
-import configureDREAM as c
-
-# Settings object import
-sys.path.append(p.DREAM_PATH)
-from DREAM.DREAMSettings import DREAMSettings
+from configureDREAM import ConfigureDREAM
+from configureDREAM import CYLINDRICAL
+from adaptiveScan import adaptiveScan
 
 # Scan parameters
 nScanValues = 2
 scanValues = p.TEMPERATURE * np.linspace(1e-3, 1e2, nScanValues)
 
+# Adaptive scan parameters
+ADAPTIVE = '--adaptive' in sys.argv
+USE_CACHE = '--no-cache' not in sys.argv
+nInitialScanValues = 4
+maxRuns = 20
+
+
+def configure(temperature, verbose=False):
+    return ConfigureDREAM(analyses=['transient'],
+                          geometry=CYLINDRICAL,
+                          temperature=temperature,
+                          output=f'outputs/output_cyl_T={temperature:2.3}.h5',
+                          save=f'dream_settings/settings_cyl_T={temperature:2.3}.h5',
+                          verbose=verbose)
+
+
 if __name__ == "__main__":
 
-    for temperature in scanValues:
-
-        # Cylindrical geometry
-        ds1 = DREAMSettings()
-        c.configureGrids(ds1, geometry=c.CYLINDRICAL)
-        c.configureEquations(ds1, temperature=temperature)
-        ds1.output.setFilename(F'outputs/output_cyl_T={temperature:2.3}.h5')
-        ds1.other.include('fluid/runawayRate')
-        ds1.save(f'dream_settings/settings_cyl_T={temperature:2.3}.h5')
-
-        # Toroidal geometry
-        # ds2 = DREAMSettings()
-        # c.configureGrids(ds2, geometry=c.TOROIDAL)
-        # c.configureEquations(ds2, temperature=temperature)
-        # ds2.output.setFilename(F'outputs/output_tor_T={temperature:2.3}.h5')
-        # ds2.other.include('fluid/runawayRate')
-        # ds2.save(f'dream_settings/settings_tor_T={temperature:2.3}.h5')
+    if ADAPTIVE:
+        initialValues = p.TEMPERATURE * np.geomspace(1e-3, 1e2, nInitialScanValues)
+        adaptiveScan(configure, initialValues, maxRuns=maxRuns, xLogScale=True,
+                     settingsDir='dream_settings/', useCache=USE_CACHE, verbose=('-v' in sys.argv))
+
+    else:
+        for temperature in scanValues:
+            configure(temperature, verbose=(len(sys.argv)==2))
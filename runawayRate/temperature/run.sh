@@ -2,79 +2,72 @@
 # Created by Peter Halldestam 19/8/21.
 #
 # run.sh: combines configurations from a python script (GENERATE_SETTINGS) and
-#         runs DREAM simulations for each created DREAM setting.
+#         runs DREAM simulations for each created DREAM setting in parallel.
+#         Simulations already done (see runDREAM.py) are skipped, run with -f to
+#         replace the settings files and rerun all of them. Run with -a to instead
+#         run an adaptively refined scan (see adaptiveScan.py).
 #
 
 DREAM_PATH="/home/peterhalldestam/DREAM/" # /path/to/DREAM/
-DREAMI_PATH="${DREAM_PATH}build/iface/dreami"
+DREAMI_PATH="${DREAMI:-${DREAM_PATH}build/iface/dreami}" # DREAMI=standin for the stand-in
 DREAM_SETTINGS_DIR="./dream_settings/"
 DREAM_OUTPUTS_DIR="./outputs/"
 GENERATE_SETTINGS="generateTemperatureScan.py"
 VISUALIZE="visualize.py"
 
+## options: -f to replace the settings files and rerun every simulation,
+##          -a to run an adaptively refined scan
+FORCE=0
+ADAPTIVE=0
+while getopts "fa" opt
+do
+    case $opt in
+        f ) FORCE=1;;
+        a ) ADAPTIVE=1;;
+        * ) echo "Usage: $0 [-f] [-a]"; exit 1;;
+    esac
+done
+
 ## make sure cwd is script dir
 cd "${0%/*}"
 
-## create new dream_settings files OR use old OR quit
-mkdir -p $DREAM_SETTINGS_DIR
-if test -z "$(ls $DREAM_SETTINGS_DIR)"
+## force a rerun: delete old settings and output files, and ignore the
+## scan manifest and output cache
+RUN_OPTIONS=""
+ADAPTIVE_OPTIONS=""
+if test $FORCE -eq 1
 then
-    echo "No old dream_settings files detected."
-    echo "Creating new dream_settings files from $GENERATE_SETTINGS."
-    python3 $GENERATE_SETTINGS
-else
-    echo "Old dream_settings files detected!"
-    while true
-    do
-        read -p "Do you wish to replace them? (y/n/quit)" ans
-        case $ans in
-            [Yy]* )
-                echo "Deleting old dream_settings files and create new from $GENERATE_SETTINGS."
-                rm $DREAM_SETTINGS_DIR*
-                python3 $GENERATE_SETTINGS
-                break;;
-            [Nn]* )
-                echo "Using old dream_settings files."
-                break;;
-            quit )
-                exit;;
-            * )
-                echo "Please answer y/n/quit.";;
-        esac
-    done
+    echo "Deleting old DREAM settings and output files."
+    rm -f $DREAM_SETTINGS_DIR* $DREAM_OUTPUTS_DIR*
+    RUN_OPTIONS="--restart --no-cache"
+    ADAPTIVE_OPTIONS="--no-cache"
 fi
-echo ""
 
-## remove old output files
-mkdir -p $DREAM_OUTPUTS_DIR
-if test -z "$(ls $DREAM_OUTPUTS_DIR)"
+mkdir -p $DREAM_SETTINGS_DIR $DREAM_OUTPUTS_DIR
+if test $ADAPTIVE -eq 1
 then
-    echo "No old output files detected."
+    ## run an adaptively refined scan, which creates and runs the DREAM
+    ## settings files batch by batch (outputs are reused through the cache)
+    echo "Deleting old DREAM settings files."
+    rm -f $DREAM_SETTINGS_DIR*
+    echo "Run an adaptively refined scan from $GENERATE_SETTINGS using $DREAMI_PATH."
+    DREAMI=$DREAMI_PATH python3 $GENERATE_SETTINGS --adaptive $ADAPTIVE_OPTIONS
 else
-    echo "Old output files detected!"
-    while true
-    do
-        read -p "Do you wish to delete them? (y/n)" ans
-        case $ans in
-            [Yy]* )
-                echo "Deleting old output files."
-                rm $DREAM_OUTPUTS_DIR*
-                break;;
-            [Nn]* | quit )
-                exit;;
-            * )
-                echo "Please answer y/n/quit.";;
-        esac
-    done
-fi
-echo ""
+    ## create new DREAM settings files OR use old
+    if test -z "$(ls $DREAM_SETTINGS_DIR)"
+    then
+        echo "No old DREAM settings files detected."
+        echo "Creating new DREAM settings files from $GENERATE_SETTINGS."
+        python3 $GENERATE_SETTINGS
+    else
+        echo "Using old DREAM settings files (run with -f to replace them)."
+    fi
+    echo ""
 
-## run DREAM simulations
-echo "Run DREAM using $DREAMI_PATH."
-for settings_file in $DREAM_SETTINGS_DIR*.h5
-do
-    /.$DREAMI_PATH $settings_file
-done
+    ## run DREAM simulations in parallel, skipping those already done
+    echo "Run DREAM using $DREAMI_PATH."
+    python3 ../runDREAM.py --dreami $DREAMI_PATH $RUN_OPTIONS $DREAM_SETTINGS_DIR
+fi
 
 ## plot runaway rates and compare
 python3 $VISUALIZE
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+"""
+Flux-surface averages, trapped fraction and effective passing fraction of
+DREAM's analytic toroidal magnetic field (see geometryDREAM.py), computed
+directly from the shaping profiles instead of from DREAM outputs,
+
+    <X> = int X J dtheta / int J dtheta,
+    f_p = 3/4 <B^2>/Bmax^2 int_0^1 lambda dlambda / <sqrt(1 - lambda B/Bmax)>,
+    f_t = 1 - f_p,
+
+where f_p is the effective passing fraction. The poloidal averages use the
+periodic trapezoidal rule (exponentially convergent) and the lambda integral
+Gauss-Legendre quadrature in t = sqrt(1 - lambda), which removes the square
+root singularity at lambda = 1. As for getMagneticField, the shaping profiles
+may have batch dimensions, giving results of shape (batch..., nr).
+
+In terminal run:
+    $ python3 trappingDREAM.py      trapped fraction vs. epsilon, compared to sqrt(epsilon) estimates
+"""
+import sys, os
+import numpy as np
+
+dir = os.path.dirname(os.path.realpath(__file__))
+
+# Parameters import
+sys.path.append(os.path.join(dir, '..'))
+import parameters as p
+
+# Geometry import
+from geometryDREAM import getMagneticField, linearProfile
+
+# Default no. quadrature nodes
+N_THETA = 64
+N_LAMBDA = 32
+
+
+def getTheta(nTheta=N_THETA):
+    """
+    Returns the poloidal angles of the periodic trapezoidal rule.
+    """
+    return 2 * np.pi * np.arange(nTheta) / nTheta
+
+
+def getFluxSurfaceAverage(X, field):
+    """
+    Returns the flux-surface average of X, of shape (batch..., nr).
+
+    array X :       Quantity of shape (batch..., nr, ntheta), on the angles of getTheta.
+    dict field :    Magnetic field of getMagneticField on the same grid.
+    """
+    J = np.abs(field['J'])
+    return np.sum(X * J, axis=-1) / np.sum(J, axis=-1)
+
+
+def getPassingFraction(r, kappa=1., delta=0., Delta=0., nTheta=N_THETA, nLambda=N_LAMBDA, **kwargs):
+    """
+    Returns the effective passing fraction at minor radii r, of shape
+    (batch..., nr). On the magnetic axis, where the flux-surface averages are
+    undefined, all particles are passing (f_p = 1).
+
+    array r :           Minor radii, below the major radius.
+    kappa :             Elongation profile (see geometryDREAM.evaluateProfile).
+    delta :             Triangularity profile.
+    Delta :             Shafranov shift profile.
+    int nTheta :        No. poloidal quadrature nodes.
+    int nLambda :       No. pitch quadrature nodes.
+    **kwargs :          Passed on to getMagneticField (majorRadius, magneticField, ...).
+    """
+    r = np.asarray(r, dtype=float)
+    if np.any(r >= kwargs.get('majorRadius', p.MAJOR_RADIUS)):
+        raise ValueError('Minor radii must be below the major radius (epsilon < 1).')
+
+    # lambda = 1 - t^2, dlambda = 2t dt
+    x, w = np.polynomial.legendre.leggauss(nLambda)
+    t, w = (x + 1) / 2, w / 2
+
+    # the Jacobian vanishes on the magnetic axis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        field = getMagneticField(r, getTheta(nTheta), kappa=kappa, delta=delta, Delta=Delta, **kwargs)
+        B = field['B']
+        Bmax = B.max(axis=-1)
+        b = B / Bmax[..., None]
+
+        integral = np.zeros_like(Bmax)
+        for ti, wi in zip(t, w):
+            lam = 1 - ti ** 2
+            integral += wi * 2 * ti * lam / getFluxSurfaceAverage(np.sqrt(np.maximum(1 - lam * b, 0.)), field)
+        passing = .75 * getFluxSurfaceAverage(b ** 2, field) * integral
+
+    return np.where(r == 0, 1., passing)
+
+
+def getTrappedFraction(r, kappa=1., delta=0., Delta=0., **kwargs):
+    """
+    Returns the trapped fraction 1 - f_p at minor radii r, of shape
+    (batch..., nr). See getPassingFraction.
+    """
+    return 1 - getPassingFraction(r, kappa=kappa, delta=delta, Delta=Delta, **kwargs)
+
+
+def getTrapping(epsilon, maxElongation=1., maxTriangularity=0., maxShafranovShift=0., **kwargs):
+    """
+    Returns the trapped fraction at inverse aspect ratios epsilon = r/R0 for
+    the shaping of ConfigureDREAM.setToroidal, of shape (batch..., nr) with
+    batch the broadcast shape of the shaping maxima. As there, the elongation
+    is constant, and the triangularity and Shafranov shift grow linearly from
+    zero on the magnetic axis.
+
+    array epsilon :             Inverse aspect ratios.
+    float maxElongation :       Elongation, constant over the radius (or array of).
+    float maxTriangularity :    Triangularity at the minor radius (or array of).
+    float maxShafranovShift :   Shafranov shift at the minor radius (or array of).
+    **kwargs :                  Passed on to getPassingFraction.
+    """
+    majorRadius = kwargs.get('majorRadius', p.MAJOR_RADIUS)
+    minorRadius = kwargs.get('minorRadius', p.MINOR_RADIUS)
+    return getTrappedFraction(np.asarray(epsilon) * majorRadius,
+                              kappa=np.asarray(maxElongation, dtype=float),
+                              delta=linearProfile(maxTriangularity, minorRadius),
+                              Delta=linearProfile(maxShafranovShift, minorRadius), **kwargs)
+
+
+if __name__ == '__main__':
+
+    import time
+    from plotDREAM import getPyplot
+    plt = getPyplot()
+
+    epsilon = np.linspace(.01, p.MINOR_RADIUS / p.MAJOR_RADIUS, 50)
+
+    tic = time.time()
+    trapped = getTrapping(epsilon)
+    shaped = getTrapping(epsilon, maxElongation=p.MAX_ELONGATION, maxTriangularity=p.MAX_TRIANGULARITY,
+                         maxShafranovShift=p.MAX_SHAFRANOV_SHIFT)
+    print(f'Computed trapped fractions in {1e3 * (time.time() - tic):.1f} ms')
+
+    plt.plot(epsilon, trapped, label='circular')
+    plt.plot(epsilon, shaped, label='shaped')
+    plt.plot(epsilon, 1.46 * np.sqrt(epsilon), ':', label=r'$1.46\sqrt{\epsilon}$')
+    plt.plot(epsilon, 1.2 * np.sqrt(2 * epsilon / (1 + epsilon)), '--', label='E Nilsson et al')
+    plt.xlabel(r'$\epsilon$')
+    plt.ylabel(r'$f_t$')
+    plt.legend()
+    plt.show()